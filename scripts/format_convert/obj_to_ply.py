@@ -2,9 +2,14 @@
 Description : 将OBJ文件转换为点云（.ply或.txt），通过三角面片均匀采样方式，可自定义点云数量
 """
 
+import os
+import sys
 import vtk
 import numpy as np
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pointcloud_process"))
+from voxel_filter import voxel_downsample
+
 def read_obj(file_path):
     """读取OBJ文件并返回vtkPolyData对象"""
     reader = vtk.vtkOBJReader()
@@ -100,6 +105,12 @@ if __name__ == "__main__":
     sampled_points = sample_uniformly(polydata, desired_num_points)
     print(f"采样点数: {sampled_points.shape[0]}")
 
+    # 可选：体素降采样，合并小三角形上几乎重合的采样点（None 表示不处理）
+    voxel_size = None
+    if voxel_size:
+        sampled_points = voxel_downsample(sampled_points, voxel_size)
+        print(f"体素降采样后的点数: {sampled_points.shape[0]}")
+
     output_ply = "testcase/test0702/RebuiltModels/nefertiti.ply"
     save_ply_with_normals(sampled_points, output_ply)
     # save_xyz_to_txt(sampled_points, output_txt)
@@ -2,10 +2,15 @@
 Description : 将stl转换至点云（.ply或.txt），通过均匀插入点的方式，可自定义点云数量
 """
 
+import os
+import sys
 import vtk
 import numpy as np
 from stl import mesh
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pointcloud_process"))
+from voxel_filter import voxel_downsample
+
 def read_stl(file_path):
     """读取STL文件并返回vtkPolyData对象"""
     reader = vtk.vtkSTLReader()
@@ -222,6 +227,12 @@ if __name__ == "__main__":
     desired_num_points = 400000  # 设置所需点数
     uniform_points_with_normals = sample_uniformly(polydata, desired_num_points)
     print(f"均匀化后的点数量: {uniform_points_with_normals.shape[0]}")
+
+    # 可选：体素降采样，合并小三角形上几乎重合的采样点（None 表示不处理）
+    voxel_size = None
+    if voxel_size:
+        uniform_points_with_normals = voxel_downsample(uniform_points_with_normals, voxel_size)
+        print(f"体素降采样后的点数量: {uniform_points_with_normals.shape[0]}")
     
     # 对点云数据进行随机平移和旋转
     # transformed_points = random_translate_and_rotate(uniform_points_with_normals)
@@ -3,9 +3,14 @@ Description : 将txt格式转换至ply格式
 """
 
 import numpy as np
-from sklearn.neighbors import NearestNeighbors
 import argparse
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pointcloud_process"))
+import spatial_index
+from voxel_filter import deduplicate
+from outlier_filter import remove_outliers
 
 def read_txt_xyz(file_path):
     points = []
@@ -17,18 +22,8 @@ def read_txt_xyz(file_path):
     return np.array(points)
 
 def estimate_normals(points, k=10):
-    nbrs = NearestNeighbors(n_neighbors=k + 1).fit(points)
-    _, indices = nbrs.kneighbors(points)
-    normals = []
-    for i, neighbors in enumerate(indices):
-        neighbors = points[neighbors[1:]]  # exclude itself
-        centroid = np.mean(neighbors, axis=0)
-        cov = np.cov((neighbors - centroid).T)
-        eigvals, eigvecs = np.linalg.eigh(cov)
-        normal = eigvecs[:, 0]
-        normal /= np.linalg.norm(normal)
-        normals.append(normal)
-    return np.array(normals)
+    # 共享 KD-tree 索引上批量 kNN + 批量特征分解
+    return spatial_index.estimate_normals(points, k=k)
 
 def save_ply_xyz(points, file_path):
     with open(file_path, 'w') as f:
@@ -64,8 +59,22 @@ if __name__ == "__main__":
 
     points = read_txt_xyz(txt_file)
 
+    # 可选：按容差去掉扫描中的重复点，保留的都是原始点（None 表示不处理）
+    dedup_tolerance = None
+    if dedup_tolerance:
+        points = deduplicate(points, dedup_tolerance)[0]
+        print(f"去重后的点数: {len(points)}")
+
+    # 可选：统计/半径离群点去除（remove_outlier=False 表示不处理）
+    remove_outlier = False
+    if remove_outlier:
+        mask = remove_outliers(points, k=16, std_ratio=2.0, radius=None, min_neighbors=4)
+        points = points[mask]
+        print(f"离群点去除后的点数: {len(points)}")
+
     output_ply = "src/GX2.ply"
 
+    # 需要法向量时改用 save_ply_with_normals(points, estimate_normals(points), output_ply)
     save_ply_xyz(points, output_ply)
 
     print(f"点云已保存到 {output_ply}")
@@ -14,6 +14,11 @@ import numpy as np
 import os
 import random
 
+from voxel_filter import voxel_downsample
+from dataset_split import split_indices, split_manifest, pair_manifest, write_manifest
+from hidden_point_removal import hpr_pairs
+from pointcloud_io import write_ply_binary
+
 def read_ply_with_normals(file_path):
     """读取 PLY 点云，返回 N×6 的数组（xyz + normals）"""
     reader = vtk.vtkPLYReader()
@@ -78,6 +83,28 @@ def split_point_cloud(data, source_ratio):
 
     return source, target
 
+def write_hpr_pairs(data, output_dir, name_prefix, num_pairs, max_angle_deg=60.0, seed=0):
+    """
+    批量生成带自遮挡的 source / target 对：两个相近视点各自做隐藏点去除，
+    source 再做随机刚性变换；每对保存二进制 PLY 和真值逆矩阵，所有对的统计写入一个清单
+    """
+    np.random.seed(seed)
+    pairs = hpr_pairs(data[:, :3], num_pairs, max_angle_deg=max_angle_deg, rng=seed)
+    manifest = {"source": name_prefix, "points": len(data), "pairs": []}
+    for i, (source_idx, target_idx, source_view, target_view) in enumerate(pairs):
+        T = generate_random_rigid_transform()
+        source = apply_rigid_transform(data[source_idx], T)
+        target = data[target_idx]
+        prefix = os.path.join(output_dir, f"{name_prefix}_hpr{i:03d}")
+        write_ply_binary(f"{prefix}_source.ply", source[:, :3], normals=source[:, 3:6])
+        write_ply_binary(f"{prefix}_target.ply", target[:, :3], normals=target[:, 3:6])
+        save_matrix_txt(np.linalg.inv(T), f"{prefix}_ground_truth.txt")
+        entry = split_manifest(data, source_idx, target_idx, "hpr",
+                               {"source_viewpoint": source_view.tolist(), "target_viewpoint": target_view.tolist()})
+        entry["file_prefix"] = os.path.basename(prefix)
+        manifest["pairs"].append(entry)
+    return write_manifest(manifest, os.path.join(output_dir, f"{name_prefix}_hpr_manifest.json"))
+
 def generate_random_rigid_transform(
     angle_range_degrees=(0.5, 5),  # 控制旋转角度范围（单位：度）
     translation_range=0.5         # 控制平移范围（对称范围 [-t, t]）
@@ -223,11 +250,32 @@ if __name__ == "__main__":
     # 1. 读取点云
     data = read_ply_with_normals(input_path)
 
+    # 可选：体素降采样（None 表示不处理）
+    voxel_size = None
+    if voxel_size:
+        data = voxel_downsample(data, voxel_size)
+        print(f"体素降采样后的点数: {len(data)}")
+
+    # 可选：批量生成 HPR 遮挡视角对（0 表示不生成）
+    num_hpr_pairs = 0
+    if num_hpr_pairs:
+        manifest_path = write_hpr_pairs(data, output_dir, name_prefix, num_hpr_pairs)
+        print(f"[✓] {num_hpr_pairs} 对遮挡视角数据已保存，清单: {manifest_path}")
+
     # 2. 随机选取 80% 的点，选两次
     # target = random_sample(data, ratio=0.4)
     # source = random_sample(data, ratio=0.6)
-    source, pre_target = split_point_cloud(data, source_ratio=0.4916)
-    target = random_sample(pre_target, ratio=0.5328)
+    # 划分方式：random 为原来的随机划分，其余 voxel / fps / halfspace / view / hpr 见 dataset_split.py
+    split_mode = "random"
+    if split_mode == "random":
+        source, pre_target = split_point_cloud(data, source_ratio=0.4916)
+        target = random_sample(pre_target, ratio=0.5328)
+        manifest = pair_manifest(data, source, target, split_mode, {"source_ratio": 0.4916, "target_ratio": 0.5328})
+    else:
+        source_idx, target_idx, split_params = split_indices(data, mode=split_mode, source_ratio=0.4916)
+        source, target = data[source_idx], data[target_idx]
+        manifest = split_manifest(data, source_idx, target_idx, split_mode, split_params)
+    print(f"划分方式 {split_mode}：重叠率 {manifest['overlap_source']:.3f} / {manifest['overlap_target']:.3f}")
     
     # 3. 保存 target 点云
     target_path = os.path.join(output_dir, f"{name_prefix}_target.ply")
@@ -245,11 +293,13 @@ if __name__ == "__main__":
     # 5. 保存逆矩阵
     T_inv = np.linalg.inv(T)
     gt_path = os.path.join(output_dir, f"{name_prefix}_ground_truth.txt")
+    manifest_path = os.path.join(output_dir, f"{name_prefix}_split.json")
     
     if write_file:
         write_ply_with_normals(target, target_path)
         write_ply_with_normals(transformed_source, source_path)
         save_matrix_txt(T_inv, gt_path)
+        write_manifest(manifest, manifest_path)
 
     # 7. 输出信息和变换矩阵
     print(f"[✓] Target: {target_path}")
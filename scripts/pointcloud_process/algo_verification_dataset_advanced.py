@@ -10,6 +10,9 @@ import os
 import struct
 import random
 
+from voxel_filter import voxel_downsample
+from dataset_split import split_indices, split_manifest, write_manifest
+
 def read_ply_with_all_data(file_path):
     """读取 PLY 点云，返回 N×6 的数组（xyz + normals）"""
     reader = vtk.vtkPLYReader()
@@ -327,10 +330,27 @@ if __name__ == "__main__":
     # 1. 读取点云
     data = read_ply_with_all_data(input_path)
 
+    # 可选：体素降采样，颜色取组内均值（None 表示不处理）
+    voxel_size = None
+    if voxel_size:
+        data = voxel_downsample(data, voxel_size)
+        print(f"体素降采样后的点数: {len(data)}")
+
     # 2. 随机选取 80% 的点，选两次
     # target = random_sample(data, ratio=0.4)
     # source = random_sample(data, ratio=0.6)
-    source, target = split_point_cloud(data, source_ratio=0.6) # 0.4916
+    # 划分方式：random 与原来的 split_point_cloud 相同（按文件顺序），其余见 dataset_split.py
+    split_mode = "random"
+    if split_mode == "random":
+        source, target = split_point_cloud(data, source_ratio=0.6) # 0.4916
+        split_idx = int(0.6 * len(data))
+        source_idx, target_idx = np.arange(split_idx), np.arange(split_idx, len(data))
+        split_params = {"source_ratio": 0.6}
+    else:
+        source_idx, target_idx, split_params = split_indices(data, mode=split_mode, source_ratio=0.6)
+        source, target = data[source_idx], data[target_idx]
+    manifest = split_manifest(data, source_idx, target_idx, split_mode, split_params)
+    print(f"划分方式 {split_mode}：重叠率 {manifest['overlap_source']:.3f} / {manifest['overlap_target']:.3f}")
     # target = random_sample(pre_target, ratio=0.5328)
     
     # 3. 定义输出路径
@@ -338,6 +358,7 @@ if __name__ == "__main__":
     source_path = os.path.join(output_dir, f"{name_prefix}_source.ply")
     t_path = os.path.join(output_dir, f"{name_prefix}_Tlog.txt")
     gt_path = os.path.join(output_dir, f"{name_prefix}_ground_truth.txt")
+    manifest_path = os.path.join(output_dir, f"{name_prefix}_split.json")
 
     # 4. 对 source 进行刚性变换
     if use_manual_tranform:
@@ -354,6 +375,7 @@ if __name__ == "__main__":
         write_ply_with_all_data(target, target_path, shift_color_to=target_color_shift)
         write_ply_with_all_data(transformed_source, source_path, shift_color_to=source_color_shift)
         save_matrix_txt(T_inv, gt_path)
+        write_manifest(manifest, manifest_path)
 
     # 7. 输出信息和变换矩阵
     print(f"[✓] Target: {target_path}")
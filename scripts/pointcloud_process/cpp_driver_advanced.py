@@ -9,6 +9,8 @@ import numpy as np
 import subprocess
 import os
 
+from iteration_timing import IterationClock
+
 def choose_directory():
     """打开文件选择对话框"""
     root = tk.Tk()
@@ -86,12 +88,15 @@ def main():
         args = [exe_path, file_source, file_target, out_path + os.sep, algo]
         args.extend(gt_trans_args)
 
+        clock = IterationClock()
         with open(log_path, "w") as logfile:
             proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
             for line in proc.stdout:
+                clock.feed(line)          # 记录迭代行的到达时间
                 print(line, end="")       # 实时输出到终端
                 logfile.write(line)       # 保存日志到文件
             proc.wait()
+        clock.write(log_path)
 
         input(f"\n[{algo}] 可视化窗口已结束，按回车键继续执行下一个算法...")
 
@@ -0,0 +1,219 @@
+"""
+Description : 算法验证数据集的空间感知划分
+random_sample / split_point_cloud 只是均匀随机取下标，不控制空间覆盖，也不控制重叠程度。这里提供：
+1. voxel：体素分层随机划分，每个体素内按同一比例分给 source，空间覆盖均匀
+2. fps：最远点采样选出 source，剩余点为 target；
+   点先按体素顺序重排，距离数组分块维护块内最大值，每选一个点只在 KD-tree 半径查询（半径为当前最远距离）
+   命中的点上更新距离并重算相关块，避免每步遍历全部点
+3. halfspace：沿某一方向投影，source 取较低的一段、target 取较高的一段，两段之间的部分即为重叠区
+4. view：按法向朝向划分，法向与视线方向夹角小于阈值的点视为可见，source / target 各取一个视角
+5. hpr：隐藏点去除（见 hidden_point_removal.py），source / target 为两个视点各自可见的点，带自遮挡
+每种划分都返回 (source 下标, target 下标)；重叠率按 source 中距 target 不超过阈值的点所占比例计算，
+连同划分参数写入清单 JSON
+"""
+
+import os
+import json
+import numpy as np
+
+from pointcloud_io import read_ply_arrays
+from spatial_index import cached_index
+from voxel_filter import voxel_groups
+from hidden_point_removal import HiddenPointRemoval, viewpoints_around
+
+SPLIT_MODES = ("random", "voxel", "fps", "halfspace", "view", "hpr")
+
+def _unit(v):
+    v = np.asarray(v, dtype=np.float64)
+    return v / np.linalg.norm(v)
+
+def random_split(num_points, source_ratio, rng=None):
+    """均匀随机划分（与 split_point_cloud 相同）"""
+    rng = np.random.default_rng(rng)
+    order = rng.permutation(num_points)
+    split_idx = int(source_ratio * num_points)
+    return np.sort(order[:split_idx]), np.sort(order[split_idx:])
+
+def voxel_stratified_split(points, source_ratio, voxel_size, rng=None):
+    """
+    体素分层随机划分：每个体素内随机排序，前 round(count × ratio) 个点分给 source
+    取整用随机舍入，总体比例的期望仍为 source_ratio
+    """
+    rng = np.random.default_rng(rng)
+    inverse, counts = voxel_groups(points, voxel_size)
+    order = np.lexsort((rng.random(len(inverse)), inverse))
+    starts = np.cumsum(counts) - counts
+    rank = np.empty(len(inverse), dtype=np.int64)
+    rank[order] = np.arange(len(inverse)) - np.repeat(starts, counts)
+    quota = np.floor(counts * source_ratio + rng.random(len(counts))).astype(np.int64)
+    is_source = rank < quota[inverse]
+    return np.flatnonzero(is_source), np.flatnonzero(~is_source)
+
+def farthest_point_sample(points, num_samples, start=0, block_size=1024, voxel_size=None):
+    """
+    最远点采样，返回采样点下标（按选取顺序）
+    points 先按体素顺序重排使空间相邻的点在数组中也相邻，半径查询命中的点只落在少数几个块里
+    voxel_size 默认取包围盒对角线的 1/64
+    """
+    points = np.asarray(points[:, :3], dtype=np.float64)
+    n = len(points)
+    num_samples = min(int(num_samples), n)
+    if voxel_size is None:
+        voxel_size = np.linalg.norm(np.ptp(points, axis=0)) / 64 or 1.0
+    inverse, _ = voxel_groups(points, voxel_size)
+    perm = np.argsort(inverse, kind="stable")
+    sorted_points = points[perm]
+    index = cached_index(sorted_points)
+    rank = np.empty(n, dtype=np.int64)
+    rank[perm] = np.arange(n)
+
+    num_blocks = (n + block_size - 1) // block_size
+    dist2 = np.full(num_blocks * block_size, -1.0)        # 补齐的位置永远不会被选中
+    selected = np.empty(num_samples, dtype=np.int64)
+    current = rank[start]
+    diff = sorted_points - sorted_points[current]
+    dist2[:n] = np.einsum("ij,ij->i", diff, diff)
+    # 已选中的点距离记为 -1，有重复点时也不会被再次选中
+    dist2[current] = -1.0
+    blocks = dist2.reshape(num_blocks, block_size)
+    block_max = blocks.max(axis=1)
+    selected[0] = current
+    for s in range(1, num_samples):
+        b = int(np.argmax(block_max))
+        current = b * block_size + int(np.argmax(blocks[b]))
+        selected[s] = current
+        radius = np.sqrt(dist2[current])
+        dist2[current] = -1.0
+        # 只有到新采样点的距离小于已有最近距离（≤ 当前最远距离）的点需要更新
+        idx = np.asarray(index.radius(sorted_points[current], radius, workers=1), dtype=np.int64)
+        diff = sorted_points[idx] - sorted_points[current]
+        d2 = np.einsum("ij,ij->i", diff, diff)
+        closer = d2 < dist2[idx]
+        idx = idx[closer]
+        dist2[idx] = d2[closer]
+        touched = np.unique(np.append(idx // block_size, b))
+        block_max[touched] = blocks[touched].max(axis=1)
+    return perm[selected]
+
+def fps_split(points, source_ratio, start=0):
+    """最远点采样得到的点为 source，其余为 target"""
+    source_idx = np.sort(farthest_point_sample(points, int(source_ratio * len(points)), start=start))
+    is_source = np.zeros(len(points), dtype=bool)
+    is_source[source_idx] = True
+    return source_idx, np.flatnonzero(~is_source)
+
+def halfspace_split(points, direction, source_ratio=0.6, target_ratio=0.6):
+    """
+    沿 direction 投影：source 为投影值最低的 source_ratio 部分，target 为最高的 target_ratio 部分
+    两者之和超过 1 的部分为共有点（重叠区）
+    """
+    t = np.asarray(points[:, :3], dtype=np.float64) @ _unit(direction)
+    order = np.argsort(t, kind="stable")
+    n = len(points)
+    source_idx = np.sort(order[:int(source_ratio * n)])
+    target_idx = np.sort(order[n - int(target_ratio * n):])
+    return source_idx, target_idx
+
+def view_split(normals, source_view, target_view, max_angle_deg=75.0):
+    """
+    按视线方向划分：法向与指向传感器的方向夹角小于 max_angle_deg 的点视为可见
+    source_view / target_view 为从物体指向传感器的方向，两个视角都能看到的点即为重叠区
+    """
+    normals = np.asarray(normals, dtype=np.float64)
+    cos_limit = np.cos(np.deg2rad(max_angle_deg))
+    facing = normals @ np.stack([_unit(source_view), _unit(target_view)]).T
+    return np.flatnonzero(facing[:, 0] >= cos_limit), np.flatnonzero(facing[:, 1] >= cos_limit)
+
+def overlap_ratio(source, target, threshold):
+    """source 中距 target 不超过 threshold 的点所占比例"""
+    if len(source) == 0 or len(target) == 0:
+        return 0.0
+    dist, _ = cached_index(target).knn(np.asarray(source[:, :3], dtype=np.float64), k=1,
+                                       distance_upper_bound=threshold)
+    return float(np.mean(np.isfinite(dist)))
+
+def mean_spacing(points, sample_size=20000, rng=0):
+    """随机抽样估计平均点间距（到最近邻的距离）"""
+    points = np.asarray(points[:, :3], dtype=np.float64)
+    rng = np.random.default_rng(rng)
+    sample = points[rng.choice(len(points), min(sample_size, len(points)), replace=False)]
+    dist, _ = cached_index(points).knn(sample, k=2)
+    return float(dist[:, 1].mean())
+
+def split_indices(data, mode="random", source_ratio=0.6, target_ratio=0.6, voxel_size=None,
+                  direction=(1.0, 0.0, 0.0), source_view=(0.0, 0.0, 1.0), target_view=(1.0, 0.0, 1.0),
+                  max_angle_deg=75.0, distance_scale=3.0, rng=None):
+    """
+    按 mode 划分 N×C 点云（前 3 列 xyz，4~6 列 normals），返回 (source 下标, target 下标, 划分参数)
+    view / hpr 模式下 source_view / target_view 为从物体指向传感器的方向
+    """
+    points = data[:, :3]
+    if mode == "random":
+        source_idx, target_idx = random_split(len(data), source_ratio, rng=rng)
+        params = {"source_ratio": source_ratio}
+    elif mode == "voxel":
+        voxel_size = voxel_size or 8 * mean_spacing(points)
+        source_idx, target_idx = voxel_stratified_split(points, source_ratio, voxel_size, rng=rng)
+        params = {"source_ratio": source_ratio, "voxel_size": voxel_size}
+    elif mode == "fps":
+        start = int(np.random.default_rng(rng).integers(len(data)))
+        source_idx, target_idx = fps_split(points, source_ratio, start=start)
+        params = {"source_ratio": source_ratio, "start": start}
+    elif mode == "halfspace":
+        source_idx, target_idx = halfspace_split(points, direction, source_ratio, target_ratio)
+        params = {"source_ratio": source_ratio, "target_ratio": target_ratio, "direction": list(direction)}
+    elif mode == "view":
+        source_idx, target_idx = view_split(data[:, 3:6], source_view, target_view, max_angle_deg)
+        params = {"source_view": list(source_view), "target_view": list(target_view),
+                  "max_angle_deg": max_angle_deg}
+    elif mode == "hpr":
+        directions = np.stack([_unit(source_view), _unit(target_view)])
+        viewpoints = viewpoints_around(points, directions, distance_scale)
+        source_idx, target_idx = HiddenPointRemoval(points).visible_batch(viewpoints)
+        params = {"source_viewpoint": viewpoints[0].tolist(), "target_viewpoint": viewpoints[1].tolist()}
+    else:
+        raise ValueError(f"未知的划分模式: {mode}，可选 {SPLIT_MODES}")
+    return source_idx, target_idx, params
+
+def split_manifest(data, source_idx, target_idx, mode, params, threshold=None):
+    """统计划分结果：点数、共有点数和双向的几何重叠率（阈值默认取 source / target 中较大平均点间距的 2 倍）"""
+    manifest = pair_manifest(data, data[source_idx], data[target_idx], mode, params, threshold=threshold)
+    manifest["shared_points"] = int(len(np.intersect1d(source_idx, target_idx)))
+    return manifest
+
+def pair_manifest(data, source, target, mode, params, threshold=None):
+    """只有 source / target 点云本身（没有下标）时的统计"""
+    if threshold is None:
+        threshold = 2 * max(mean_spacing(source), mean_spacing(target))
+    return {
+        "mode": mode,
+        "params": params,
+        "points": int(len(data)),
+        "source_points": int(len(source)),
+        "target_points": int(len(target)),
+        "overlap_threshold": float(threshold),
+        "overlap_source": overlap_ratio(source, target, threshold),
+        "overlap_target": overlap_ratio(target, source, threshold),
+    }
+
+def write_manifest(manifest, manifest_path):
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    return manifest_path
+
+if __name__ == "__main__":
+    input_path = "testcase/test0702/RebuiltModels/nefertiti.ply"
+    output_dir = "testcase/test0702/splits"
+    name = os.path.splitext(os.path.basename(input_path))[0]
+    os.makedirs(output_dir, exist_ok=True)
+
+    points, normals, _ = read_ply_arrays(input_path)
+    data = np.hstack([points, normals]) if normals is not None else points
+    for mode in SPLIT_MODES:
+        if mode == "view" and normals is None:
+            continue
+        source_idx, target_idx, params = split_indices(data, mode=mode, source_ratio=0.6, rng=0)
+        manifest = split_manifest(data, source_idx, target_idx, mode, params)
+        write_manifest(manifest, os.path.join(output_dir, f"{name}_{mode}_split.json"))
+        print(f"{mode:>9}: source {manifest['source_points']}, target {manifest['target_points']}, "
+              f"重叠率 {manifest['overlap_source']:.3f} / {manifest['overlap_target']:.3f}")
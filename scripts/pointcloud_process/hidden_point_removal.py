@@ -0,0 +1,114 @@
+"""
+Description : 隐藏点去除（Hidden Point Removal, Katz et al. 2007）
+比虚拟扫描仪便宜得多的遮挡视角生成方式，直接作用于已有点云：
+1. 以视点为原点做球面翻转 p' = p + 2(R - |p|)·p/|p|，R = radius_scale × 最远点距离
+2. 翻转后的点与视点一起求凸包，凸包顶点即为该视点可见的点
+多个视点时，平移后的坐标与距离按块批量计算，相同视点只翻转、求凸包一次，
+可见集合缓存后供多对 source / target 重复使用；各视点的凸包在线程池中并行计算
+"""
+
+import os
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from scipy.spatial import ConvexHull
+
+from pointcloud_io import read_ply_arrays, write_ply_binary
+
+def spherical_flip(points, viewpoints, radius_scale=100.0):
+    """
+    批量球面翻转，返回 V×N×3（以各视点为原点的翻转坐标）
+    points: N×3，viewpoints: V×3
+    """
+    q = points[None, :, :] - viewpoints[:, None, :]
+    norms = np.sqrt(np.einsum("vni,vni->vn", q, q))
+    radius = radius_scale * norms.max(axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = np.where(norms > 0, 2 * radius / norms - 1, 0.0)
+    return q * scale[..., None]
+
+def visible_from_flipped(flipped):
+    """翻转坐标（视点为原点）加上原点求凸包，返回可见点的下标（升序）"""
+    hull = ConvexHull(np.vstack([flipped, np.zeros((1, 3))]))
+    vertices = hull.vertices
+    return np.sort(vertices[vertices < len(flipped)])
+
+class HiddenPointRemoval:
+    """同一点云上对多个视点做隐藏点去除，结果按视点缓存"""
+
+    def __init__(self, points, radius_scale=100.0, max_elements=1 << 24, workers=None):
+        self.points = np.ascontiguousarray(points[:, :3], dtype=np.float64)
+        self.radius_scale = radius_scale
+        self.max_elements = max_elements
+        self.workers = workers
+        self._cache = {}
+
+    def visible(self, viewpoint):
+        """单个视点的可见点下标"""
+        return self.visible_batch(np.asarray(viewpoint, dtype=np.float64)[None])[0]
+
+    def visible_batch(self, viewpoints):
+        """多个视点的可见点下标列表，相同视点只计算一次"""
+        viewpoints = np.asarray(viewpoints, dtype=np.float64).reshape(-1, 3)
+        keys = [tuple(v) for v in viewpoints]
+        todo = np.array([v for v in dict.fromkeys(keys) if v not in self._cache]).reshape(-1, 3)
+        # 每块翻转的视点数受 max_elements 限制，控制 V×N×3 数组的大小
+        per_chunk = max(1, self.max_elements // (3 * max(1, len(self.points))))
+        with ThreadPoolExecutor(max_workers=self.workers or os.cpu_count()) as pool:
+            for s in range(0, len(todo), per_chunk):
+                chunk = todo[s:s + per_chunk]
+                flipped = spherical_flip(self.points, chunk, self.radius_scale)
+                for v, idx in zip(chunk, pool.map(visible_from_flipped, flipped)):
+                    self._cache[tuple(v)] = idx
+        return [self._cache[k] for k in keys]
+
+def view_directions(num_views, rng=None):
+    """单位球面上均匀随机的视线方向"""
+    rng = np.random.default_rng(rng)
+    d = rng.normal(size=(num_views, 3))
+    return d / np.linalg.norm(d, axis=1, keepdims=True)
+
+def viewpoints_around(points, directions, distance_scale=3.0):
+    """视点放在包围盒中心沿 directions、距离为 distance_scale × 包围球半径处"""
+    center = 0.5 * (points[:, :3].min(axis=0) + points[:, :3].max(axis=0))
+    radius = 0.5 * np.linalg.norm(np.ptp(points[:, :3], axis=0))
+    return center + distance_scale * radius * np.asarray(directions, dtype=np.float64)
+
+def hpr_pairs(points, num_pairs, max_angle_deg=60.0, distance_scale=3.0, radius_scale=100.0, rng=None,
+              hpr=None):
+    """
+    批量生成遮挡视角对：source 视线方向均匀随机，target 方向与其夹角在 max_angle_deg 以内
+    返回 [(source 下标, target 下标, source 视点, target 视点), ...]
+    """
+    rng = np.random.default_rng(rng)
+    source_dirs = view_directions(num_pairs, rng)
+    # target 方向：绕与 source 垂直的随机轴旋转一个随机角度
+    axis = np.cross(source_dirs, view_directions(num_pairs, rng))
+    axis /= np.linalg.norm(axis, axis=1, keepdims=True)
+    angle = np.deg2rad(rng.uniform(0.0, max_angle_deg, num_pairs))[:, None]
+    target_dirs = source_dirs * np.cos(angle) + np.cross(axis, source_dirs) * np.sin(angle)
+
+    hpr = HiddenPointRemoval(points, radius_scale) if hpr is None else hpr
+    source_views = viewpoints_around(points, source_dirs, distance_scale)
+    target_views = viewpoints_around(points, target_dirs, distance_scale)
+    visible = hpr.visible_batch(np.vstack([source_views, target_views]))
+    return [(visible[i], visible[num_pairs + i], source_views[i], target_views[i]) for i in range(num_pairs)]
+
+if __name__ == "__main__":
+    input_path = "testcase/test0702/RebuiltModels/nefertiti.ply"
+    output_dir = "testcase/test0702/hpr_views"
+    num_views = 8
+    name = os.path.splitext(os.path.basename(input_path))[0]
+    os.makedirs(output_dir, exist_ok=True)
+
+    points, normals, colors = read_ply_arrays(input_path)
+    hpr = HiddenPointRemoval(points)
+    viewpoints = viewpoints_around(points, view_directions(num_views, rng=0))
+    start = time.perf_counter()
+    visible = hpr.visible_batch(viewpoints)
+    print(f"{num_views} 个视点的隐藏点去除耗时 {time.perf_counter() - start:.2f}s")
+    for i, idx in enumerate(visible):
+        write_ply_binary(os.path.join(output_dir, f"{name}_hpr{i:02d}.ply"), points[idx],
+                         normals=None if normals is None else normals[idx],
+                         colors=None if colors is None else colors[idx])
+        print(f"视点 {i}: 可见 {len(idx)} / {len(points)} 个点")
@@ -0,0 +1,78 @@
+"""
+Description : 逐次迭代的墙钟时间记录
+求解器日志里只有总耗时，驱动脚本在读取求解器输出时给每一行 Iter 打上到达时间，
+配准结束后写到日志旁的 {日志名}.timing.json：
+    iter     每个迭代行中的迭代编号
+    t        该行到达的时间（秒），以 begin registration... 行的到达时间为零点，
+             没有该行时以启动求解器的时刻为零点
+    begin    begin registration... 行相对启动时刻的到达时间（没有时为 null）
+    end      求解器退出相对启动时刻的时间
+到达时间依赖求解器逐行刷新输出（std::endl / 行缓冲），全缓冲输出时各行会挤在同一时刻
+"""
+
+import os
+import re
+import json
+import time
+
+TIMING_SUFFIX = ".timing.json"
+BEGIN_MARKER = "begin registration"
+
+_ITER_NUMBER = re.compile(r"^\s*Iter\s*[:=]\s*(\d+)")
+
+def timing_path(log_path):
+    """日志对应的计时文件路径"""
+    return os.path.splitext(log_path)[0] + TIMING_SUFFIX
+
+class IterationClock:
+    """在求解器启动前创建，逐行 feed 求解器输出"""
+
+    def __init__(self):
+        self.launch = time.perf_counter()
+        self.launch_wall = time.time()
+        self.begin = None
+        self.end = None
+        self.iters = []
+        self.arrivals = []
+
+    def feed(self, line):
+        now = time.perf_counter() - self.launch
+        match = _ITER_NUMBER.match(line)
+        if match:
+            self.iters.append(int(match.group(1)))
+            self.arrivals.append(now)
+        elif self.begin is None and BEGIN_MARKER in line:
+            self.begin = now
+
+    def finish(self):
+        self.end = time.perf_counter() - self.launch
+
+    def to_dict(self):
+        origin = self.begin or 0.0
+        return {
+            "launch_time": self.launch_wall,
+            "begin": None if self.begin is None else round(self.begin, 6),
+            "end": None if self.end is None else round(self.end, 6),
+            "iter": self.iters,
+            "t": [round(t - origin, 6) for t in self.arrivals],
+        }
+
+    def write(self, log_path):
+        """写出计时文件，返回其路径"""
+        if self.end is None:
+            self.finish()
+        path = timing_path(log_path)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+        return path
+
+def read_timing(log_path):
+    """读取日志对应的计时文件，不存在或损坏时返回 None"""
+    path = timing_path(log_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
@@ -0,0 +1,213 @@
+"""
+Description : 多种加工误差模型的批量仿真，用于生成配准算法鲁棒性测试的数据集
+支持的误差模型：
+    tool_marks      刀纹（与 machining_error_sim.apply_surface_wave 相同的切向正弦波，结果逐位一致）
+    roughness       高斯粗糙度（沿法向的随机起伏）
+    gradient_noise  梯度噪声（Perlin 噪声，沿法向）
+    step            台阶（平面一侧整体沿法向偏移）
+    gouge           过切（高斯形状的凹坑）
+    normal_offset   整体沿法向偏移（余量/过切）
+每个模型接受一组参数数组，同一模型的全部参数组合在一次广播计算中生成，
+超出内存预算时按变体分块；梯度噪声的中间数组另按点分块计算
+随机模型的噪声由 (种子, 点编号) 的整数哈希得到，各变体只取决于自己的种子，不需要逐个种子创建随机数生成器
+"""
+
+import os
+import json
+import itertools
+import numpy as np
+
+from machining_error_sim import orthogonal_basis_batch, row_dot
+from pointcloud_io import read_ply_arrays, write_ply_binary
+
+# 每块最多同时计算的 (变体数 × 点数)
+MAX_ELEMENTS_PER_CHUNK = 1 << 24
+
+# 梯度噪声每块最多同时计算的点数：每个点约有 20 个 8 字节的中间值（坐标、插值权重、8 个角点的哈希与点积）
+MAX_NOISE_POINTS_PER_BLOCK = 1 << 20
+
+# Perlin 噪声的置换表与梯度向量（固定种子，变体间通过坐标偏移区分）
+_PERM = np.random.default_rng(0).permutation(256)
+_PERM = np.concatenate([_PERM, _PERM])
+_GRADS = np.array([[1, 1, 0], [-1, 1, 0], [1, -1, 0], [-1, -1, 0],
+                   [1, 0, 1], [-1, 0, 1], [1, 0, -1], [-1, 0, -1],
+                   [0, 1, 1], [0, -1, 1], [0, 1, -1], [0, -1, -1]], dtype=np.float64)
+
+def _perlin_block(coords):
+    """三维梯度噪声，coords 形状为 (M, 3)"""
+    cell = np.floor(coords)
+    f = coords - cell
+    i = cell.astype(np.int32) & 255
+    fx, fy, fz = f[..., 0], f[..., 1], f[..., 2]
+    wx = fx * fx * fx * (fx * (fx * 6 - 15) + 10)
+    wy = fy * fy * fy * (fy * (fy * 6 - 15) + 10)
+    wz = fz * fz * fz * (fz * (fz * 6 - 15) + 10)
+
+    # 先按 x、y 两级哈希，8 个角点共享中间结果
+    hx = [_PERM[i[..., 0] + cx] for cx in (0, 1)]
+    result = 0.0
+    for cx, cy, cz in itertools.product((0, 1), repeat=3):
+        h = _PERM[_PERM[hx[cx] + i[..., 1] + cy] + i[..., 2] + cz] % 12
+        dot = _GRADS[h, 0] * (fx - cx) + _GRADS[h, 1] * (fy - cy) + _GRADS[h, 2] * (fz - cz)
+        weight = (wx if cx else 1 - wx) * (wy if cy else 1 - wy) * (wz if cz else 1 - wz)
+        result = result + weight * dot
+    return result
+
+def perlin_noise(coords, max_points=MAX_NOISE_POINTS_PER_BLOCK):
+    """
+    三维梯度噪声，coords 形状为 (..., 3)，返回 (...) 的值，范围约 [-1, 1]
+    按 max_points 个点分块计算，中间数组的大小与输入规模无关
+    """
+    flat = coords.reshape(-1, 3)
+    result = np.empty(len(flat))
+    for start in range(0, len(flat), max_points):
+        result[start:start + max_points] = _perlin_block(flat[start:start + max_points])
+    return result.reshape(coords.shape[:-1])
+
+def _splitmix64(x):
+    """uint64 数组的 splitmix64 混合（溢出按模 2^64 回绕）"""
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def hash_uniform(seeds, count):
+    """(种子, 编号) 哈希成 [0, 1) 均匀分布，返回 (V, count)，每行只取决于该行的种子"""
+    keys = _splitmix64(np.asarray(seeds).astype(np.uint64))
+    bits = _splitmix64(keys[:, None] ^ np.arange(count, dtype=np.uint64)[None, :])
+    return (bits >> np.uint64(11)) * (1.0 / (1 << 53))
+
+def hash_normal(seeds, count):
+    """(种子, 编号) 哈希成标准正态分布（Box-Muller），返回 (V, count)"""
+    uniform = hash_uniform(seeds, 2 * count)
+    radius = np.sqrt(-2.0 * np.log1p(-uniform[:, 0::2]))
+    return radius * np.cos(2 * np.pi * uniform[:, 1::2])
+
+def _column(params, key, count):
+    """取出 (V,) 参数并广播成 (V, 1) 以便与 (V, N) 运算"""
+    return np.broadcast_to(np.asarray(params[key], dtype=np.float64), (count,))[:, None]
+
+def _vectors(params, key, count):
+    return np.broadcast_to(np.asarray(params[key], dtype=np.float64), (count, 3))
+
+def displacement(model, pts, nrms, u, v, params, count):
+    """
+    计算 count 个变体的位移 (V, N, 3)
+    params 中每个值为长度 V 的数组（或可广播的标量），向量参数为 V×3
+    """
+    if model == "tool_marks":
+        scale, freq = _column(params, "scale", count), _column(params, "freq", count)
+        xu = row_dot(pts, u)
+        yv = row_dot(pts, v)
+        wave = (scale * np.sin(freq * xu) * np.cos(freq * yv))[..., None]
+        return u[None] * wave + v[None] * wave
+
+    if model == "roughness":
+        sigma = _column(params, "sigma", count)
+        seeds = np.broadcast_to(np.asarray(params.get("seed", 0)), (count,))
+        noise = hash_normal(seeds, len(pts))
+        return (sigma * noise)[..., None] * nrms[None]
+
+    if model == "gradient_noise":
+        amplitude = _column(params, "amplitude", count)
+        wavelength = _column(params, "wavelength", count)
+        seeds = np.broadcast_to(np.asarray(params.get("seed", 0)), (count,))
+        offsets = 256 * hash_uniform(seeds, 3)
+        coords = pts[None] / wavelength[..., None] + offsets[:, None, :]
+        return (amplitude * perlin_noise(coords))[..., None] * nrms[None]
+
+    if model == "step":
+        height, position = _column(params, "height", count), _column(params, "position", count)
+        direction = _vectors(params, "direction", count)
+        direction = direction / np.linalg.norm(direction, axis=1, keepdims=True)
+        side = (direction @ pts.T) > position
+        return (height * side)[..., None] * nrms[None]
+
+    if model == "gouge":
+        depth, radius = _column(params, "depth", count), _column(params, "radius", count)
+        center = _vectors(params, "center", count)
+        sq = np.sum((pts[None] - center[:, None, :]) ** 2, axis=2)
+        return (-depth * np.exp(-sq / (2 * radius ** 2)))[..., None] * nrms[None]
+
+    if model == "normal_offset":
+        offset = _column(params, "offset", count)
+        return np.broadcast_to(offset[..., None] * nrms[None], (count, len(pts), 3))
+
+    raise ValueError(f"未知的误差模型: {model}")
+
+def param_grid(**ranges):
+    """参数网格：param_grid(scale=[0.01, 0.05], freq=[5, 10]) -> 4 组参数的数组字典"""
+    keys = list(ranges)
+    combos = list(itertools.product(*(ranges[k] for k in keys)))
+    return {k: np.array([c[i] for c in combos]) for i, k in enumerate(keys)}
+
+def variant_count(params):
+    """变体数 = 参数数组的最大长度；标量参数对所有变体共用，向量参数需写成 V×3"""
+    return max(np.shape(v)[0] if np.ndim(v) >= 1 else 1 for v in params.values())
+
+def _select(params, count, index):
+    """按变体编号（整数或切片）取出参数，长度不为 count 的参数视为共用"""
+    return {k: (np.asarray(v)[index] if np.ndim(v) >= 1 and np.shape(v)[0] == count else v)
+            for k, v in params.items()}
+
+def simulate_variants(pts, nrms, model, params, max_elements=MAX_ELEMENTS_PER_CHUNK):
+    """
+    逐块生成一个模型所有参数组合的变形点云
+    逐块 yield (变体起始编号, 变形后的点 V×N×3, 位移大小 V×N)
+    """
+    count = variant_count(params)
+    u, v = orthogonal_basis_batch(nrms)
+    per_chunk = max(1, max_elements // max(1, len(pts)))
+    for start in range(0, count, per_chunk):
+        stop = min(count, start + per_chunk)
+        offset = displacement(model, pts, nrms, u, v, _select(params, count, slice(start, stop)), stop - start)
+        magnitude = np.sqrt(np.matmul(offset[..., None, :], offset[..., :, None])[..., 0, 0])
+        yield start, pts[None] + offset, magnitude
+
+def write_variant_dataset(output_dir, name, pts, nrms, model_params, colors=None):
+    """
+    把每个模型的所有变体写成二进制 PLY（附带 offset 标量），并生成清单
+    model_params: {模型名: 参数数组字典}
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {"source": name, "points": len(pts), "variants": []}
+    for model, params in model_params.items():
+        count = variant_count(params)
+        for start, variants, magnitudes in simulate_variants(pts, nrms, model, params):
+            for k in range(len(variants)):
+                index = start + k
+                file_name = f"{name}_{model}_{index:03d}.ply"
+                write_ply_binary(os.path.join(output_dir, file_name), variants[k], normals=nrms,
+                                 colors=colors, scalars=magnitudes[k], scalar_name="offset")
+                manifest["variants"].append({
+                    "file": file_name,
+                    "model": model,
+                    "params": {key: np.asarray(val).tolist() for key, val in _select(params, count, index).items()},
+                    "max_offset": float(magnitudes[k].max()),
+                    "rms_offset": float(np.sqrt(np.mean(magnitudes[k] ** 2))),
+                })
+    manifest_path = os.path.join(output_dir, f"{name}_defects_manifest.json")
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    return manifest_path
+
+if __name__ == "__main__":
+    input_path = "output/MachinedPartModel_0630.ply"
+    output_dir = "testcase/defects/MachinedPartModel_0630"
+    name = os.path.splitext(os.path.basename(input_path))[0]
+
+    pts, nrms, colors = read_ply_arrays(input_path)
+
+    model_params = {
+        "tool_marks": param_grid(scale=[0.01, 0.02, 0.05], freq=[0.1, 1, 10]),
+        "roughness": param_grid(sigma=[0.005, 0.01, 0.02], seed=[0, 1, 2]),
+        "gradient_noise": param_grid(amplitude=[0.02, 0.05], wavelength=[5.0, 20.0], seed=[0, 1]),
+        "step": {"height": np.array([0.05, 0.1, 0.2]), "position": np.zeros(3),
+                 "direction": np.array([[1.0, 0.0, 0.0]] * 3)},
+        "gouge": {"depth": np.array([0.1, 0.3]), "radius": np.array([2.0, 5.0]),
+                  "center": np.tile(pts.mean(axis=0), (2, 1))},
+        "normal_offset": param_grid(offset=[-0.1, -0.05, 0.05, 0.1]),
+    }
+
+    manifest_path = write_variant_dataset(output_dir, name, pts, nrms, model_params, colors=colors)
+    print(f"[✓] 变体数据集已保存，清单: {manifest_path}")
@@ -1,17 +1,23 @@
 """
 Description : 模拟加工表面的粗糙度
+apply_surface_wave 对全部法向量一次性构造切平面基底并分块计算波纹位移，
+结果与逐点调用 orthogonal_basis 的写法逐位一致
 """
 
 import vtk
 import numpy as np
 import random
+from vtk.util.numpy_support import vtk_to_numpy, numpy_to_vtk
+
+# 分块大小：每块的中间数组约为 CHUNK_SIZE × 3 × 8 字节 × 十几个
+CHUNK_SIZE = 1 << 18
 
 def ply_to_numpy(polydata):
     points = polydata.GetPoints()
     normals = polydata.GetPointData().GetNormals()
     
-    pts_np = np.array([points.GetPoint(i) for i in range(points.GetNumberOfPoints())])
-    nrm_np = np.array([normals.GetTuple(i) for i in range(normals.GetNumberOfTuples())])
+    pts_np = vtk_to_numpy(points.GetData()).astype(np.float64)
+    nrm_np = vtk_to_numpy(normals).astype(np.float64)
     return pts_np, nrm_np
 
 def orthogonal_basis(normal):
@@ -36,20 +42,46 @@ def orthogonal_basis(normal):
     v /= np.linalg.norm(v)
     return u, v
 
-def apply_surface_wave(pts, nrms, scale=0.05, freq=10):
-    new_pts = np.zeros_like(pts)
-    magnitudes = np.zeros(len(pts))
+def row_dot(a, b):
+    """逐行点积；用批量 matmul 计算，与对单个向量调用 np.dot 的舍入结果一致"""
+    return np.matmul(a[:, None, :], b[:, :, None])[:, 0, 0]
+
+def row_norm(a):
+    return np.sqrt(row_dot(a, a))
+
+def orthogonal_basis_batch(normals):
+    """orthogonal_basis 的批量版本：用 np.where 代替分支，返回 (u, v)，均为 N×3"""
+    n = normals / row_norm(normals)[:, None]
+    # 选择一个与 n 不平行的向量作为参考，优先级与 orthogonal_basis 相同
+    use_x = np.abs(n[:, 0]) < 0.9
+    use_y = ~use_x & (np.abs(n[:, 1]) < 0.9)
+    use_z = ~use_x & ~use_y
+    tmp = np.stack([use_x, use_y, use_z], axis=1).astype(np.float64)
 
-    for i, (p, n) in enumerate(zip(pts, nrms)):
-        u, v = orthogonal_basis(n)
+    u = np.cross(n, tmp)
+    u_norm = row_norm(u)
+    degenerate = u_norm < 1e-6
+    u = np.where(degenerate[:, None], np.array([1.0, 0.0, 0.0]), u / np.where(degenerate, 1.0, u_norm)[:, None])
+
+    v = np.cross(n, u)
+    v /= row_norm(v)[:, None]
+    return u, v
+
+def apply_surface_wave(pts, nrms, scale=0.05, freq=10, chunk_size=CHUNK_SIZE):
+    new_pts = np.empty_like(pts, dtype=np.float64)
+    magnitudes = np.empty(len(pts))
+
+    for start in range(0, len(pts), chunk_size):
+        stop = start + chunk_size
+        p = pts[start:stop]
+        u, v = orthogonal_basis_batch(nrms[start:stop])
         # 将局部坐标投影成面上的x, y
-        xu = np.dot(p, u)
-        yv = np.dot(p, v)
-        wave = scale * np.sin(freq * xu) * np.cos(freq * yv)
+        xu = row_dot(p, u)
+        yv = row_dot(p, v)
+        wave = (scale * np.sin(freq * xu) * np.cos(freq * yv))[:, None]
         offset = u * wave + v * wave  # 双方向扰动
-        new_p = p + offset
-        new_pts[i] = new_p
-        magnitudes[i] = np.linalg.norm(offset)
+        new_pts[start:stop] = p + offset
+        magnitudes[start:stop] = row_norm(offset)
 
     return new_pts, magnitudes
 
@@ -63,10 +95,11 @@ def numpy_to_polydata(points, normals, scalars):
     vtk_scalars = vtk.vtkFloatArray()
     vtk_scalars.SetName("OffsetMagnitude")
 
-    for i in range(len(points)):
-        vtk_points.InsertNextPoint(points[i])
-        vtk_normals.InsertNextTuple(normals[i])
-        vtk_scalars.InsertNextValue(scalars[i])
+    vtk_points.SetData(numpy_to_vtk(np.ascontiguousarray(points, dtype=np.float64), deep=True))
+    vtk_normals.DeepCopy(numpy_to_vtk(np.ascontiguousarray(normals, dtype=np.float32), deep=True))
+    vtk_normals.SetName("Normals")
+    vtk_scalars.DeepCopy(numpy_to_vtk(np.ascontiguousarray(scalars, dtype=np.float32), deep=True))
+    vtk_scalars.SetName("OffsetMagnitude")
 
     polydata.SetPoints(vtk_points)
     polydata.GetPointData().SetNormals(vtk_normals)
@@ -0,0 +1,307 @@
+"""
+Description : 点云相对 CAD 模型（STL）的偏差分析
+对 MachinedPartModel_0630、CylinderSegmentReconstruction_0630 这类加工件，
+计算配准后每个测量点到 CAD 表面的有符号距离：
+1. 对 STL 只建一次定位结构：按 Morton 码排序的线性 BVH（三角形包围盒层次），
+   同时预计算面法向、边/顶点的角度加权伪法向（用于判断正负）
+2. 以最近重心所在三角形的距离为上界，所有点同步逐层遍历 BVH，
+   只保留包围盒距离不超过上界的节点，叶子内向量化计算精确的点到三角形距离
+3. 按块多线程并行查询
+4. 输出逐点偏差、统计量和按偏差着色的 PLY
+"""
+
+import os
+import json
+import time
+import numpy as np
+import vtk
+from concurrent.futures import ThreadPoolExecutor
+from vtk.util.numpy_support import vtk_to_numpy
+
+from pointcloud_io import read_ply_arrays, write_ply_binary
+from spatial_index import PointIndex
+
+CHUNK_SIZE = 1 << 16
+
+def read_stl_triangles(file_path):
+    """读取 STL，返回 (顶点 V×3, 三角形索引 M×3)"""
+    reader = vtk.vtkSTLReader()
+    reader.SetFileName(file_path)
+    triangle_filter = vtk.vtkTriangleFilter()
+    triangle_filter.SetInputConnection(reader.GetOutputPort())
+    triangle_filter.Update()
+    polydata = triangle_filter.GetOutput()
+
+    vertices = vtk_to_numpy(polydata.GetPoints().GetData()).astype(np.float64)
+    faces = vtk_to_numpy(polydata.GetPolys().GetConnectivityArray()).reshape(-1, 3).astype(np.int64)
+    return vertices, faces
+
+def _unit(v):
+    norm = np.linalg.norm(v, axis=-1, keepdims=True)
+    return v / np.where(norm > 0, norm, 1.0)
+
+def _row_dot(a, b):
+    return np.einsum("ij,ij->i", a, b)
+
+def morton_codes(points, bits=21):
+    """三维 Morton 码：坐标量化到 bits 位后逐位交错"""
+    lo = points.min(axis=0)
+    extent = np.maximum(np.ptp(points, axis=0), 1e-300)
+    q = ((points - lo) / extent * ((1 << bits) - 1)).astype(np.uint64)
+
+    def spread(x):
+        x &= np.uint64(0x1FFFFF)
+        x = (x | x << np.uint64(32)) & np.uint64(0x1F00000000FFFF)
+        x = (x | x << np.uint64(16)) & np.uint64(0x1F0000FF0000FF)
+        x = (x | x << np.uint64(8)) & np.uint64(0x100F00F00F00F00F)
+        x = (x | x << np.uint64(4)) & np.uint64(0x10C30C30C30C30C3)
+        x = (x | x << np.uint64(2)) & np.uint64(0x1249249249249249)
+        return x
+
+    return spread(q[:, 0]) | spread(q[:, 1]) << np.uint64(1) | spread(q[:, 2]) << np.uint64(2)
+
+def closest_barycentric(ap, ab, ac, ab_ab, ab_ac, ac_ac):
+    """
+    批量求点到三角形的最近点（Ericson, Real-Time Collision Detection 5.1.5）
+    ap = p - a，ab/ac 为两条边，ab_ab/ab_ac/ac_ac 为每个三角形预先算好的边点积
+    返回最近点的重心坐标 (v, w)（最近点 = a + v·ab + w·ac）和区域编码：
+    0 面内，1/2/3 顶点 a/b/c，4/5/6 边 ab/bc/ca
+    """
+    d1, d2 = _row_dot(ab, ap), _row_dot(ac, ap)
+    d3, d4 = d1 - ab_ab, d2 - ab_ac     # ab·(p - b), ac·(p - b)
+    d5, d6 = d1 - ab_ac, d2 - ac_ac     # ab·(p - c), ac·(p - c)
+    vc = d1 * d4 - d3 * d2
+    vb = d5 * d2 - d1 * d6
+    va = d3 * d6 - d5 * d4
+
+    region = np.select([
+        (d1 <= 0) & (d2 <= 0),
+        (d3 >= 0) & (d4 <= d3),
+        (vc <= 0) & (d1 >= 0) & (d3 <= 0),
+        (d6 >= 0) & (d5 <= d6),
+        (vb <= 0) & (d2 >= 0) & (d6 <= 0),
+        (va <= 0) & ((d4 - d3) >= 0) & ((d5 - d6) >= 0),
+    ], [1, 2, 4, 3, 6, 5], default=0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        denom = va + vb + vc
+        t_ab = d1 / (d1 - d3)
+        t_ca = d2 / (d2 - d6)
+        t_bc = (d4 - d3) / ((d4 - d3) + (d5 - d6))
+        v = np.select([region == 0, region == 2, region == 4, region == 5], [vb / denom, 1.0, t_ab, 1.0 - t_bc], 0.0)
+        w = np.select([region == 0, region == 3, region == 6, region == 5], [vc / denom, 1.0, t_ca, t_bc], 0.0)
+    return v, w, region
+
+def closest_point_on_triangles(p, a, b, c):
+    """批量求点到三角形的最近点，返回 (最近点 K×3, 区域编码 K)"""
+    ab, ac = b - a, c - a
+    v, w, region = closest_barycentric(p - a, ab, ac, _row_dot(ab, ab), _row_dot(ab, ac), _row_dot(ac, ac))
+    return a + ab * v[:, None] + ac * w[:, None], region
+
+class TriangleLocator:
+    """STL 三角面的最近点定位结构，构建一次后可反复批量查询"""
+
+    def __init__(self, vertices, faces, leaf_size=4):
+        self.vertices = vertices
+        self.faces = faces
+        a, b, c = (vertices[faces[:, i]] for i in range(3))
+        self.a, self.ab, self.ac = a, b - a, c - a
+        self.ab_ab = _row_dot(self.ab, self.ab)
+        self.ab_ac = _row_dot(self.ab, self.ac)
+        self.ac_ac = _row_dot(self.ac, self.ac)
+
+        # 面法向与角度加权的顶点伪法向、边伪法向，用于在顶点/边区域正确判断正负
+        cross = np.cross(b - a, c - a)
+        self.face_normals = _unit(cross)
+        corner_angles = np.stack([
+            self._angle(b - a, c - a), self._angle(c - b, a - b), self._angle(a - c, b - c)], axis=1)
+        vertex_normals = np.zeros_like(vertices)
+        for i in range(3):
+            np.add.at(vertex_normals, faces[:, i], corner_angles[:, i:i + 1] * self.face_normals)
+        self.vertex_normals = _unit(vertex_normals)
+
+        local_edges = np.stack([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]], axis=1)  # M×3×2
+        keys = np.sort(local_edges.reshape(-1, 2), axis=1)
+        _, edge_ids = np.unique(keys, axis=0, return_inverse=True)
+        edge_ids = edge_ids.reshape(-1)
+        edge_normals = np.zeros((edge_ids.max() + 1, 3))
+        np.add.at(edge_normals, edge_ids, np.repeat(self.face_normals, 3, axis=0))
+        self.edge_normals = _unit(edge_normals)
+        self.face_edges = edge_ids.reshape(-1, 3)
+
+        # 线性 BVH：三角形按重心的 Morton 码排序后每 leaf_size 个组成一个叶子，
+        # 叶子数补齐到 2 的幂，按完全二叉树（堆序，根节点编号 1）自底向上合并包围盒
+        centroid = (a + b + c) / 3
+        order = np.argsort(morton_codes(centroid), kind="stable")
+        num_leaves = 1 << max(0, int(np.ceil(np.log2(max(1, -(-len(faces) // leaf_size))))))
+        leaf_faces = np.full(num_leaves * leaf_size, -1, dtype=np.int64)
+        leaf_faces[:len(order)] = order
+        self.leaf_faces = leaf_faces.reshape(num_leaves, leaf_size)
+        self.num_leaves = num_leaves
+        self.depth = num_leaves.bit_length() - 1
+
+        # 包围盒存为 [lo, hi] 共 6 列；节点 i 的两个子节点 2i、2i+1 相邻存放，一次取出
+        self.tri_box = np.hstack((np.minimum(np.minimum(a, b), c), np.maximum(np.maximum(a, b), c)))
+        padded = self.leaf_faces.reshape(-1)
+        empty = np.array([np.inf] * 3 + [-np.inf] * 3)
+        leaf_box = np.where((padded >= 0)[:, None], self.tri_box[padded], empty).reshape(num_leaves, leaf_size, 6)
+        boxes = np.empty((2 * num_leaves, 6))
+        boxes[num_leaves:, :3], boxes[num_leaves:, 3:] = leaf_box[..., :3].min(axis=1), leaf_box[..., 3:].max(axis=1)
+        level = num_leaves
+        while level > 1:
+            parent = np.arange(level // 2, level)
+            boxes[parent, :3] = np.minimum(boxes[2 * parent, :3], boxes[2 * parent + 1, :3])
+            boxes[parent, 3:] = np.maximum(boxes[2 * parent, 3:], boxes[2 * parent + 1, 3:])
+            level //= 2
+        self.child_boxes = boxes.reshape(num_leaves, 2, 6)
+
+        # 重心 KD-tree 只用来给每个点一个初始的距离上界
+        self.centroid_index = PointIndex(centroid)
+
+    @staticmethod
+    def _angle(u, v):
+        cos = np.einsum("ij,ij->i", _unit(u), _unit(v))
+        return np.arccos(np.clip(cos, -1.0, 1.0))
+
+    def _candidates(self, points, rows, faces):
+        """对候选 (点编号, 面编号) 逐对求最近点，返回 (距离², v, w, 区域)"""
+        f = faces
+        ab, ac = self.ab[f], self.ac[f]
+        ap = points[rows] - self.a[f]
+        v, w, region = closest_barycentric(ap, ab, ac, self.ab_ab[f], self.ab_ac[f], self.ac_ac[f])
+        diff = ap - ab * v[:, None] - ac * w[:, None]
+        d2 = _row_dot(diff, diff)
+        return np.where(np.isnan(d2), np.inf, d2), v, w, region
+
+    def _pseudo_normals(self, faces, region):
+        normals = self.face_normals[faces].copy()
+        for code, corner in ((1, 0), (2, 1), (3, 2)):
+            mask = region == code
+            normals[mask] = self.vertex_normals[self.faces[faces[mask], corner]]
+        for code, local in ((4, 0), (5, 1), (6, 2)):
+            mask = region == code
+            normals[mask] = self.edge_normals[self.face_edges[faces[mask], local]]
+        return normals
+
+    @staticmethod
+    def _box_distance2(points, boxes):
+        """points: m×3，boxes: m×...×6，返回点到包围盒距离的平方"""
+        p = points.reshape(points.shape[:1] + (1,) * (boxes.ndim - 2) + (3,))
+        gap = boxes[..., :3] - p
+        np.maximum(gap, p - boxes[..., 3:], out=gap)
+        np.maximum(gap, 0.0, out=gap)
+        return np.einsum("...k,...k->...", gap, gap)
+
+    def signed_distance(self, points, k=1):
+        """返回 (有符号距离, 最近点)，正值表示位于法向一侧（材料外侧）"""
+        n = len(points)
+        rows = np.arange(n)
+
+        # 最近 k 个重心所在三角形的精确距离作为上界
+        k = min(k, len(self.faces))
+        # 外层已按块多线程，这里单线程查询
+        _, nearest = self.centroid_index.knn(points, k=k, workers=1)
+        nearest = nearest.reshape(n, k)
+        d2, _, _, _ = self._candidates(points, np.repeat(rows, k), nearest.reshape(-1))
+        # 略微放宽，避免舍入误差把上界所在的三角形本身筛掉
+        bound = d2.reshape(n, k).min(axis=1) * (1 + 1e-9) + 1e-300
+
+        # 所有点同步地逐层下行，只保留包围盒距离不超过上界的 (点, 节点) 对
+        pair_rows, pair_nodes = rows, np.ones(n, dtype=np.int64)
+        for _ in range(self.depth):
+            d2 = self._box_distance2(points[pair_rows], self.child_boxes[pair_nodes])
+            pair, child = np.nonzero(d2 <= bound[pair_rows][:, None])
+            pair_rows, pair_nodes = pair_rows[pair], 2 * pair_nodes[pair] + child
+
+        # 叶子内的三角形先用各自的包围盒筛一遍，剩下的精确求最近点，每个点取最小值
+        cand = self.leaf_faces[pair_nodes - self.num_leaves]
+        cand_rows = np.repeat(pair_rows, cand.shape[1])
+        cand = cand.reshape(-1)
+        valid = cand >= 0
+        cand_rows, cand = cand_rows[valid], cand[valid]
+        keep = self._box_distance2(points[cand_rows], self.tri_box[cand]) <= bound[cand_rows]
+        cand_rows, cand = cand_rows[keep], cand[keep]
+        cd2, cv, cw, cregion = self._candidates(points, cand_rows, cand)
+        order = np.lexsort((cd2, cand_rows))
+        first = order[np.r_[True, cand_rows[order][1:] != cand_rows[order][:-1]]]
+        faces, v, w, region, d2 = cand[first], cv[first], cw[first], cregion[first], cd2[first]
+
+        closest = self.a[faces] + self.ab[faces] * v[:, None] + self.ac[faces] * w[:, None]
+        normals = self._pseudo_normals(faces, region)
+        sign = np.where(_row_dot(points - closest, normals) < 0, -1.0, 1.0)
+        return sign * np.sqrt(d2), closest
+
+def compute_deviation(locator, points, chunk_size=CHUNK_SIZE, workers=None):
+    """分块多线程计算全部点的有符号偏差"""
+    deviation = np.empty(len(points))
+    chunks = [(s, min(s + chunk_size, len(points))) for s in range(0, len(points), chunk_size)]
+
+    def run(bounds):
+        s, e = bounds
+        deviation[s:e], _ = locator.signed_distance(points[s:e])
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        list(pool.map(run, chunks))
+    return deviation
+
+def deviation_statistics(deviation, tolerance=None):
+    """偏差统计量"""
+    stats = {
+        "count": int(len(deviation)),
+        "mean": float(np.mean(deviation)),
+        "std": float(np.std(deviation)),
+        "rms": float(np.sqrt(np.mean(deviation ** 2))),
+        "mean_abs": float(np.mean(np.abs(deviation))),
+        "min": float(np.min(deviation)),
+        "max": float(np.max(deviation)),
+        "percentiles": {str(q): float(v) for q, v in zip((1, 5, 50, 95, 99),
+                                                         np.percentile(deviation, [1, 5, 50, 95, 99]))},
+    }
+    if tolerance is not None:
+        stats["tolerance"] = tolerance
+        stats["within_tolerance"] = float(np.mean(np.abs(deviation) <= tolerance))
+    return stats
+
+def deviation_colors(deviation, limit=None):
+    """蓝-白-红 发散色带：负偏差为蓝，正偏差为红，limit 默认取 |偏差| 的 99 分位"""
+    if limit is None:
+        limit = float(np.percentile(np.abs(deviation), 99)) or 1.0
+    t = np.clip(deviation / limit, -1.0, 1.0)[:, None]
+    blue, white, red = np.array([59, 76, 192]), np.array([245, 245, 245]), np.array([180, 4, 38])
+    colors = np.where(t < 0, white + (blue - white) * -t, white + (red - white) * t)
+    return np.rint(colors).astype(np.uint8)
+
+if __name__ == "__main__":
+    stl_path = "mdl/MachinedPartModel_0630.stl"
+    cloud_path = "output/MachinedPartModel_0630_Transformed.ply"
+    registration_matrix_path = None  # 可选：把点云变换到 CAD 坐标系的 4×4 矩阵（如 res_trans）
+    tolerance = 0.05                 # 公差带（模型单位）
+    output_dir = "output/deviation"
+
+    os.makedirs(output_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(cloud_path))[0]
+
+    start = time.perf_counter()
+    vertices, faces = read_stl_triangles(stl_path)
+    locator = TriangleLocator(vertices, faces)
+    print(f"STL 三角面 {len(faces)} 个，BVH 叶子 {locator.num_leaves} 个，建树耗时 {time.perf_counter() - start:.2f}s")
+
+    points, normals, _ = read_ply_arrays(cloud_path)
+    if registration_matrix_path:
+        T = np.loadtxt(registration_matrix_path).reshape(4, 4)
+        points = points @ T[:3, :3].T + T[:3, 3]
+
+    start = time.perf_counter()
+    deviation = compute_deviation(locator, points)
+    print(f"{len(points)} 个点的偏差计算耗时 {time.perf_counter() - start:.2f}s")
+
+    stats = deviation_statistics(deviation, tolerance)
+    print(json.dumps(stats, indent=2, ensure_ascii=False))
+
+    np.save(os.path.join(output_dir, f"{name}_deviation.npy"), deviation.astype(np.float32))
+    with open(os.path.join(output_dir, f"{name}_deviation_stats.json"), "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2, ensure_ascii=False)
+    colored_path = os.path.join(output_dir, f"{name}_deviation.ply")
+    write_ply_binary(colored_path, points, normals=normals, colors=deviation_colors(deviation),
+                     scalars=deviation, scalar_name="deviation")
+    print(f"[✓] 偏差着色点云已保存到 {colored_path}")
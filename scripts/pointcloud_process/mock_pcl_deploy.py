@@ -0,0 +1,104 @@
+"""
+Description : PCL_Deploy.exe 的 Python 模拟求解器
+参数与真实程序一致：source target out_dir algo + 16 个 ground truth 值
+按真实日志格式输出迭代行、耗时和 res_trans，用于在没有 exe 的机器上
+测试和压测并行驱动、日志解析与缓存
+
+迭代次数、每次迭代延时和额外输出量可通过命令行选项或环境变量配置：
+    MOCK_SOLVER_ITERS        迭代次数（默认 40）
+    MOCK_SOLVER_DELAY        每次迭代的延时，秒（默认 0.01）
+    MOCK_SOLVER_EXTRA_LINES  每次迭代额外输出的调试行数（默认 0）
+    MOCK_SOLVER_SEED         随机种子（默认按参数生成，保证同一输入结果可复现）
+
+示例：
+    python scripts/pointcloud_process/mock_pcl_deploy.py src.ply tgt.ply out/ ICP 1 0 0 0 0 1 0 0 0 0 1 0 0 0 0 1
+"""
+
+import os
+import sys
+import time
+import zlib
+import argparse
+import numpy as np
+
+from solver_log import format_header, format_iter_line, format_footer, first_iteration
+
+def read_ply_vertex_count(ply_path):
+    """只读取 PLY 文件头，返回 element vertex 的数量，文件不存在时返回 0"""
+    if not os.path.exists(ply_path):
+        return 0
+    with open(ply_path, 'rb') as f:
+        for raw in f:
+            line = raw.decode('ascii', errors='ignore').strip()
+            if line.startswith("element vertex"):
+                return int(line.split()[-1])
+            if line == "end_header":
+                break
+    return 0
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="PCL_Deploy.exe 模拟求解器")
+    parser.add_argument("source")
+    parser.add_argument("target")
+    parser.add_argument("out_dir")
+    parser.add_argument("algo")
+    parser.add_argument("gt", nargs=16, type=float)
+    parser.add_argument("--iters", type=int, default=int(os.environ.get("MOCK_SOLVER_ITERS", 40)))
+    parser.add_argument("--delay", type=float, default=float(os.environ.get("MOCK_SOLVER_DELAY", 0.01)))
+    parser.add_argument("--extra-lines", type=int, default=int(os.environ.get("MOCK_SOLVER_EXTRA_LINES", 0)))
+    parser.add_argument("--u-value", type=float, default=0.0005)
+    parser.add_argument("--seed", type=int, default=os.environ.get("MOCK_SOLVER_SEED"))
+    return parser.parse_args(argv)
+
+def simulate_curve(rng, iters, start=0.0191312, floor=4e-7):
+    """生成单调下降并带少量抖动的 gt_mse 序列"""
+    rate = rng.uniform(0.55, 0.8)
+    curve = np.maximum(start * rate ** np.arange(iters), floor)
+    jitter = np.exp(rng.normal(0.0, 0.05, iters))
+    jitter[0] = 1.0
+    return curve * jitter
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    # 与真实程序一致使用 GBK 输出，逐行刷新以便驱动端实时读取
+    sys.stdout.reconfigure(encoding="gbk", errors="replace", line_buffering=True)
+
+    seed = args.seed
+    if seed is None:
+        seed = zlib.crc32(f"{args.source}|{args.target}|{args.algo}".encode("utf-8"))
+    rng = np.random.default_rng(int(seed))
+
+    gt = np.array(args.gt).reshape((4, 4))
+    n_source = read_ply_vertex_count(args.source)
+    n_target = read_ply_vertex_count(args.target)
+
+    for line in format_header(args.source, args.target, args.algo, n_source, n_target, u_value=args.u_value):
+        print(line)
+
+    start = time.perf_counter()
+    curve = simulate_curve(rng, args.iters)
+    u = float(rng.uniform(0.04, 0.12))
+    first = first_iteration(args.algo)
+    # ICP/FICP 的日志中 u 恒为 1
+    fixed_u = args.algo in ("ICP", "FICP")
+    for k, gt_mse in enumerate(curve):
+        if args.delay > 0:
+            time.sleep(args.delay)
+        if k and k % 8 == 0:
+            u *= 0.5
+        print(format_iter_line(args.algo, first + k, gt_mse, u=1.0 if fixed_u else u, v=0.0,
+                               pos_ratio=min(0.999, 0.88 + 0.01 * k), direction=float(rng.uniform(0.05, 0.3))))
+        for j in range(args.extra_lines):
+            print(f"  debug: iter {first + k} block {j} residual {rng.random():g}")
+    time_total = time.perf_counter() - start
+
+    # 结果矩阵在真值附近加入与最终误差同量级的扰动
+    res_trans = gt.copy()
+    res_trans[:3, :] += rng.normal(0.0, np.sqrt(curve[-1]), (3, 4)) * 0.1
+    reg_path = os.path.join(args.out_dir, f"m{args.algo}reg_pc.ply")
+    for line in format_footer(time_total, res_trans, reg_path):
+        print(line)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""
+Description : 基于 KD-tree 的离群点去除
+扫描仪导出的 TXT 点云中常有游离点，会撑大相机设置用的包围盒，也会拉高配准 RMSE：
+1. 统计滤波：每个点到 k 个近邻的平均距离，超出全局 均值 + std_ratio × 标准差 的视为离群点
+2. 半径滤波：半径 r 内的邻居数（不含自身）少于 min_neighbors 的视为离群点
+两种方法都在共享 KD-tree 索引上按块批量查询，内存占用与块大小成正比；
+返回保留点的布尔掩码，法向量、颜色用同一掩码索引即可保持对齐
+"""
+
+import os
+import numpy as np
+
+from pointcloud_io import read_ply_arrays, write_ply_binary
+from spatial_index import cached_index
+
+def mean_knn_distance(points, k=16, index=None, chunk_size=1 << 16):
+    """每个点到 k 个近邻（不含自身）的平均距离"""
+    points = np.asarray(points[:, :3], dtype=np.float64)
+    index = cached_index(points) if index is None else index
+    mean_dist = np.empty(len(points))
+    for s in range(0, len(points), chunk_size):
+        dist, _ = index.knn(points[s:s + chunk_size], k=k + 1)
+        mean_dist[s:s + chunk_size] = dist[:, 1:].mean(axis=1)
+    return mean_dist
+
+def statistical_outlier_mask(points, k=16, std_ratio=2.0, index=None, chunk_size=1 << 16):
+    """统计滤波，返回保留点的掩码（平均近邻距离不超过 均值 + std_ratio × 标准差）"""
+    mean_dist = mean_knn_distance(points, k=k, index=index, chunk_size=chunk_size)
+    return mean_dist <= mean_dist.mean() + std_ratio * mean_dist.std()
+
+def radius_outlier_mask(points, radius, min_neighbors=4, index=None, chunk_size=1 << 16):
+    """半径滤波，返回保留点的掩码（半径内除自身外至少 min_neighbors 个邻居）"""
+    points = np.asarray(points[:, :3], dtype=np.float64)
+    index = cached_index(points) if index is None else index
+    counts = np.empty(len(points), dtype=np.int64)
+    for s in range(0, len(points), chunk_size):
+        counts[s:s + chunk_size] = index.radius_count(points[s:s + chunk_size], radius)
+    return counts - 1 >= min_neighbors
+
+def remove_outliers(points, k=16, std_ratio=2.0, radius=None, min_neighbors=4, chunk_size=1 << 16):
+    """
+    依次做统计滤波和（给定 radius 时的）半径滤波，返回保留点的掩码
+    第二步在第一步的结果上重新建索引，避免已剔除的离群点继续充当邻居
+    """
+    points = np.asarray(points[:, :3], dtype=np.float64)
+    mask = statistical_outlier_mask(points, k=k, std_ratio=std_ratio, chunk_size=chunk_size)
+    if radius is not None:
+        kept = np.flatnonzero(mask)
+        mask[kept] = radius_outlier_mask(points[kept], radius, min_neighbors=min_neighbors, chunk_size=chunk_size)
+    return mask
+
+if __name__ == "__main__":
+    input_path = "testcase/models/aquarius_source.ply"
+    output_path = "testcase/models/aquarius_cleaned_source.ply"
+    k = 16
+    std_ratio = 2.0
+    radius = None          # 例如 0.02，None 表示只做统计滤波
+    min_neighbors = 4
+
+    points, normals, colors = read_ply_arrays(input_path)
+    mask = remove_outliers(points, k=k, std_ratio=std_ratio, radius=radius, min_neighbors=min_neighbors)
+    print(f"离群点去除：{len(points)} -> {mask.sum()} 个点（剔除 {len(points) - mask.sum()} 个）")
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    write_ply_binary(output_path, points[mask],
+                     normals=None if normals is None else normals[mask],
+                     colors=None if colors is None else colors[mask])
+    print(f"[✓] 已保存到 {output_path}")
@@ -0,0 +1,68 @@
+"""
+Description : 向量化的点云读写
+用 numpy_support 一次性拿到 vtk 数组，避免逐点 GetPoint 的 Python 循环；
+写出二进制 PLY 时用结构化数组一次写盘
+"""
+
+import numpy as np
+import vtk
+from vtk.util.numpy_support import vtk_to_numpy
+
+def read_ply_arrays(file_path):
+    """读取 PLY，返回 (points N×3, normals N×3 或 None, colors N×3/N×4 uint8 或 None)"""
+    reader = vtk.vtkPLYReader()
+    reader.SetFileName(file_path)
+    reader.Update()
+    polydata = reader.GetOutput()
+
+    points = vtk_to_numpy(polydata.GetPoints().GetData()).astype(np.float64)
+    normals = polydata.GetPointData().GetNormals()
+    colors = polydata.GetPointData().GetScalars()
+    normals = vtk_to_numpy(normals).astype(np.float64) if normals is not None else None
+    colors = vtk_to_numpy(colors).astype(np.uint8) if colors is not None else None
+    return points, normals, colors
+
+def read_ply_with_normals(file_path):
+    """读取 PLY 点云，返回 N×6 的数组（xyz + normals），与数据集脚本的同名函数结果一致"""
+    points, normals, _ = read_ply_arrays(file_path)
+    if normals is None:
+        normals = np.zeros_like(points)
+    return np.hstack((points, normals))
+
+def write_ply_binary(file_path, points, normals=None, colors=None, scalars=None, scalar_name="scalar"):
+    """
+    保存小端二进制 PLY
+    points: N×3；normals: N×3；colors: N×3 或 N×4 (0~255)；scalars: N 个 float，写为名为 scalar_name 的属性
+    """
+    n = len(points)
+    fields = [("x", "<f4"), ("y", "<f4"), ("z", "<f4")]
+    header = ["property float x", "property float y", "property float z"]
+    if normals is not None:
+        fields += [("nx", "<f4"), ("ny", "<f4"), ("nz", "<f4")]
+        header += ["property float nx", "property float ny", "property float nz"]
+    if colors is not None:
+        color_names = ["red", "green", "blue", "alpha"][:colors.shape[1]]
+        fields += [(c, "u1") for c in color_names]
+        header += [f"property uchar {c}" for c in color_names]
+    if scalars is not None:
+        fields += [(scalar_name, "<f4")]
+        header += [f"property float {scalar_name}"]
+
+    data = np.empty(n, dtype=fields)
+    data["x"], data["y"], data["z"] = points[:, 0], points[:, 1], points[:, 2]
+    if normals is not None:
+        data["nx"], data["ny"], data["nz"] = normals[:, 0], normals[:, 1], normals[:, 2]
+    if colors is not None:
+        for k, c in enumerate(color_names):
+            data[c] = np.clip(colors[:, k], 0, 255)
+    if scalars is not None:
+        data[scalar_name] = scalars
+
+    with open(file_path, "wb") as f:
+        f.write(b"ply\n")
+        f.write(b"format binary_little_endian 1.0\n")
+        f.write(f"element vertex {n}\n".encode("utf-8"))
+        for line in header:
+            f.write(f"{line}\n".encode("utf-8"))
+        f.write(b"end_header\n")
+        data.tofile(f)
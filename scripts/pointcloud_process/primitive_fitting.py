@@ -0,0 +1,311 @@
+"""
+Description : 筒段点云的圆柱 / 平面基元自动拟合
+trans_and_invert.py 中筒段的位姿由手工选取的四个平台点确定，
+interactive_measure.py 则需要在裁剪后的网格上逐个点击测量尺寸，这里改为自动拟合：
+1. 向量化 RANSAC：每批同时生成数千个圆柱（两点 + 法向）或平面（三点）假设，
+   在随机抽取的评估子集上一次性打分
+2. 最优假设的内点再做最小二乘精化（圆柱用 least_squares 的 5 参数化，平面用 SVD）
+3. 返回轴线、半径、内点掩码等，并由平台平面的四个角点调用
+   construct_alignment_matrix 得到与手工选点相同约定的对齐矩阵
+"""
+
+import os
+import json
+import numpy as np
+from scipy.optimize import least_squares
+
+from pointcloud_io import read_ply_arrays
+from trans_and_invert import construct_alignment_matrix, construct_inverse_alignment_matrix
+
+def _unit(v):
+    norm = np.linalg.norm(v, axis=-1, keepdims=True)
+    return v / np.where(norm > 0, norm, 1.0)
+
+def _perpendicular(axis):
+    """任取一个与 axis 垂直的单位向量"""
+    helper = np.array([1.0, 0.0, 0.0]) if abs(axis[0]) < 0.9 else np.array([0.0, 1.0, 0.0])
+    u = np.cross(axis, helper)
+    return u / np.linalg.norm(u)
+
+def cylinder_residuals(points, center, axis, radius):
+    """点到圆柱面的有符号距离：到轴线的距离 - 半径"""
+    d = points - center
+    radial = d - np.outer(d @ axis, axis)
+    return np.linalg.norm(radial, axis=1) - radius
+
+def _adaptive_limit(inlier_ratio, sample_size, confidence, batch_size, max_hypotheses):
+    """按当前内点率估计达到置信度所需的假设数"""
+    if inlier_ratio <= 0:
+        return max_hypotheses
+    needed = np.log(1 - confidence) / np.log(max(1 - inlier_ratio ** sample_size, 1e-12))
+    return min(max_hypotheses, max(batch_size, int(needed)))
+
+def cylinder_hypotheses(p1, n1, p2, n2):
+    """
+    由两点及其法向批量生成圆柱假设 (B×3 轴上点, B×3 轴向, B 半径, B 有效掩码)
+    轴向 = n1 × n2；在垂直于轴的平面内，两条法线的交点即为轴上一点
+    """
+    axis = np.cross(n1, n2)
+    axis_norm = np.linalg.norm(axis, axis=1)
+    valid = axis_norm > 1e-3
+    axis = axis / np.where(valid, axis_norm, 1.0)[:, None]
+
+    # 投影到垂直于轴的平面后解 p1 + s n1 = p2 + t n2（2×2 最小二乘的闭式解）
+    n1p = n1 - np.einsum("bi,bi->b", n1, axis)[:, None] * axis
+    n2p = n2 - np.einsum("bi,bi->b", n2, axis)[:, None] * axis
+    d = p2 - p1
+    a11 = np.einsum("bi,bi->b", n1p, n1p)
+    a12 = -np.einsum("bi,bi->b", n1p, n2p)
+    a22 = np.einsum("bi,bi->b", n2p, n2p)
+    b1 = np.einsum("bi,bi->b", n1p, d)
+    b2 = -np.einsum("bi,bi->b", n2p, d)
+    det = a11 * a22 - a12 * a12
+    valid &= np.abs(det) > 1e-12
+    safe_det = np.where(valid, det, 1.0)
+    s = (a22 * b1 - a12 * b2) / safe_det
+    t = (a11 * b2 - a12 * b1) / safe_det
+
+    center = 0.5 * ((p1 + s[:, None] * n1p) + (p2 + t[:, None] * n2p))
+    radius = 0.5 * (np.abs(s) * np.sqrt(a11) + np.abs(t) * np.sqrt(a22))
+    valid &= np.isfinite(radius) & (radius > 0)
+    return center, axis, radius, valid
+
+def refine_cylinder(points, center, axis, radius, max_points=50000):
+    """
+    圆柱最小二乘精化
+    轴向在初值附近用两个切向分量参数化，轴上点只在垂直于初始轴的平面内移动，共 5 个参数；
+    内点多于 max_points 时等间隔抽取参与优化
+    """
+    sample = points[::max(1, len(points) // max_points)]
+    u = _perpendicular(axis)
+    v = np.cross(axis, u)
+
+    def unpack(x):
+        a = axis + x[0] * u + x[1] * v
+        a = a / np.linalg.norm(a)
+        return center + x[2] * u + x[3] * v, a, x[4]
+
+    def residuals(x):
+        c, a, r = unpack(x)
+        return cylinder_residuals(sample, c, a, r)
+
+    result = least_squares(residuals, np.array([0.0, 0.0, 0.0, 0.0, radius]), method="lm")
+    c, a, r = unpack(result.x)
+    # 轴上点取内点轴向范围的中点，便于直接作为筒段中心使用
+    c = c + a * np.mean(robust_range((points - c) @ a))
+    return c, a, float(abs(r))
+
+def fit_plane_lstsq(points):
+    """SVD 平面拟合，返回 (平面上一点, 单位法向)"""
+    center = points.mean(axis=0)
+    _, _, vt = np.linalg.svd(points - center, full_matrices=False)
+    return center, vt[2]
+
+def ransac_cylinder(points, normals, threshold, normal_threshold_deg=20.0, batch_size=256,
+                    max_hypotheses=200000, confidence=0.999, eval_size=20000, radius_range=None, refine_rounds=5, rng=None):
+    """
+    向量化 RANSAC 圆柱拟合
+    每批生成 batch_size 个假设，在 eval_size 个随机点上以
+    （径向距离 < threshold 且法向与径向夹角 < normal_threshold_deg）计数打分
+    返回 (轴上点, 单位轴向, 半径, 内点掩码, 实际评估的假设数)
+    """
+    if normals is None:
+        raise ValueError("圆柱拟合需要法向量")
+    rng = np.random.default_rng() if rng is None else rng
+    n = len(points)
+    normals = _unit(normals)
+    eval_idx = rng.choice(n, size=min(eval_size, n), replace=False)
+    eval_pts = points[eval_idx].astype(np.float32)
+    eval_nrm = normals[eval_idx].astype(np.float32)
+    cos_threshold = np.float32(np.cos(np.radians(normal_threshold_deg)))
+
+    best_count, best = -1, None
+    evaluated, limit = 0, max_hypotheses
+    while evaluated < limit:
+        sample = rng.integers(0, n, size=(batch_size, 2))
+        center, axis, radius, valid = cylinder_hypotheses(
+            points[sample[:, 0]], normals[sample[:, 0]], points[sample[:, 1]], normals[sample[:, 1]])
+        if radius_range is not None:
+            valid &= (radius >= radius_range[0]) & (radius <= radius_range[1])
+        evaluated += batch_size
+        if not valid.any():
+            continue
+        center, axis, radius = (x[valid].astype(np.float32) for x in (center, axis, radius))
+
+        # B×m 打分：径向残差与法向一致性，float32 计算
+        d = eval_pts[None] - center[:, None, :]
+        along = np.einsum("bmi,bi->bm", d, axis)
+        radial = d - along[..., None] * axis[:, None, :]
+        dist = np.linalg.norm(radial, axis=2)
+        cos = np.abs(np.einsum("bmi,mi->bm", radial, eval_nrm)) / np.maximum(dist, 1e-12)
+        counts = ((np.abs(dist - radius[:, None]) < threshold) & (cos > cos_threshold)).sum(axis=1)
+
+        b = int(np.argmax(counts))
+        if counts[b] > best_count:
+            best_count = int(counts[b])
+            best = (center[b].astype(np.float64), _unit(axis[b].astype(np.float64)), float(radius[b]))
+            limit = _adaptive_limit(best_count / len(eval_idx), 2, confidence, batch_size, max_hypotheses)
+
+    if best is None:
+        raise RuntimeError("没有得到有效的圆柱假设")
+    center, axis, radius = best
+    inliers = np.abs(cylinder_residuals(points, center, axis, radius)) < threshold
+    # 精化后内点集合会变化，交替精化 / 重选内点直到稳定
+    for _ in range(refine_rounds):
+        if inliers.sum() < 5:
+            break
+        center, axis, radius = refine_cylinder(points[inliers], center, axis, radius)
+        updated = np.abs(cylinder_residuals(points, center, axis, radius)) < threshold
+        if np.array_equal(updated, inliers):
+            break
+        inliers = updated
+    # 轴向符号取绝对值最大分量为正，保证结果可复现
+    axis = axis * np.sign(axis[np.argmax(np.abs(axis))])
+    return center, axis, radius, inliers, evaluated
+
+def ransac_plane(points, threshold, batch_size=1024, max_hypotheses=100000, confidence=0.999,
+                 eval_size=20000, rng=None):
+    """
+    向量化 RANSAC 平面拟合，每批 batch_size 个三点假设
+    返回 (平面上一点, 单位法向, 内点掩码, 实际评估的假设数)
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    n = len(points)
+    if n < 3:
+        raise ValueError("点数少于 3，无法拟合平面")
+    eval_pts = points[rng.choice(n, size=min(eval_size, n), replace=False)].astype(np.float32)
+
+    best_count, best = -1, None
+    evaluated, limit = 0, max_hypotheses
+    while evaluated < limit:
+        sample = points[rng.integers(0, n, size=(batch_size, 3))]
+        normal = np.cross(sample[:, 1] - sample[:, 0], sample[:, 2] - sample[:, 0])
+        norm = np.linalg.norm(normal, axis=1)
+        valid = norm > 1e-12
+        evaluated += batch_size
+        if not valid.any():
+            continue
+        normal = (normal[valid] / norm[valid, None]).astype(np.float32)
+        offset = np.einsum("bi,bi->b", normal, sample[valid, 0].astype(np.float32))
+        counts = (np.abs(eval_pts @ normal.T - offset) < threshold).sum(axis=0)
+
+        b = int(np.argmax(counts))
+        if counts[b] > best_count:
+            best_count = int(counts[b])
+            best = (sample[valid][b, 0], normal[b].astype(np.float64))
+            limit = _adaptive_limit(best_count / len(eval_pts), 3, confidence, batch_size, max_hypotheses)
+
+    if best is None:
+        raise RuntimeError("没有得到有效的平面假设")
+    origin, normal = best
+    inliers = np.abs((points - origin) @ normal) < threshold
+    if inliers.sum() >= 3:
+        origin, normal = fit_plane_lstsq(points[inliers])
+        inliers = np.abs((points - origin) @ normal) < threshold
+    return origin, normal, inliers, evaluated
+
+def platform_corners(points, normal, x_dir):
+    """
+    平台内点在 (x_dir, normal × x_dir) 平面坐标系下的包围矩形四角，
+    顺序与手工选点一致：cross(p2 - p1, p3 - p1) 与 normal 同向，p2 - p1 沿 x_dir
+    """
+    x_axis = _unit(x_dir - (x_dir @ normal) * normal)
+    y_axis = np.cross(normal, x_axis)
+    origin = points.mean(axis=0)
+    local = (points - origin) @ np.column_stack([x_axis, y_axis])
+    (x0, x1), (y0, y1) = robust_range(local[:, 0]), robust_range(local[:, 1])
+    corners_2d = np.array([[x0, y0], [x1, y0], [x1, y1], [x0, y1]])
+    return origin + corners_2d @ np.vstack([x_axis, y_axis])
+
+def robust_range(values, bins=256, min_fraction=0.05):
+    """
+    直方图占据范围：计数不低于非空区间计数中位数 min_fraction 倍的区间才算被占据，
+    避免少量恰好落在内点带里的离群点把长度 / 边界撑大
+    """
+    counts, edges = np.histogram(values, bins=bins)
+    occupied = np.nonzero(counts >= min_fraction * np.median(counts[counts > 0]))[0]
+    return edges[occupied[0]], edges[occupied[-1] + 1]
+
+def arc_span(angles, bins=360, min_fraction=0.05):
+    """圆心角覆盖范围（弧度）：2π 减去环形直方图上最长的未占据区间"""
+    counts, _ = np.histogram(np.mod(angles, 2 * np.pi), bins=bins, range=(0, 2 * np.pi))
+    occupied = counts >= min_fraction * np.median(counts[counts > 0])
+    if occupied.all():
+        return 2 * np.pi
+    # 从一个被占据的区间开始展开成线性序列，求最长的连续空段
+    ring = np.roll(~occupied, -int(np.argmax(occupied)))
+    runs = np.diff(np.flatnonzero(np.diff(np.concatenate([[0], ring.astype(np.int8), [0]]))))[::2]
+    return 2 * np.pi * (1 - runs.max() / bins)
+
+def measure_cylinder_segment(points, normals, threshold=None, plane_threshold=None, min_plane_points=500, seed=None):
+    """
+    筒段测量的批量入口：拟合圆柱，再在非圆柱点中拟合平台平面，
+    得到与 trans_and_invert.construct_alignment_matrix 相同约定的对齐矩阵
+    平台法向朝远离圆柱轴线的一侧，x 方向取圆柱轴在平台平面上的投影；
+    找不到平台时用圆柱自身的坐标系（z 为轴向、x 指向内点质心）
+    """
+    rng = np.random.default_rng(seed)
+    diagonal = np.linalg.norm(np.ptp(points, axis=0))
+    threshold = diagonal * 0.002 if threshold is None else threshold
+    plane_threshold = threshold if plane_threshold is None else plane_threshold
+
+    center, axis, radius, inliers, evaluated = ransac_cylinder(points, normals, threshold, rng=rng)
+    along = (points[inliers] - center) @ axis
+    radial = _unit(points[inliers] - center - np.outer(along, axis))
+    u = _perpendicular(axis)
+    angles = np.arctan2(radial @ np.cross(axis, u), radial @ u)
+    result = {
+        "axis": axis,
+        "center": center,
+        "radius": radius,
+        "diameter": 2 * radius,
+        "length": float(np.diff(robust_range(along))[0]),
+        "arc_deg": float(np.degrees(arc_span(angles))),
+        "rms": float(np.sqrt(np.mean(cylinder_residuals(points[inliers], center, axis, radius) ** 2))),
+        "cylinder_inliers": inliers,
+        "hypotheses": evaluated,
+    }
+
+    rest = np.nonzero(~inliers)[0]
+    plane_inliers = np.zeros(len(points), dtype=bool)
+    if len(rest) >= min_plane_points:
+        origin, normal, mask, _ = ransac_plane(points[rest], plane_threshold, rng=rng)
+        if mask.sum() >= min_plane_points:
+            plane_inliers[rest[mask]] = True
+            if normal @ (origin - center) < 0:
+                normal = -normal
+            x_dir = axis if abs(axis @ normal) < 0.99 else _perpendicular(normal)
+            corners = platform_corners(points[plane_inliers], normal, x_dir)
+            result.update(plane_normal=normal, plane_center=corners.mean(axis=0), platform_corners=corners)
+
+    if "platform_corners" not in result:
+        x_dir = _unit(points[inliers].mean(axis=0) - center - ((points[inliers].mean(axis=0) - center) @ axis) * axis)
+        y_dir = np.cross(axis, x_dir)
+        corners = np.array([center, center + x_dir, center + x_dir + y_dir, center + y_dir])
+        corners -= corners.mean(axis=0) - center
+    result["plane_inliers"] = plane_inliers
+    result["alignment_matrix"] = construct_alignment_matrix(corners)
+    result["inverse_alignment_matrix"] = construct_inverse_alignment_matrix(corners)
+    return result
+
+if __name__ == "__main__":
+    input_path = "output/CylinderSegmentReconstruction_0630.ply"
+    output_dir = "output/primitive_fitting"
+
+    os.makedirs(output_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(input_path))[0]
+    points, normals, _ = read_ply_arrays(input_path)
+
+    result = measure_cylinder_segment(points, normals, seed=0)
+    print(f"半径: {result['radius']:.4f}  直径: {result['diameter']:.4f}  长度: {result['length']:.4f}  "
+          f"圆心角: {result['arc_deg']:.2f}°  拟合 RMS: {result['rms']:.4f}")
+    print(f"轴向: {result['axis']}  轴上中心: {result['center']}")
+    print(f"圆柱内点: {result['cylinder_inliers'].sum()}  平台内点: {result['plane_inliers'].sum()}")
+    print("对齐矩阵:")
+    print(result["alignment_matrix"])
+
+    summary = {k: (v.tolist() if isinstance(v, np.ndarray) and v.dtype != bool else v)
+               for k, v in result.items() if not k.endswith("_inliers")}
+    with open(os.path.join(output_dir, f"{name}_primitives.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    np.savetxt(os.path.join(output_dir, f"{name}_alignment.txt"), result["alignment_matrix"], fmt="%.6f")
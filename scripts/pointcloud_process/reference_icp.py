@@ -0,0 +1,229 @@
+"""
+Description : NumPy + KD-tree 实现的参考 ICP 求解器（点到点 / 点到面）
+作为 PCL_Deploy.exe 的仓库内基线，可直接使用数据集脚本生成的 N×6 数组
+1. 每次迭代对全部 source 点做一次批量最近邻查询
+2. 点到点用 SVD 闭式解，点到面用线性化的 6×6 法方程
+3. 支持 float32 计算
+4. 输出与 exe 相同格式的日志（Iter / gt_mse / time total / res_trans），
+   现有结果处理和绘图脚本可直接使用
+5. 可选由粗到细的体素金字塔模式：前期迭代在降采样后的粗层上进行，
+   收敛后逐层细化，并记录每层耗时
+
+命令行参数与 exe 一致，可直接替换 sweep_runner 中的 exe_path：
+    python scripts/pointcloud_process/reference_icp.py source.ply target.ply out_dir/ ICP <16 个 gt 值>
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+from pointcloud_io import read_ply_with_normals, write_ply_binary
+from spatial_index import cached_index
+from voxel_filter import voxel_downsample
+from solver_log import format_header, format_iter_line, format_footer, first_iteration
+
+# 算法名 -> 误差度量
+METHODS = {
+    "ICP": "point_to_point",
+    "PPL": "point_to_plane",
+}
+
+def to_homogeneous(R, t):
+    T = np.eye(4)
+    T[:3, :3] = R
+    T[:3, 3] = t
+    return T
+
+def transform_points(points, T):
+    """对 N×3 点做刚性变换，保持输入的 dtype"""
+    R = T[:3, :3].astype(points.dtype)
+    t = T[:3, 3].astype(points.dtype)
+    return points @ R.T + t
+
+def best_fit_transform(src, dst):
+    """点到点：SVD 闭式求解使 ||R src + t - dst|| 最小的刚性变换"""
+    src_c = src.mean(axis=0)
+    dst_c = dst.mean(axis=0)
+    H = (src - src_c).T.astype(np.float64) @ (dst - dst_c).astype(np.float64)
+    U, _, Vt = np.linalg.svd(H)
+    D = np.eye(3)
+    D[2, 2] = np.sign(np.linalg.det(Vt.T @ U.T))
+    R = Vt.T @ D @ U.T
+    t = dst_c.astype(np.float64) - R @ src_c.astype(np.float64)
+    return to_homogeneous(R, t)
+
+def rotation_from_vector(omega):
+    """Rodrigues 公式：旋转向量 -> 旋转矩阵"""
+    theta = np.linalg.norm(omega)
+    if theta < 1e-12:
+        return np.eye(3)
+    k = omega / theta
+    K = np.array([[0, -k[2], k[1]], [k[2], 0, -k[0]], [-k[1], k[0], 0]])
+    return np.eye(3) + np.sin(theta) * K + (1 - np.cos(theta)) * K @ K
+
+def point_to_plane_step(src, dst, dst_normals):
+    """点到面：小角度线性化后一次性组装 6×6 法方程求解增量变换"""
+    residual = np.einsum("ij,ij->i", src - dst, dst_normals).astype(np.float64)
+    J = np.hstack((np.cross(src, dst_normals), dst_normals)).astype(np.float64)
+    A = J.T @ J
+    b = -J.T @ residual
+    x = np.linalg.solve(A + 1e-12 * np.eye(6), b)
+    return to_homogeneous(rotation_from_vector(x[:3]), x[3:])
+
+def gt_rmse(points, T, T_gt):
+    """同一批 source 点分别经 T 和 T_gt 变换后的均方根距离"""
+    diff = points.astype(np.float64) @ (T[:3, :3] - T_gt[:3, :3]).T + (T[:3, 3] - T_gt[:3, 3])
+    return float(np.sqrt(np.mean(np.einsum("ij,ij->i", diff, diff))))
+
+def register(source, target, algo="ICP", T_gt=None, init=None, max_iters=50, tol=1e-7,
+             max_corr_dist=np.inf, dtype=np.float64, workers=-1, log=print, index=None,
+             rel_tol=0.0, first_iter=None, gt_points=None):
+    """
+    source / target: N×6（xyz + normals）或 N×3 数组
+    返回 (T, history)，history 为每次迭代的 {"iter", "gt_mse", "corr_rmse"}
+    每次迭代开始时输出当前误差，与 exe 日志中 Iter 0 为初始误差的约定一致
+    rel_tol > 0 时，对应点 RMSE 的相对变化小于该值即停止
+    gt_points 为计算 gt_mse 所用的点（默认即 source）
+    index 为 target 的 spatial_index.PointIndex，默认按内容哈希从缓存中取得
+    """
+    method = METHODS[algo]
+    src = np.ascontiguousarray(source[:, :3], dtype=dtype)
+    dst = np.ascontiguousarray(target[:, :3], dtype=dtype)
+    dst_normals = None
+    if method == "point_to_plane":
+        if target.shape[1] < 6 or not np.any(target[:, 3:6]):
+            raise ValueError("点到面 ICP 需要 target 法向量")
+        dst_normals = np.ascontiguousarray(target[:, 3:6], dtype=dtype)
+
+    if index is None:
+        index = cached_index(dst)
+    T = np.eye(4) if init is None else np.array(init, dtype=np.float64)
+    history = []
+    first = first_iteration(algo) if first_iter is None else first_iter
+    gt_src = src if gt_points is None else gt_points
+    # float32 下增量矩阵本身有 1e-6 量级的舍入噪声，收敛阈值不能低于该量级
+    tol = max(tol, 100 * np.finfo(dtype).eps)
+
+    for k in range(max_iters):
+        moved = transform_points(src, T)
+        dist, idx = index.knn(moved, k=1, distance_upper_bound=max_corr_dist, workers=workers)
+        valid = np.isfinite(dist)
+        if valid.sum() < 6:
+            log(f"有效对应点不足（{valid.sum()}），提前结束")
+            break
+        corr_rmse = float(np.sqrt(np.mean(dist[valid] ** 2)))
+        error = gt_rmse(gt_src, T, T_gt) if T_gt is not None else corr_rmse
+        history.append({"iter": first + k, "gt_mse": error, "corr_rmse": corr_rmse})
+        log(format_iter_line(algo, first + k, error))
+
+        p = moved[valid]
+        q = dst[idx[valid]]
+        if method == "point_to_point":
+            delta = best_fit_transform(p, q)
+        else:
+            delta = point_to_plane_step(p, q, dst_normals[idx[valid]])
+        T = delta @ T
+
+        if np.linalg.norm(delta - np.eye(4)) < tol:
+            break
+        if rel_tol > 0 and len(history) > 1:
+            previous = history[-2]["corr_rmse"]
+            if abs(previous - corr_rmse) <= rel_tol * previous:
+                break
+    return T, history
+
+def default_voxel_sizes(data, levels=3):
+    """按包围盒对角线长度给出由粗到细的体素尺寸，最后一层为原始分辨率（None）"""
+    diagonal = np.linalg.norm(np.ptp(data[:, :3], axis=0))
+    return [diagonal * 0.01 * 2 ** (levels - 2 - i) for i in range(levels - 1)] + [None]
+
+def register_pyramid(source, target, algo="ICP", T_gt=None, init=None, voxel_sizes=None,
+                     max_iters=50, level_iters=15, level_rel_tol=1e-3, max_corr_dist=np.inf,
+                     dtype=np.float64, log=print):
+    """
+    由粗到细的金字塔配准
+    voxel_sizes 从粗到细排列，None 表示原始分辨率；粗层在对应误差的相对变化
+    小于 level_rel_tol 或达到 level_iters 次后切换到下一层，最后一层用剩余的迭代次数
+    max_corr_dist 为原始分辨率下的对应点距离上限；体素滤波后的点最多偏离原位置约半个体素，
+    粗层上放宽一个体素尺寸
+    gt_mse 始终在全分辨率 source 上计算，保证整条曲线可与单分辨率结果直接比较
+    """
+    if voxel_sizes is None:
+        voxel_sizes = default_voxel_sizes(source)
+    T = np.eye(4) if init is None else np.array(init, dtype=np.float64)
+    history = []
+    next_iter = first_iteration(algo)
+    level_times = []
+
+    for level, voxel in enumerate(voxel_sizes):
+        remaining = max_iters - len(history)
+        if remaining <= 0:
+            break
+        finest = level == len(voxel_sizes) - 1
+        start = time.perf_counter()
+        src = voxel_downsample(source, voxel) if voxel else source
+        tgt = voxel_downsample(target, voxel) if voxel else target
+        T, level_history = register(src, tgt, algo=algo, T_gt=T_gt, init=T,
+                                    max_iters=remaining if finest else min(level_iters, remaining),
+                                    rel_tol=0.0 if finest else level_rel_tol,
+                                    max_corr_dist=max_corr_dist + voxel if voxel else max_corr_dist,
+                                    dtype=dtype, log=log,
+                                    first_iter=next_iter, gt_points=source[:, :3])
+        elapsed = time.perf_counter() - start
+        history.extend(level_history)
+        next_iter += len(level_history)
+        level_times.append(elapsed)
+        voxel_text = f"{voxel:g}" if voxel else "full"
+        log(f"Level {level + 1}/{len(voxel_sizes)} | voxel: {voxel_text} | source: {len(src)} | "
+            f"target: {len(tgt)} | iters: {len(level_history)} | level time: {elapsed:.4f}s")
+    return T, history, level_times
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="参考 ICP 求解器（参数与 PCL_Deploy.exe 一致）")
+    parser.add_argument("source")
+    parser.add_argument("target")
+    parser.add_argument("out_dir")
+    parser.add_argument("algo", choices=sorted(METHODS))
+    parser.add_argument("gt", nargs=16, type=float)
+    parser.add_argument("--max-iters", type=int, default=50)
+    parser.add_argument("--max-corr-dist", type=float, default=np.inf)
+    parser.add_argument("--float32", action="store_true")
+    parser.add_argument("--u-value", type=float, default=0.0005)
+    parser.add_argument("--pyramid", action="store_true", help="由粗到细的体素金字塔模式")
+    parser.add_argument("--voxel-sizes", type=float, nargs="+", default=None,
+                        help="金字塔粗层体素尺寸（从粗到细），最后自动追加原始分辨率")
+    parser.add_argument("--level-iters", type=int, default=15)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    sys.stdout.reconfigure(encoding="gbk", errors="replace", line_buffering=True)
+
+    source = read_ply_with_normals(args.source)
+    target = read_ply_with_normals(args.target)
+    T_gt = np.array(args.gt).reshape((4, 4))
+    for line in format_header(args.source, args.target, args.algo, len(source), len(target), u_value=args.u_value):
+        print(line)
+
+    dtype = np.float32 if args.float32 else np.float64
+    start = time.perf_counter()
+    if args.pyramid:
+        voxel_sizes = args.voxel_sizes + [None] if args.voxel_sizes else None
+        T, _, _ = register_pyramid(source, target, algo=args.algo, T_gt=T_gt, voxel_sizes=voxel_sizes,
+                                   max_iters=args.max_iters, level_iters=args.level_iters,
+                                   max_corr_dist=args.max_corr_dist, dtype=dtype)
+    else:
+        T, _ = register(source, target, algo=args.algo, T_gt=T_gt, max_iters=args.max_iters,
+                        max_corr_dist=args.max_corr_dist, dtype=dtype)
+    time_total = time.perf_counter() - start
+
+    reg_path = os.path.join(args.out_dir, f"m{args.algo}reg_pc.ply")
+    write_ply_binary(reg_path, transform_points(source[:, :3], T), normals=source[:, 3:6] @ T[:3, :3].T)
+    for line in format_footer(time_total, T, reg_path):
+        print(line)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""
+Description : 按 PCL_Deploy.exe 实际输出格式生成日志文本
+供模拟求解器和 Python 参考求解器复用，保证结果处理与绘图脚本可以直接解析
+"""
+
+# 各算法的迭代行格式（与 testcase/*_output 中的真实日志一致）
+ITER_STYLES = {
+    "ICP": "u",
+    "FICP": "u",
+    "RICP": "u",
+    "AA_ICP": "aa",
+    "AA-ICP": "aa",
+    "SparseICP": "sparse",
+    "PPL": "posratio",
+    "SICPPPL": "posratio",
+    "RPPL": "robust",
+    "ARPPL": "adaptive",
+    "EXPICP": "adaptive",  # ARPPL 日志实际输出的 method 就是 EXPICP
+}
+
+# 迭代编号从 1 开始的算法
+ONE_BASED_ALGOS = {"RPPL", "ARPPL", "EXPICP"}
+
+def fmt(value):
+    """与 C++ ostream 默认输出一致（6 位有效数字）"""
+    return f"{value:g}"
+
+def format_matrix(matrix):
+    """按 Eigen 默认格式输出矩阵：所有元素右对齐到同一宽度，空格分隔"""
+    cells = [[fmt(float(v)) for v in row] for row in matrix]
+    width = max(len(c) for row in cells for c in row)
+    return [" ".join(c.rjust(width) for c in row) for row in cells]
+
+def format_header(source_path, target_path, algo, n_source, n_target, scale=1.0, u_value=0.0005):
+    """日志开头的输入信息"""
+    return [
+        f"source：{source_path}",
+        f"target：{target_path}",
+        f"method：{algo}",
+        f"source: 3x{n_source}",
+        f"target: 3x{n_target}",
+        f"scale = {fmt(scale)}",
+        f"u value: {fmt(u_value)}",
+        "begin registration...",
+    ]
+
+def format_iter_line(algo, iteration, gt_mse, u=1.0, v=0.0, pos_ratio=1.0, direction=0.0):
+    """单次迭代的输出行"""
+    style = ITER_STYLES.get(algo, "u")
+    if style == "aa":
+        return f"Iter = {iteration} | gt_mse = {fmt(gt_mse)}"
+    if style == "sparse":
+        return f"Iter = {iteration}| gt_mse = {fmt(gt_mse)}"
+    if style == "posratio":
+        return f"Iter: {iteration} | PosRatio: {fmt(pos_ratio)} | gt_mse: {fmt(gt_mse)}"
+    if style == "robust":
+        return (f"Iter: {iteration} | v: {fmt(v)} mm | u: {fmt(u)} mm | PosRatio: {fmt(pos_ratio)} "
+                f"| gt_mse: {fmt(gt_mse)}| Dir:{fmt(direction)}")
+    if style == "adaptive":
+        return (f"Iter: {iteration} | v: {fmt(v)} mm | u: {fmt(u)} mm | PosRatio: {fmt(pos_ratio)}"
+                f"| gt_mse: {fmt(gt_mse)}| Dir:{fmt(direction)}")
+    return f"Iter: {iteration} | u: {fmt(u)}| gt_mse: {fmt(gt_mse)}"
+
+def format_footer(time_total, res_trans, reg_path):
+    """配准结束后的耗时、结果矩阵和输出点云路径"""
+    return [f"Registration done!|time total:{fmt(time_total)}", "res_trans"] + format_matrix(res_trans) + [reg_path]
+
+def first_iteration(algo):
+    return 1 if algo in ONE_BASED_ALGOS else 0
@@ -0,0 +1,196 @@
+"""
+Description : 共享的空间索引模块（KD-tree + 均匀体素哈希）
+txt_to_ply 的法向估计、配准中的最近点查询、FPFH 特征、偏差分析等都需要近邻查询，
+原先每次调用各自从头建索引，这里统一：
+1. PointIndex：封装 cKDTree，提供批量 kNN / 半径查询，workers 线程并行
+2. VoxelHashIndex：均匀体素哈希，点按体素编号排序后用 searchsorted 定位，
+   半径不超过体素边长时只需检查 3×3×3 个体素
+3. cached_index：按点云内容哈希缓存已建好的 KD-tree，进程内存中保留最近用过的若干个，
+   指定缓存目录（或环境变量 PC_INDEX_CACHE_DIR）时同时序列化到磁盘，
+   对同一 target 反复计算度量或特征时跳过建树
+"""
+
+import os
+import time
+import pickle
+import hashlib
+from collections import OrderedDict
+import numpy as np
+from scipy.spatial import cKDTree
+
+from pointcloud_io import read_ply_arrays
+
+CACHE_DIR_ENV = "PC_INDEX_CACHE_DIR"
+MEMORY_CACHE_SIZE = 8
+_memory_cache = OrderedDict()
+
+def content_hash(points):
+    """点云内容哈希：dtype、形状与原始字节一起参与计算"""
+    data = np.ascontiguousarray(points)
+    digest = hashlib.sha1(f"{data.dtype.str}{data.shape}".encode("utf-8"))
+    digest.update(memoryview(data).cast("B"))
+    return digest.hexdigest()
+
+class PointIndex:
+    """KD-tree 索引，查询结果与 cKDTree 一致，默认使用全部线程"""
+
+    def __init__(self, points, tree=None, leafsize=16, key=None):
+        self.points = np.ascontiguousarray(points[:, :3], dtype=np.float64)
+        self.tree = cKDTree(self.points, leafsize=leafsize) if tree is None else tree
+        self.key = key
+
+    def __len__(self):
+        return len(self.points)
+
+    def knn(self, queries, k=1, distance_upper_bound=np.inf, eps=0.0, workers=-1):
+        """批量 k 近邻，k=1 时返回一维数组；找不到的邻居距离为 inf、编号为 len(self)"""
+        return self.tree.query(queries, k=k, distance_upper_bound=distance_upper_bound, eps=eps, workers=workers)
+
+    def radius(self, queries, r, workers=-1, return_sorted=False):
+        """批量半径查询，返回每个查询点的邻居编号列表"""
+        return self.tree.query_ball_point(queries, r, workers=workers, return_sorted=return_sorted)
+
+    def radius_pairs(self, queries, r, workers=-1):
+        """批量半径查询的扁平形式，返回 (查询点编号, 邻居编号)，便于后续向量化处理"""
+        neighbours = self.radius(queries, r, workers=workers)
+        counts = np.fromiter((len(n) for n in neighbours), dtype=np.int64, count=len(neighbours))
+        rows = np.repeat(np.arange(len(neighbours)), counts)
+        cols = np.concatenate(neighbours).astype(np.int64) if counts.sum() else np.empty(0, dtype=np.int64)
+        return rows, cols
+
+    def radius_count(self, queries, r, workers=-1):
+        """批量统计半径内的邻居数（不构造邻居列表）"""
+        return self.tree.query_ball_point(queries, r, workers=workers, return_length=True)
+
+class VoxelHashIndex:
+    """
+    均匀体素哈希：体素坐标打包为 int64 键，点按键排序存放
+    cell_of / members 给出每个点所在体素及体素内的点，radius_pairs 查询半径不超过体素边长的邻居
+    """
+
+    OFFSETS = np.array([(i, j, k) for i in (-1, 0, 1) for j in (-1, 0, 1) for k in (-1, 0, 1)], dtype=np.int64)
+
+    def __init__(self, points, voxel_size):
+        self.points = np.ascontiguousarray(points[:, :3], dtype=np.float64)
+        self.voxel_size = float(voxel_size)
+        # 原点留一个体素的余量，邻域体素坐标不会出现负数
+        self.origin = self.points.min(axis=0) - self.voxel_size
+        coords = self.cell_coords(self.points)
+        self.dims = coords.max(axis=0) + 2
+        keys = self.pack(coords)
+        self.order = np.argsort(keys, kind="stable")
+        self.keys, self.starts, self.counts = np.unique(keys[self.order], return_index=True, return_counts=True)
+        self.inverse = np.empty(len(keys), dtype=np.int64)
+        self.inverse[self.order] = np.repeat(np.arange(len(self.keys)), self.counts)
+
+    def cell_coords(self, points):
+        return np.floor((points - self.origin) / self.voxel_size).astype(np.int64)
+
+    def pack(self, coords):
+        return (coords[:, 0] * self.dims[1] + coords[:, 1]) * self.dims[2] + coords[:, 2]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def cell_of(self):
+        """每个点所在的体素编号（0 ~ 体素数 - 1）"""
+        return self.inverse
+
+    def members(self, cell):
+        """体素内的点编号"""
+        return self.order[self.starts[cell]:self.starts[cell] + self.counts[cell]]
+
+    def radius_pairs(self, queries, r):
+        """r 不超过体素边长时的半径查询，返回 (查询点编号, 邻居编号)"""
+        if r > self.voxel_size:
+            raise ValueError(f"查询半径 {r} 超过体素边长 {self.voxel_size}")
+        coords = self.cell_coords(queries)
+        neighbour = (coords[:, None, :] + self.OFFSETS[None]).reshape(-1, 3)
+        inside = np.all((neighbour >= 0) & (neighbour < self.dims), axis=1)
+        keys = np.where(inside, self.pack(np.clip(neighbour, 0, self.dims - 1)), -1)
+        slot = np.clip(np.searchsorted(self.keys, keys), 0, len(self.keys) - 1)
+        found = inside & (self.keys[slot] == keys)
+
+        rows = np.repeat(np.arange(len(queries)), len(self.OFFSETS))[found]
+        slot = slot[found]
+        counts = self.counts[slot]
+        rows = np.repeat(rows, counts)
+        # 每个体素内的连续区间展开为点编号
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cols = self.order[np.repeat(self.starts[slot], counts) + offsets]
+        diff = queries[rows] - self.points[cols]
+        keep = np.einsum("ij,ij->i", diff, diff) <= r * r
+        return rows[keep], cols[keep]
+
+def _cache_path(cache_dir, key):
+    return os.path.join(cache_dir, f"{key}.kdtree.pkl")
+
+def cached_index(points, cache_dir=None, leafsize=16):
+    """
+    按内容哈希取得 PointIndex：先查进程内缓存，再查磁盘缓存，都没有才建树
+    cache_dir 为 None 时使用环境变量 PC_INDEX_CACHE_DIR，两者都未设置则只做内存缓存
+    """
+    points = np.ascontiguousarray(points[:, :3], dtype=np.float64)
+    key = f"{content_hash(points)}_{leafsize}"
+    if key in _memory_cache:
+        _memory_cache.move_to_end(key)
+        return _memory_cache[key]
+
+    cache_dir = cache_dir or os.environ.get(CACHE_DIR_ENV)
+    tree = None
+    if cache_dir and os.path.exists(_cache_path(cache_dir, key)):
+        try:
+            with open(_cache_path(cache_dir, key), "rb") as f:
+                tree = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            tree = None
+    index = PointIndex(points, tree=tree, leafsize=leafsize, key=key)
+    if cache_dir and tree is None:
+        os.makedirs(cache_dir, exist_ok=True)
+        # 先写临时文件再改名，并发进程不会读到写了一半的缓存
+        tmp_path = f"{_cache_path(cache_dir, key)}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(index.tree, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, _cache_path(cache_dir, key))
+
+    _memory_cache[key] = index
+    while len(_memory_cache) > MEMORY_CACHE_SIZE:
+        _memory_cache.popitem(last=False)
+    return index
+
+def estimate_normals(points, k=10, index=None, chunk_size=1 << 16):
+    """
+    PCA 法向估计：每个点取 k 个近邻（不含自身），邻域协方差最小特征值对应的特征向量为法向
+    近邻查询与特征分解都按块批量进行
+    """
+    points = np.asarray(points[:, :3], dtype=np.float64)
+    index = cached_index(points) if index is None else index
+    _, idx = index.knn(points, k=k + 1)
+    normals = np.empty_like(points)
+    for s in range(0, len(points), chunk_size):
+        nbrs = points[idx[s:s + chunk_size, 1:]]                 # c×k×3
+        centered = nbrs - nbrs.mean(axis=1, keepdims=True)
+        cov = np.einsum("nki,nkj->nij", centered, centered)
+        _, eigvecs = np.linalg.eigh(cov)
+        normals[s:s + chunk_size] = eigvecs[:, :, 0]
+    return normals
+
+if __name__ == "__main__":
+    target_path = "testcase/test0706/monkeys/monkeys_target.ply"
+    cache_dir = "output/index_cache"
+
+    points, _, _ = read_ply_arrays(target_path)
+    for attempt in range(2):
+        _memory_cache.clear()
+        start = time.perf_counter()
+        index = cached_index(points, cache_dir=cache_dir)
+        print(f"第 {attempt + 1} 次取得索引耗时 {time.perf_counter() - start:.3f}s（{index.key}）")
+
+    start = time.perf_counter()
+    dist, _ = index.knn(points, k=8)
+    print(f"{len(points)} 个点的 8 近邻查询耗时 {time.perf_counter() - start:.3f}s，平均间距 {dist[:, 1].mean():.4g}")
+
+    voxel = VoxelHashIndex(points, dist[:, 1].mean() * 4)
+    start = time.perf_counter()
+    rows, cols = voxel.radius_pairs(points, voxel.voxel_size)
+    print(f"体素哈希：{len(voxel)} 个体素，半径查询得到 {len(rows)} 对，耗时 {time.perf_counter() - start:.3f}s")
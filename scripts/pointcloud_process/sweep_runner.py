@@ -0,0 +1,318 @@
+"""
+Description : 配准扫描（多模型 × 多算法）的并行驱动脚本
+1. 按 (模型, 算法, 点数) 记录每次运行的耗时历史
+2. 按预计耗时从长到短 (LPT) 把任务分配到工作池，避免最后等待单个慢任务
+3. 未出现过的组合根据点数估计耗时
+4. 运行结束后输出预测与实际的 makespan
+5. 按全局核数预算给每个并发求解器分配互不重叠的 CPU 集合，并限制其线程数，
+   避免多个 OpenMP/Eigen 线程池互相抢占导致计时失真
+6. 记录每个迭代行的到达时间（见 iteration_timing.py），供时间轴图使用真实的逐次耗时
+"""
+
+import os
+import json
+import time
+import heapq
+import queue
+import subprocess
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from iteration_timing import IterationClock
+
+DEFAULT_ALGORITHMS = ["ICP", "AA_ICP", "FICP", "RICP", "PPL", "RPPL", "SparseICP", "SICPPPL", "EXPICP"]
+
+# 完全没有历史数据时的兜底系数（秒/点），按 aquarius ICP 的 334220 + 250666 点耗时 15.86s 估算
+DEFAULT_SECONDS_PER_POINT = 15.8623 / (334220 + 250666)
+
+# 每个 key 最多保留的历史耗时条数
+HISTORY_KEEP = 10
+
+# 传给求解器的线程数环境变量（Eigen 跟随 OpenMP 设置）
+THREAD_ENV_VARS = ["OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS",
+                   "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS"]
+
+def read_ply_vertex_count(ply_path):
+    """只读取 PLY 文件头，返回 element vertex 的数量"""
+    with open(ply_path, 'rb') as f:
+        for raw in f:
+            line = raw.decode('ascii', errors='ignore').strip()
+            if line.startswith("element vertex"):
+                return int(line.split()[-1])
+            if line == "end_header":
+                break
+    raise ValueError(f"{ply_path} 文件头中未找到 element vertex")
+
+def read_ground_truth(file_path):
+    """读取一个4×4的矩阵"""
+    with open(file_path, 'r') as f:
+        matrix_values = []
+        for line in f:
+            matrix_values.extend(map(float, line.strip().split()))
+    if len(matrix_values) != 16:
+        raise ValueError(f"Expected 16 values for 4x4 matrix, got {len(matrix_values)}")
+    return np.array(matrix_values).reshape((4, 4))
+
+def collect_case(folder):
+    """按 cpp_driver_advanced 的命名约定收集一个案例文件夹中的 source/target/gt"""
+    basename = os.path.basename(os.path.normpath(folder))
+    source = os.path.join(folder, f"{basename}_source.ply")
+    target = os.path.join(folder, f"{basename}_target.ply")
+    gt_path = os.path.join(folder, f"{basename}_ground_truth.txt")
+    for path in (source, target, gt_path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"缺少文件: {path}")
+
+    return {
+        "model": basename,
+        "folder": folder,
+        "source": source,
+        "target": target,
+        "gt": read_ground_truth(gt_path),
+        "n_source": read_ply_vertex_count(source),
+        "n_target": read_ply_vertex_count(target),
+    }
+
+def history_key(model, algo, n_source, n_target):
+    return f"{model}|{algo}|{n_source}x{n_target}"
+
+def load_history(history_path):
+    if not history_path or not os.path.exists(history_path):
+        return {}
+    with open(history_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_history(history, history_path):
+    os.makedirs(os.path.dirname(os.path.abspath(history_path)), exist_ok=True)
+    with open(history_path, 'w', encoding='utf-8') as f:
+        json.dump(history, f, indent=2, ensure_ascii=False)
+
+def record_duration(history, model, algo, n_source, n_target, seconds):
+    """把一次成功运行的耗时写入历史"""
+    key = history_key(model, algo, n_source, n_target)
+    entry = history.setdefault(key, {
+        "model": model, "algo": algo, "n_source": n_source, "n_target": n_target, "durations": []
+    })
+    entry["durations"].append(round(float(seconds), 4))
+    entry["durations"] = entry["durations"][-HISTORY_KEEP:]
+
+def estimate_duration(history, model, algo, n_source, n_target):
+    """
+    估计一个任务的耗时，返回 (秒, 估计来源)
+    优先使用完全相同组合的历史中位数；否则用同算法（再退化为全部历史）的
+    秒/点 系数乘以当前点数；都没有时使用 DEFAULT_SECONDS_PER_POINT
+    """
+    n_points = n_source + n_target
+    entry = history.get(history_key(model, algo, n_source, n_target))
+    if entry and entry["durations"]:
+        return float(np.median(entry["durations"])), "history"
+
+    def rates(entries):
+        return [np.median(e["durations"]) / (e["n_source"] + e["n_target"])
+                for e in entries if e["durations"] and e["n_source"] + e["n_target"] > 0]
+
+    same_algo = rates(e for e in history.values() if e["algo"] == algo)
+    if same_algo:
+        return float(np.median(same_algo) * n_points), "algo"
+    any_algo = rates(history.values())
+    if any_algo:
+        return float(np.median(any_algo) * n_points), "points"
+    return DEFAULT_SECONDS_PER_POINT * n_points, "default"
+
+def predict_makespan(durations, workers):
+    """按给定顺序做列表调度（每个任务交给最早空闲的 worker），返回预测 makespan"""
+    finish_times = [0.0] * max(1, workers)
+    for d in durations:
+        earliest = heapq.heappop(finish_times)
+        heapq.heappush(finish_times, earliest + d)
+    return max(finish_times)
+
+def available_cpus():
+    """当前进程允许使用的 CPU 编号"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def plan_cpu_sets(workers, core_budget=None):
+    """
+    把核数预算平均切分给 workers 个并发槽位，返回互不重叠的 CPU 集合列表
+    不能整除时多出的核分给前面的槽位；核数少于 workers 时无法做到互不重叠，槽位数会被截断为核数
+    """
+    cpus = available_cpus()
+    if core_budget:
+        cpus = cpus[:core_budget]
+    slots = min(workers, len(cpus))
+    if slots < workers:
+        print(f"⚠️ 核数预算 {len(cpus)} 小于 worker 数 {workers}，并发数降为 {slots}")
+    return [[int(cpu) for cpu in cpu_set] for cpu_set in np.array_split(cpus, slots)]
+
+def thread_env(cpu_set):
+    """构造限制线程数的子进程环境变量"""
+    env = os.environ.copy()
+    for name in THREAD_ENV_VARS:
+        env[name] = str(len(cpu_set))
+    return env
+
+def build_jobs(cases, algorithms, history, u_tag=None):
+    """生成任务列表并按预计耗时从长到短排序"""
+    jobs = []
+    for case in cases:
+        for algo in algorithms:
+            expected, origin = estimate_duration(history, case["model"], algo, case["n_source"], case["n_target"])
+            suffix = f"_log_{u_tag}.txt" if u_tag is not None else "_log.txt"
+            jobs.append({
+                "case": case,
+                "algo": algo,
+                "expected": expected,
+                "origin": origin,
+                "log_path": os.path.join(case["folder"], f"{case['model']}_{algo}{suffix}"),
+            })
+    jobs.sort(key=lambda job: job["expected"], reverse=True)
+    return jobs
+
+def write_job_meta(job):
+    """把 CPU 分配、线程数和耗时记录到日志旁的 .meta.json"""
+    meta_path = os.path.splitext(job["log_path"])[0] + ".meta.json"
+    case = job["case"]
+    meta = {
+        "model": case["model"],
+        "algo": job["algo"],
+        "n_source": case["n_source"],
+        "n_target": case["n_target"],
+        "cpus": job["cpus"],
+        "thread_env": {name: str(len(job["cpus"])) for name in THREAD_ENV_VARS},
+        "affinity_applied": job.get("affinity_applied", False),
+        "expected": round(job["expected"], 4),
+        "elapsed": None if job["elapsed"] is None else round(job["elapsed"], 4),
+        "return_code": job["return_code"],
+    }
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False)
+
+def solver_command(exe_path):
+    """exe_path 可以是可执行文件路径，也可以是命令前缀列表（如 [python, mock_pcl_deploy.py]）"""
+    if isinstance(exe_path, (list, tuple)):
+        return list(exe_path)
+    return [exe_path]
+
+def launch_pinned(args, cpu_set, **popen_kwargs):
+    """
+    启动子进程并绑定到 cpu_set，返回 (Popen, 是否成功绑定)
+    先把当前线程绑定到 cpu_set 再启动，子进程从 fork 起就继承该亲和性，求解器的所有线程都不会落在集合之外；
+    启动后恢复当前线程原来的亲和性。os.sched_setaffinity(0) 只作用于调用线程，不影响其他 worker 线程
+    不用 preexec_fn：在线程池中 fork 时子进程可能在 exec 之前死锁
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        return subprocess.Popen(args, **popen_kwargs), False
+    previous = os.sched_getaffinity(0)
+    try:
+        os.sched_setaffinity(0, cpu_set)
+    except OSError:
+        return subprocess.Popen(args, **popen_kwargs), False
+    try:
+        return subprocess.Popen(args, **popen_kwargs), True
+    finally:
+        os.sched_setaffinity(0, previous)
+
+def run_job(job, exe_path, cpu_slots):
+    """从槽位池取一组 CPU 运行一个配准任务，输出写入日志，返回 (退出码, 墙钟耗时)"""
+    case = job["case"]
+    args = solver_command(exe_path) + [case["source"], case["target"], case["folder"] + os.sep, job["algo"]]
+    args.extend(str(x) for x in case["gt"].flatten().tolist())
+
+    cpu_set = cpu_slots.get()
+    job["cpus"] = cpu_set
+
+    try:
+        start = time.perf_counter()
+        clock = IterationClock()
+        with open(job["log_path"], "w", encoding="gbk", errors="replace") as logfile:
+            # 启动前绑定 CPU（仅 Linux 支持），实际是否绑定成功记录到 .meta.json
+            proc, job["affinity_applied"] = launch_pinned(args, cpu_set, stdout=subprocess.PIPE,
+                                                          stderr=subprocess.STDOUT, text=True, encoding="gbk",
+                                                          errors="replace", env=thread_env(cpu_set))
+            for line in proc.stdout:
+                clock.feed(line)
+                logfile.write(line)
+            return_code = proc.wait()
+        # 每行 Iter 的到达时间写到日志旁的 .timing.json
+        clock.write(job["log_path"])
+        return return_code, time.perf_counter() - start
+    finally:
+        cpu_slots.put(cpu_set)
+
+def run_sweep(case_folders, algorithms, exe_path, workers=4, history_path=None, u_tag=None, core_budget=None):
+    """并行运行整组扫描，并更新耗时历史"""
+    cases = [collect_case(folder) for folder in case_folders]
+    history = load_history(history_path)
+    jobs = build_jobs(cases, algorithms, history, u_tag=u_tag)
+
+    cpu_sets = plan_cpu_sets(workers, core_budget)
+    workers = len(cpu_sets)
+    cpu_slots = queue.Queue()
+    for cpu_set in cpu_sets:
+        cpu_slots.put(cpu_set)
+    if not hasattr(os, "sched_setaffinity"):
+        print("⚠️ 当前系统不支持 os.sched_setaffinity，只通过环境变量限制线程数")
+    print("CPU 分配: " + " | ".join(",".join(map(str, cpu_set)) for cpu_set in cpu_sets))
+
+    predicted = predict_makespan([job["expected"] for job in jobs], workers)
+    print(f"共 {len(jobs)} 个任务，{workers} 个 worker，预测 makespan: {predicted:.2f}s")
+    for job in jobs:
+        print(f"  {job['case']['model']:<12} {job['algo']:<10} 预计 {job['expected']:8.2f}s ({job['origin']})")
+
+    sweep_start = time.perf_counter()
+    try:
+        # 线程池按提交顺序取任务，提交顺序即 LPT 顺序
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [(job, pool.submit(run_job, job, exe_path, cpu_slots)) for job in jobs]
+            for job, future in futures:
+                # 单个任务启动失败（找不到 exe、Popen 报 OSError 等）只标记该任务失败，不中断其余任务
+                try:
+                    return_code, elapsed = future.result()
+                    status = "✅" if return_code == 0 else f"❌ 退出码 {return_code}"
+                except Exception as e:
+                    return_code, elapsed = None, None
+                    status = f"❌ 运行失败: {e}"
+                job["return_code"] = return_code
+                job["elapsed"] = elapsed
+                write_job_meta(job)
+                elapsed_text = "-" if elapsed is None else f"{elapsed:.2f}s"
+                print(f"[{job['case']['model']} {job['algo']}] {status} 耗时 {elapsed_text} "
+                      f"(预计 {job['expected']:.2f}s)")
+    finally:
+        # 中途出错或被中断时也保存已完成任务的耗时
+        for job in jobs:
+            if job.get("return_code") == 0:
+                case = job["case"]
+                record_duration(history, case["model"], job["algo"], case["n_source"], case["n_target"], job["elapsed"])
+        if history_path:
+            save_history(history, history_path)
+    actual = time.perf_counter() - sweep_start
+
+    print(f"\n预测 makespan: {predicted:.2f}s | 实际 makespan: {actual:.2f}s")
+    return jobs, predicted, actual
+
+if __name__ == "__main__":
+    # 可执行文件路径（你 C++ 编译后生成的 .exe 文件）
+    exe_path = r"D:/C++_Projects/PCL_Deploy/x64/Release/PCL_Deploy.exe"  # 请修改成你自己的路径
+    # 没有 exe 的机器上可改用模拟求解器，迭代数/延时见 mock_pcl_deploy.py 说明
+    # exe_path = ["python", os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_pcl_deploy.py")]
+
+    # 每个文件夹内需包含 {name}_source.ply, {name}_target.ply, {name}_ground_truth.txt
+    case_folders = [
+        "testcase/test0706/monkeys",
+        "testcase/test0702/aquarius",
+    ]
+    algorithms = DEFAULT_ALGORITHMS
+    workers = 4
+    core_budget = None  # 供所有求解器使用的总核数，None 表示使用全部可用核
+    history_path = "testcase/sweep_history.json"
+    u_tag = "0.0005"  # 日志文件名 log_ 后的参数，None 表示不带参数
+
+    if not os.path.isfile(solver_command(exe_path)[-1]):
+        print(f"可执行文件不存在: {exe_path}")
+        exit()
+
+    run_sweep(case_folders, algorithms, exe_path, workers=workers, history_path=history_path, u_tag=u_tag,
+              core_budget=core_budget)
@@ -0,0 +1,113 @@
+"""
+Description : 体素网格降采样与去重
+stl_to_ply / obj_to_ply 的面积加权采样在很小的三角形上会产生几乎重合的点，
+扫描得到的 TXT 点云也需要清理（如 aquarius_cleaned_source.ply），这里提供一个可选的清理环节：
+1. 坐标按体素尺寸量化为整数，打包成 int64 键后用 np.unique 一次分组（O(N log N)）
+2. 每组取质心（centroid）或离质心最近的原始点（representative）
+3. 法向量取组内均值后重新单位化，颜色取组内均值
+去重（deduplicate）不按体素分组：用 KD 树找出间距不超过容差的点对，连通的点合为一组，
+跨越体素边界的近重复点同样会被合并，再按 representative 模式每组保留一个原始点
+"""
+
+import os
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+
+from pointcloud_io import read_ply_arrays, write_ply_binary
+
+def voxel_groups(points, voxel_size):
+    """按体素分组，返回 (每个点的组号 inverse, 每组点数 counts)"""
+    coords = np.floor((points[:, :3] - points[:, :3].min(axis=0)) / voxel_size).astype(np.int64)
+    dims = coords.max(axis=0) + 1
+    if np.prod(dims.astype(np.float64)) < 2 ** 62:
+        flat = (coords[:, 0] * dims[1] + coords[:, 1]) * dims[2] + coords[:, 2]
+        _, inverse, counts = np.unique(flat, return_inverse=True, return_counts=True)
+    else:
+        # 体素数超出 int64 范围时退化为按行去重
+        _, inverse, counts = np.unique(coords, axis=0, return_inverse=True, return_counts=True)
+    return inverse.reshape(-1), counts
+
+def tolerance_groups(points, tolerance):
+    """间距不超过 tolerance 的点对连通成组，返回 (每个点的组号 inverse, 每组点数 counts)"""
+    n = len(points)
+    pairs = cKDTree(points[:, :3]).query_pairs(tolerance, output_type="ndarray")
+    graph = coo_matrix((np.ones(len(pairs)), (pairs[:, 0], pairs[:, 1])), shape=(n, n))
+    _, inverse = connected_components(graph, directed=False)
+    return inverse, np.bincount(inverse)
+
+def _group_mean(values, inverse, counts):
+    out = np.empty((len(counts), values.shape[1]))
+    for c in range(values.shape[1]):
+        out[:, c] = np.bincount(inverse, weights=values[:, c], minlength=len(counts)) / counts
+    return out
+
+def _normalize(normals):
+    norms = np.linalg.norm(normals, axis=1, keepdims=True)
+    return normals / np.where(norms > 0, norms, 1)
+
+def _select(points, inverse, counts, centroids, mode):
+    """每组选出的原始点编号：representative 为离质心最近的点，centroid 为组内第一个点"""
+    if mode == "representative":
+        diff = points[:, :3] - centroids[inverse]
+        order = np.lexsort((np.einsum("ij,ij->i", diff, diff), inverse))
+    elif mode == "centroid":
+        order = np.argsort(inverse, kind="stable")
+    else:
+        raise ValueError(f"未知的降采样模式: {mode}")
+    # 排序后每组的第一个即为所选点
+    return order[np.concatenate([[0], np.cumsum(counts)[:-1]])]
+
+def voxel_filter(points, voxel_size, normals=None, colors=None, mode="centroid"):
+    """
+    体素降采样
+    mode="centroid"：输出每组质心；mode="representative"：输出离质心最近的原始点
+    返回 (points, normals 或 None, colors 或 None, 每个输出点对应的原始点编号)，
+    centroid 模式下的编号为组内第一个点，便于追溯
+    """
+    return _reduce_groups(points, *voxel_groups(points, voxel_size), normals, colors, mode)
+
+def _reduce_groups(points, inverse, counts, normals, colors, mode):
+    centroids = _group_mean(points[:, :3], inverse, counts)
+    first = _select(points, inverse, counts, centroids, mode)
+    out_points = centroids if mode == "centroid" else points[first, :3].astype(np.float64)
+
+    out_normals = None
+    if normals is not None:
+        out_normals = _normalize(_group_mean(normals, inverse, counts))
+    out_colors = None
+    if colors is not None:
+        out_colors = np.rint(_group_mean(colors.astype(np.float64), inverse, counts)).astype(colors.dtype)
+    return out_points, out_normals, out_colors, first
+
+def voxel_downsample(data, voxel_size, mode="centroid"):
+    """N×C 数组（xyz + 可选 normals）的体素降采样：各列取组内均值，第 4~6 列视为法向量重新单位化"""
+    inverse, counts = voxel_groups(data, voxel_size)
+    out = _group_mean(data, inverse, counts)
+    if data.shape[1] >= 6:
+        out[:, 3:6] = _normalize(out[:, 3:6])
+    if mode != "centroid":
+        out[:, :3] = data[_select(data, inverse, counts, out[:, :3], mode), :3]
+    return out.astype(data.dtype)
+
+def deduplicate(points, tolerance, normals=None, colors=None):
+    """
+    去掉间距不超过容差的近重复点，保留的都是原始点（每组离质心最近的点），返回值同 voxel_filter
+    间距不超过容差的点连成一组，容差应远小于正常点距，否则一串相邻点会被合成一个
+    """
+    return _reduce_groups(points, *tolerance_groups(points, tolerance), normals, colors, "representative")
+
+if __name__ == "__main__":
+    input_path = "testcase/models/aquarius_source.ply"
+    output_path = "testcase/models/aquarius_cleaned_source.ply"
+    voxel_size = 0.01
+    mode = "representative"
+
+    points, normals, colors = read_ply_arrays(input_path)
+    out_points, out_normals, out_colors, _ = voxel_filter(points, voxel_size, normals=normals,
+                                                          colors=colors, mode=mode)
+    print(f"体素 {voxel_size}（{mode}）：{len(points)} -> {len(out_points)} 个点")
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    write_ply_binary(output_path, out_points, normals=out_normals, colors=out_colors)
+    print(f"[✓] 已保存到 {output_path}")
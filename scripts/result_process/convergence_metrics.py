@@ -0,0 +1,69 @@
+"""
+Description : 配准收敛曲线的汇总指标
+由 gt_mse 序列（及逐次迭代的时间）计算，导入结果库时算好并建索引，排名时直接查询：
+    final_rmse          最后一次迭代的 gt_mse
+    best_rmse           整条曲线的最小 gt_mse
+    iters_to_{阈值}      gt_mse 首次不超过阈值时已完成的迭代数（未达到为空）
+    seconds_to_{阈值}    同上，对应的时间（有逐次计时用真实时间，否则按总耗时均分）
+    auc_log_rmse        log10(gt_mse) 对迭代次数的曲线下面积，越小说明下降得越早越深（随迭代数累积，
+                        迭代数差别大时应结合 plateau_iter 比较）
+    plateau_iter        平台起点：gt_mse 首次进入最小值 plateau_decades 个数量级以内的迭代数
+    convergence_rate    平台之前（线性收敛段）log10(gt_mse) 线性拟合得到的每次迭代误差缩小倍率
+"""
+
+import numpy as np
+
+DEFAULT_THRESHOLDS = (1e-4, 1e-5, 1e-6)
+DEFAULT_PLATEAU_DECADES = 0.1
+
+def threshold_name(prefix, threshold):
+    return f"{prefix}_{threshold:g}"
+
+def metric_names(thresholds=DEFAULT_THRESHOLDS):
+    """全部指标名"""
+    names = ["final_rmse", "best_rmse", "auc_log_rmse", "plateau_iter", "convergence_rate"]
+    for threshold in thresholds:
+        names += [threshold_name("iters_to", threshold), threshold_name("seconds_to", threshold)]
+    return names
+
+def iteration_times(n, wall_time=None, time_total=None):
+    """每次迭代结束的时间：优先使用驱动记录的到达时间，否则按总耗时均分（与时间轴图一致）"""
+    if wall_time is not None and len(wall_time) == n:
+        return np.asarray(wall_time, dtype=np.float64)
+    if time_total is not None and n:
+        return np.linspace(0, time_total, n)
+    return None
+
+def convergence_metrics(gt_mse, wall_time=None, time_total=None, thresholds=DEFAULT_THRESHOLDS,
+                        plateau_decades=DEFAULT_PLATEAU_DECADES):
+    """计算一条收敛曲线的指标，返回 {指标名: float 或 None}"""
+    metrics = dict.fromkeys(metric_names(thresholds))
+    rmse = np.asarray(gt_mse, dtype=np.float64)
+    valid = np.isfinite(rmse) & (rmse > 0)
+    if not valid.any():
+        return metrics
+    times = iteration_times(len(rmse), wall_time, time_total)
+    # 迭代数从 1 开始计：第 k 个值对应已完成 k + 1 次迭代
+    iters = np.flatnonzero(valid)
+    log_rmse = np.log10(rmse[valid])
+
+    metrics["final_rmse"] = float(rmse[iters[-1]])
+    metrics["best_rmse"] = float(rmse[valid].min())
+    for threshold in thresholds:
+        reached = np.flatnonzero(rmse[valid] <= threshold)
+        if len(reached):
+            k = iters[reached[0]]
+            metrics[threshold_name("iters_to", threshold)] = float(k + 1)
+            if times is not None:
+                metrics[threshold_name("seconds_to", threshold)] = float(times[k])
+    if len(iters) > 1:
+        # 梯形积分（np.trapz 在新版 numpy 中已移除）
+        metrics["auc_log_rmse"] = float(np.sum(0.5 * (log_rmse[1:] + log_rmse[:-1]) * np.diff(iters)))
+
+    onset = int(np.argmax(log_rmse <= log_rmse.min() + plateau_decades))
+    metrics["plateau_iter"] = float(iters[onset] + 1)
+    # 线性收敛段：开头到平台起点
+    if onset >= 1:
+        slope = np.polyfit(iters[:onset + 1], log_rmse[:onset + 1], 1)[0]
+        metrics["convergence_rate"] = float(10.0 ** slope)
+    return metrics
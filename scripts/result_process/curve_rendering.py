@@ -0,0 +1,147 @@
+"""
+Description : 大量收敛曲线的批量绘制
+逐条 ax.plot / 逐个 ax.scatter 时每条曲线、每个标记都是一个独立的 Artist，叠加上百个实验时绘制和保存都很慢：
+1. CurveBatch 收集一张图上的全部曲线和标记，draw 时曲线合成一个 LineCollection，同一种标记只调用一次 scatter
+   图例由不加入 Axes 的 Line2D 代理生成，顺序与添加顺序一致
+2. 点数超过 Axes 像素宽度的曲线用 LTTB（largest-triangle-three-buckets）降采样到像素宽度，保留峰谷形状
+   三角形面积的 argmax 对两个坐标轴各自的线性缩放不变，只有对数坐标轴需要先取 log10
+   所有需要降采样的曲线补齐成一个数组，逐个桶循环、各曲线同时计算
+"""
+
+import time
+import numpy as np
+from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
+
+from run_aggregation import pad_series
+
+def lttb_indices(x_list, y_list, n_out):
+    """
+    LTTB 降采样，返回每条曲线保留的下标数组；点数不超过 n_out 的曲线原样保留
+    x 须非递减，且不含 nan（由调用方先去掉）
+    """
+    lengths = np.array([len(y) for y in y_list], dtype=np.int64)
+    result = [np.arange(n) for n in lengths]
+    rows = np.flatnonzero(lengths > max(n_out, 2))
+    if n_out < 3 or not len(rows):
+        return result
+    X = pad_series([x_list[r] for r in rows])
+    Y = pad_series([y_list[r] for r in rows])
+    n = lengths[rows]
+    r = np.arange(len(rows))
+
+    # 第一个点和最后一个点单独成桶，中间 n - 2 个点均分为 n_out - 2 个桶；bounds[:, k] 为第 k 个桶的起点
+    every = (n - 2) / (n_out - 2)
+    bounds = np.empty((len(rows), n_out), dtype=np.int64)
+    bounds[:, :n_out - 1] = np.floor(np.arange(n_out - 1)[None, :] * every[:, None]).astype(np.int64) + 1
+    bounds[:, n_out - 2] = n - 1
+    bounds[:, n_out - 1] = n
+    # 下一个桶的均值与已选点无关，用前缀和一次算出
+    cx = np.concatenate([np.zeros((len(rows), 1)), np.cumsum(X, axis=1)], axis=1)
+    cy = np.concatenate([np.zeros((len(rows), 1)), np.cumsum(Y, axis=1)], axis=1)
+    start, stop = bounds[:, 1:n_out - 1], bounds[:, 2:]
+    count = stop - start
+    avg_x = (np.take_along_axis(cx, stop, 1) - np.take_along_axis(cx, start, 1)) / count
+    avg_y = (np.take_along_axis(cy, stop, 1) - np.take_along_axis(cy, start, 1)) / count
+
+    width = int((bounds[:, 1:n_out - 1] - bounds[:, :n_out - 2]).max())
+    offsets = np.arange(width)[None, :]
+    selected = np.empty((len(rows), n_out), dtype=np.int64)
+    selected[:, 0] = 0
+    selected[:, -1] = n - 1
+    a = np.zeros(len(rows), dtype=np.int64)
+    for i in range(n_out - 2):
+        idx = bounds[:, i, None] + offsets
+        inside = idx < bounds[:, i + 1, None]
+        idx = np.minimum(idx, (n - 1)[:, None])
+        xa, ya = X[r, a][:, None], Y[r, a][:, None]
+        xj, yj = X[r[:, None], idx], Y[r[:, None], idx]
+        area = np.abs((xa - avg_x[:, i, None]) * (yj - ya) - (xa - xj) * (avg_y[:, i, None] - ya))
+        area[~inside] = -1.0
+        a = idx[r, np.argmax(area, axis=1)]
+        selected[:, i + 1] = a
+    for k, row in enumerate(rows):
+        result[row] = selected[k]
+    return result
+
+class CurveBatch:
+    """收集一张图上的曲线和标记，draw 时一次性加到 Axes 上"""
+
+    def __init__(self):
+        self.curves = []    # (x, y, color, linewidth)
+        self.handles = []   # 图例代理
+        self.markers = {}   # {(marker, s): ([x], [y], [color])}
+
+    def plot(self, x, y, color, label=None, linewidth=2.5):
+        self.curves.append((np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64), color, linewidth))
+        if label is not None:
+            self.handles.append(Line2D([], [], color=color, linewidth=linewidth, label=label))
+
+    def scatter(self, x, y, color, marker="x", s=60):
+        xs, ys, colors = self.markers.setdefault((marker, s), ([], [], []))
+        x, y = np.atleast_1d(np.asarray(x, dtype=np.float64)), np.atleast_1d(np.asarray(y, dtype=np.float64))
+        xs.append(x)
+        ys.append(y)
+        colors.extend([color] * len(x))
+
+    def draw(self, ax, max_points=None, zorder=2):
+        """
+        把收集的曲线和标记加到 ax 上，返回 LineCollection（没有曲线时为 None）
+        max_points 默认取 Axes 的像素宽度；须在设置 yscale 之后调用，对数坐标轴上非正值的点被去掉
+        """
+        log_y = ax.get_yscale() == "log"
+        if max_points is None:
+            max_points = max(int(ax.get_window_extent().width), 3)
+        xs, ys, values = [], [], []
+        for x, y, color, linewidth in self.curves:
+            keep = np.isfinite(x) & np.isfinite(y)
+            if log_y:
+                keep &= y > 0
+            xs.append(x[keep])
+            ys.append(y[keep])
+            # 面积在显示空间中比较
+            values.append(np.log10(y[keep]) if log_y else y[keep])
+        collection = None
+        if self.curves:
+            picks = lttb_indices(xs, values, max_points)
+            segments = [np.column_stack([x[k], y[k]]) for x, y, k in zip(xs, ys, picks)]
+            collection = LineCollection(segments, colors=[c[2] for c in self.curves],
+                                        linewidths=[c[3] for c in self.curves], zorder=zorder)
+            ax.add_collection(collection, autolim=True)
+        for (marker, s), (mx, my, colors) in self.markers.items():
+            ax.scatter(np.concatenate(mx), np.concatenate(my), marker=marker, s=s, c=colors, zorder=zorder + 1)
+        ax.autoscale_view()
+        return collection
+
+if __name__ == "__main__":
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    num_runs = 300
+    num_iters = 5000
+    rng = np.random.default_rng(0)
+    curves = [1e-2 * rng.uniform(0.99, 0.999) ** np.arange(num_iters) * np.exp(rng.normal(0, 0.1, num_iters))
+              for _ in range(num_runs)]
+    iters = np.arange(1, num_iters + 1)
+    colors = plt.cm.tab10(np.arange(num_runs) % 10)
+
+    start = time.perf_counter()
+    fig, ax = plt.subplots(figsize=(25, 10))
+    ax.set_yscale("log")
+    for curve, color in zip(curves, colors):
+        ax.plot(iters, curve, color=color, linewidth=1)
+    fig.savefig("output/curve_rendering_plot.png")
+    plt.close(fig)
+    print(f"逐条 plot：{num_runs} 条 × {num_iters} 点，耗时 {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    fig, ax = plt.subplots(figsize=(25, 10))
+    ax.set_yscale("log")
+    batch = CurveBatch()
+    for curve, color in zip(curves, colors):
+        batch.plot(iters, curve, color=color, linewidth=1)
+    batch.draw(ax)
+    fig.savefig("output/curve_rendering_batch.png")
+    plt.close(fig)
+    print(f"LineCollection + LTTB：耗时 {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,400 @@
+"""
+Description : 配准实验结果库（SQLite）
+各结果脚本原先各自用正则重新解析原始日志，这里统一为一次导入：
+1. 每个日志只用 log_parser 解析一次，写入本地 SQLite
+2. runs 表保存文件名信息（model / algorithm / u）、开头的输入信息、总耗时、迭代次数和 res_trans（float64）
+3. series 表按 (run_id, 序列名) 保存逐次迭代的序列，float32 压缩为 BLOB
+4. 在 (model, algorithm, u) 上建索引，绘图与报告脚本只查询结果库，不再读文本文件
+5. 增量更新：记录每个日志的大小、mtime 和内容哈希，重新运行时只解析新增或修改过的文件，
+   已删除文件的记录会被清除；watch 模式轮询目录树，求解器写完日志后即时导入
+6. 需要解析的日志较多时分发到进程池并行解析（见 log_parser.parse_logs）
+7. 驱动脚本写出的 .timing.json（见 pointcloud_process/iteration_timing.py）作为 wall_time 序列一起导入，
+   其大小、mtime 和内容计入日志的文件信息，计时文件后写出或修改时也会重新导入
+8. 导入时按 convergence_metrics 计算收敛指标写入 metrics 表，(name, value) 上建索引，
+   按指标给实验或算法排名只需一次查询
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import sqlite3
+import numpy as np
+
+from log_parser import parse_log_bytes, parse_logs, is_valid_log_filename
+from convergence_metrics import convergence_metrics, DEFAULT_THRESHOLDS
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pointcloud_process"))
+from iteration_timing import timing_path
+
+DEFAULT_DB_PATH = "output/experiments.sqlite"
+PARALLEL_MIN_LOGS = 64  # 待解析日志少于该数量时不启动进程池
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    folder TEXT NOT NULL,
+    model TEXT,
+    algorithm TEXT,
+    u REAL,
+    method TEXT,
+    source_path TEXT,
+    target_path TEXT,
+    n_source INTEGER,
+    n_target INTEGER,
+    scale REAL,
+    u_value REAL,
+    iterations INTEGER NOT NULL,
+    first_iter INTEGER,
+    final_gt_mse REAL,
+    time_total REAL,
+    res_trans BLOB,
+    reg_path TEXT,
+    size INTEGER,
+    mtime_ns INTEGER,
+    sha1 TEXT
+);
+CREATE TABLE IF NOT EXISTS series (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (run_id, name)
+);
+CREATE INDEX IF NOT EXISTS idx_runs_model_algorithm_u ON runs(model, algorithm, u);
+CREATE INDEX IF NOT EXISTS idx_runs_folder ON runs(folder);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (run_id, name)
+);
+CREATE INDEX IF NOT EXISTS idx_metrics_name_value ON metrics(name, value);
+"""
+
+RUN_COLUMNS = ("path", "folder", "model", "algorithm", "u", "method", "source_path", "target_path",
+               "n_source", "n_target", "scale", "u_value", "iterations", "first_iter", "final_gt_mse",
+               "time_total", "res_trans", "reg_path", "size", "mtime_ns", "sha1")
+
+# 文件信息列（旧版结果库中没有时自动补上）
+FILE_COLUMNS = {"size": "INTEGER", "mtime_ns": "INTEGER", "sha1": "TEXT"}
+
+def find_logs(folder, recursive=True):
+    """列出文件夹中符合命名规则的日志文件"""
+    found = []
+    for root, dirs, files in os.walk(folder):
+        found.extend(os.path.join(root, f) for f in files if is_valid_log_filename(f))
+        if not recursive:
+            break
+    return sorted(found)
+
+def file_signature(path):
+    """日志及其计时文件合起来的 (大小, 最新 mtime_ns)，用于判断是否需要重新解析"""
+    stat = os.stat(path)
+    size, mtime_ns = stat.st_size, stat.st_mtime_ns
+    try:
+        timing = os.stat(timing_path(path))
+        size, mtime_ns = size + timing.st_size, max(mtime_ns, timing.st_mtime_ns)
+    except FileNotFoundError:
+        pass
+    return size, mtime_ns
+
+def _wall_time(timing_bytes, iterations):
+    """计时文件中的到达时间，与日志中的迭代行一一对应时才使用"""
+    try:
+        times = np.asarray(json.loads(timing_bytes)["t"], dtype=np.float64)
+    except (ValueError, KeyError, TypeError):
+        return None
+    return times if len(times) == iterations else None
+
+def parse_log_file(path):
+    """读入并解析一个日志（及其计时文件），附带文件大小、mtime_ns 和内容 sha1（进程池中执行）"""
+    size, mtime_ns = file_signature(path)
+    with open(path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha1(data)
+    parsed = parse_log_bytes(data, path)
+    try:
+        with open(timing_path(path), "rb") as f:
+            timing_bytes = f.read()
+    except FileNotFoundError:
+        timing_bytes = None
+    if timing_bytes is not None:
+        digest.update(timing_bytes)
+        wall_time = _wall_time(timing_bytes, len(parsed["series"]["iter"]))
+        if wall_time is not None:
+            parsed["series"]["wall_time"] = wall_time
+    parsed.update(size=size, mtime_ns=mtime_ns, sha1=digest.hexdigest())
+    return parsed
+
+def parse_existing_log(path):
+    """同 parse_log_file，但文件在列出之后、解析之前被删除或改名时返回 None，不中断整批解析"""
+    try:
+        return parse_log_file(path)
+    except FileNotFoundError:
+        return None
+
+def _run_row(parsed):
+    series = parsed["series"]
+    n = len(series["iter"])
+    finite = series["gt_mse"][np.isfinite(series["gt_mse"])]
+    row = {key: parsed.get(key) for key in RUN_COLUMNS}
+    row.update({
+        "folder": os.path.dirname(parsed["path"]),
+        "iterations": n,
+        "first_iter": int(series["iter"][0]) if n else None,
+        "final_gt_mse": float(finite[-1]) if len(finite) else None,
+        "res_trans": None if parsed["res_trans"] is None else parsed["res_trans"].astype(np.float64).tobytes(),
+    })
+    return tuple(row[key] for key in RUN_COLUMNS)
+
+def _folder_condition(folder, recursive):
+    """folder（绝对路径）下的实验的 SQL 条件；recursive 时包含子文件夹"""
+    if not recursive:
+        return "folder = ?", [folder]
+    # 子文件夹：folder 本身或以 folder + 分隔符开头（转义 LIKE 通配符）
+    prefix = os.path.join(folder, "").replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return "(folder = ? OR folder LIKE ? ESCAPE '\\')", [folder, prefix + "%"]
+
+class ExperimentStore:
+    """配准实验结果库"""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, thresholds=DEFAULT_THRESHOLDS):
+        folder = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(folder, exist_ok=True)
+        self.db_path = db_path
+        self.thresholds = tuple(thresholds)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.executescript(SCHEMA)
+        existing = {row["name"] for row in self.conn.execute("PRAGMA table_info(runs)")}
+        for column, kind in FILE_COLUMNS.items():
+            if column not in existing:
+                self.conn.execute(f"ALTER TABLE runs ADD COLUMN {column} {kind}")
+        # 旧版结果库中还没有指标的实验补算一次
+        missing = [row["id"] for row in self.conn.execute(
+            "SELECT id FROM runs WHERE id NOT IN (SELECT DISTINCT run_id FROM metrics)")]
+        if missing:
+            with self.conn:
+                for run_id in missing:
+                    self._write_metrics(run_id)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write(self, parsed):
+        """写入（或覆盖）一个解析结果，返回 run_id；调用方负责提交事务"""
+        self.conn.execute("DELETE FROM runs WHERE path = ?", (parsed["path"],))
+        cursor = self.conn.execute(
+            f"INSERT INTO runs ({', '.join(RUN_COLUMNS)}) VALUES ({', '.join('?' * len(RUN_COLUMNS))})",
+            _run_row(parsed))
+        run_id = cursor.lastrowid
+        # 全为 nan 的序列（该算法日志中没有的字段）不保存
+        stored = {name: values.astype(np.float32) for name, values in parsed["series"].items()
+                  if len(values) and not np.all(np.isnan(values))}
+        self.conn.executemany(
+            "INSERT INTO series (run_id, name, data) VALUES (?, ?, ?)",
+            [(run_id, name, values.tobytes()) for name, values in stored.items()])
+        self._write_metrics(run_id, stored, parsed["time_total"])
+        return run_id
+
+    def _write_metrics(self, run_id, series=None, time_total=None):
+        """由保存的（float32）序列计算收敛指标，重算时结果与导入时完全相同"""
+        if series is None:
+            series = {name: self.series(run_id, name) for name in ("gt_mse", "wall_time")}
+            time_total = self.conn.execute("SELECT time_total FROM runs WHERE id = ?", (run_id,)).fetchone()[0]
+        metrics = convergence_metrics(series.get("gt_mse", []), series.get("wall_time"), time_total, self.thresholds)
+        self.conn.execute("DELETE FROM metrics WHERE run_id = ?", (run_id,))
+        self.conn.executemany("INSERT INTO metrics (run_id, name, value) VALUES (?, ?, ?)",
+                              [(run_id, name, value) for name, value in metrics.items()])
+
+    def recompute_metrics(self, thresholds=None):
+        """修改阈值后重算全部实验的指标"""
+        if thresholds is not None:
+            self.thresholds = tuple(thresholds)
+        with self.conn:
+            for (run_id,) in self.conn.execute("SELECT id FROM runs").fetchall():
+                self._write_metrics(run_id)
+
+    def _parse(self, log_paths, workers):
+        # 文件较少时进程池的启动开销比解析本身还大
+        if workers is None and len(log_paths) < PARALLEL_MIN_LOGS:
+            workers = 1
+        return parse_logs(log_paths, workers, parser=parse_existing_log)
+
+    def ingest(self, log_paths, workers=None):
+        """解析日志（不论是否修改过）并在一个事务中写入，返回写入的 run_id 列表"""
+        parsed = self._parse(list(log_paths), workers)
+        with self.conn:
+            return [self._write(p) for p in parsed if p is not None]
+
+    def update(self, folder, recursive=True, prune=True, settle=0.0, workers=None):
+        """
+        增量更新文件夹中的日志：
+        1. 大小和 mtime 都没变的文件直接跳过
+        2. 变了的文件先比较内容哈希，内容相同只更新文件信息，不同才重新解析
+        3. prune 时清除文件夹中已被删除的日志的记录
+        settle > 0 时跳过最近 settle 秒内还在修改的文件（求解器可能还在写）
+        需要解析的日志通过 parse_logs 在进程池中并行解析，workers 含义同 parse_logs
+        列出之后、解析之前消失的文件跳过，视同已删除
+        返回各类文件的数量 {"added", "updated", "touched", "unchanged", "removed"}
+        """
+        folder = os.path.abspath(folder)
+        known = {row["path"]: row for row in self._folder_rows(folder, recursive)}
+        counts = dict.fromkeys(("added", "updated", "touched", "unchanged", "removed"), 0)
+        now_ns = time.time_ns()
+        found, changed = set(), []
+        for path in find_logs(folder, recursive):
+            path = os.path.abspath(path)
+            try:
+                size, mtime_ns = file_signature(path)
+            except FileNotFoundError:
+                continue
+            found.add(path)
+            row = known.get(path)
+            if row is not None and row["size"] == size and row["mtime_ns"] == mtime_ns:
+                counts["unchanged"] += 1
+            elif settle <= 0 or now_ns - mtime_ns >= settle * 1e9:
+                changed.append(path)
+
+        parsed_logs = self._parse(changed, workers)
+        with self.conn:
+            for path, parsed in zip(changed, parsed_logs):
+                if parsed is None:
+                    # 解析前已被删除或改名，按不存在处理，旧记录由下面的 prune 清除
+                    found.discard(path)
+                    continue
+                row = known.get(parsed["path"])
+                if row is not None and row["sha1"] == parsed["sha1"]:
+                    self.conn.execute("UPDATE runs SET size = ?, mtime_ns = ? WHERE id = ?",
+                                      (parsed["size"], parsed["mtime_ns"], row["id"]))
+                    counts["touched"] += 1
+                    continue
+                self._write(parsed)
+                counts["added" if row is None else "updated"] += 1
+            if prune:
+                removed = [(row["id"],) for path, row in known.items() if path not in found]
+                self.conn.executemany("DELETE FROM runs WHERE id = ?", removed)
+                counts["removed"] = len(removed)
+        return counts
+
+    def _folder_rows(self, folder, recursive):
+        condition, params = _folder_condition(folder, recursive)
+        return self.conn.execute(f"SELECT id, path, size, mtime_ns, sha1 FROM runs WHERE {condition}", params)
+
+    def watch(self, folder, interval=2.0, settle=1.0, recursive=True, callback=None):
+        """
+        轮询目录树，日志写完（settle 秒内不再变化）后即时导入，Ctrl+C 结束
+        callback(counts) 在每次有变化时调用，可用于重新绘图
+        """
+        print(f"监视 {folder}，每 {interval}s 检查一次（Ctrl+C 结束）")
+        try:
+            while True:
+                counts = self.update(folder, recursive=recursive, settle=settle)
+                changed = {k: v for k, v in counts.items() if v and k != "unchanged"}
+                if changed:
+                    print(f"[{time.strftime('%H:%M:%S')}] {changed}")
+                    if callback is not None:
+                        callback(counts)
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print("停止监视")
+
+    def runs(self, model=None, algorithm=None, u=None, folder=None, recursive=False):
+        """按条件查询实验，返回字典列表（res_trans 已还原为 4×4 矩阵），recursive 时包含 folder 的子文件夹"""
+        conditions, params = [], []
+        for column, value in (("model", model), ("algorithm", algorithm), ("u", u)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if folder is not None:
+            condition, folder_params = _folder_condition(os.path.abspath(folder), recursive)
+            conditions.append(condition)
+            params.extend(folder_params)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self.conn.execute(f"SELECT * FROM runs{where} ORDER BY model, algorithm, u, path", params)
+        return [self._decode(row) for row in rows]
+
+    @staticmethod
+    def _decode(row):
+        run = dict(row)
+        if run["res_trans"] is not None:
+            run["res_trans"] = np.frombuffer(run["res_trans"], dtype=np.float64).reshape(4, 4)
+        return run
+
+    def series(self, run_id, name="gt_mse"):
+        """逐次迭代的序列（float32），日志中没有该字段时返回空数组"""
+        row = self.conn.execute("SELECT data FROM series WHERE run_id = ? AND name = ?", (run_id, name)).fetchone()
+        return np.frombuffer(row["data"], dtype=np.float32) if row else np.empty(0, dtype=np.float32)
+
+    def series_names(self, run_id):
+        return [row["name"] for row in self.conn.execute("SELECT name FROM series WHERE run_id = ?", (run_id,))]
+
+    def metrics(self, run_id):
+        """一个实验的全部收敛指标 {指标名: 值}，未达到的阈值等为 None"""
+        return {row["name"]: row["value"] for row in
+                self.conn.execute("SELECT name, value FROM metrics WHERE run_id = ?", (run_id,))}
+
+    def rank(self, metric, ascending=True, model=None, algorithm=None, u=None, limit=None):
+        """按某个指标给实验排名（指标为空的实验不参与），返回带 value 字段的实验列表"""
+        conditions, params = ["m.name = ?", "m.value IS NOT NULL"], [metric]
+        for column, value in (("model", model), ("algorithm", algorithm), ("u", u)):
+            if value is not None:
+                conditions.append(f"r.{column} = ?")
+                params.append(value)
+        sql = (f"SELECT r.*, m.value AS value FROM metrics m JOIN runs r ON r.id = m.run_id "
+               f"WHERE {' AND '.join(conditions)} ORDER BY m.value {'ASC' if ascending else 'DESC'}")
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return [self._decode(row) for row in self.conn.execute(sql, params)]
+
+    def algorithm_ranking(self, metric, ascending=True, model=None, u=None):
+        """
+        按某个指标给算法排名：每个算法的实验数、达到数（指标不为空）、均值和最好值
+        返回 [{"algorithm", "runs", "reached", "mean", "best"}, ...]，按均值排序
+        """
+        conditions, params = ["m.name = ?"], [metric]
+        for column, value in (("model", model), ("u", u)):
+            if value is not None:
+                conditions.append(f"r.{column} = ?")
+                params.append(value)
+        best = "MIN" if ascending else "MAX"
+        sql = (f"SELECT r.algorithm AS algorithm, COUNT(*) AS runs, COUNT(m.value) AS reached, "
+               f"AVG(m.value) AS mean, {best}(m.value) AS best "
+               f"FROM metrics m JOIN runs r ON r.id = m.run_id WHERE {' AND '.join(conditions)} "
+               f"GROUP BY r.algorithm ORDER BY reached DESC, mean {'ASC' if ascending else 'DESC'}")
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def transform(self, run_id):
+        """res_trans 结果矩阵，日志中没有时返回 None"""
+        row = self.conn.execute("SELECT res_trans FROM runs WHERE id = ?", (run_id,)).fetchone()
+        if row is None or row["res_trans"] is None:
+            return None
+        return np.frombuffer(row["res_trans"], dtype=np.float64).reshape(4, 4)
+
+if __name__ == "__main__":
+    log_folder = "testcase"
+    db_path = DEFAULT_DB_PATH
+    watch_mode = False  # True 时持续监视 log_folder，新日志写完后自动导入
+
+    with ExperimentStore(db_path) as store:
+        start = time.perf_counter()
+        counts = store.update(log_folder)
+        print(f"增量更新 {db_path}：{counts}，耗时 {time.perf_counter() - start:.3f}s")
+        for run in store.runs():
+            print(f"{run['model']:>10} {run['algorithm']:>10} u={run['u']:<8g} 迭代 {run['iterations']:>3} 次 "
+                  f"耗时 {run['time_total']}s 最终 gt_mse {run['final_gt_mse']}")
+        print("\n按达到 1e-06 所需时间给算法排名：")
+        for item in store.algorithm_ranking("seconds_to_1e-06"):
+            mean = "-" if item["mean"] is None else f"{item['mean']:.3f}s"
+            print(f"{item['algorithm']:>10} 达到 {item['reached']}/{item['runs']} 平均 {mean}")
+        if watch_mode:
+            store.watch(log_folder)
@@ -0,0 +1,164 @@
+"""
+Description : 配准结果图的绘制（RMSE 随迭代次数 / 随时间变化）
+交互脚本（result_data_process_rmse.py、results_data_process_time.py）和无界面的批量出图（report_figures.py）共用，
+只在传入的 Axes 上绘制，不依赖 pyplot，也不导入 Tk：
+    new_figure()       不经过 pyplot 创建 Agg 画布的 Figure，可在进程池中并行出图
+    plot_iter_curves   RMSE 随迭代次数变化
+    plot_time_curves   RMSE 随时间变化（使用驱动脚本记录的逐次迭代到达时间）
+同一 (模型, 算法, u) 有多个随机种子时画中位数曲线 + 四分位带 + 中位数的 95% 置信区间（见 run_aggregation.py）
+一张图上的全部曲线合成一个 LineCollection，超过像素宽度的曲线 LTTB 降采样（见 curve_rendering.py）
+"""
+
+import os
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from run_aggregation import aggregate_group, group_runs, plot_band
+from curve_rendering import CurveBatch
+
+# 指定算法顺序
+ALGORITHM_ORDER = ["ICP", "AA-ICP", "FICP", "RICP", "SparseICP", "PPL", "RPPL", "SICPPPL", "ARPPL"]
+
+# 构建算法对应颜色的字典
+ALGORITHM_COLORS = {
+    "ICP": "#1f77b4",       # 蓝色，常用默认
+    "AA-ICP": "#d62728",    # 红色，强对比
+    "FICP": "#2ca02c",      # 绿色，强对比
+    "RICP": "#7f7f7f",      # 灰色，专门标识
+    "SparseICP": "#9467bd", # 紫色
+    "PPL": "#bcbd22",       # 黄绿色
+    "RPPL": "#17becf",      # 青色
+    "SICPPPL": "#e377c2",   # 粉紫
+    "ARPPL": "#ff7f0e",     # 橙色
+}
+
+FIGURE_SIZE = (25, 10)
+FIGURE_RC = {"font.size": 20, "axes.unicode_minus": False}  # 调用方在绘图前 rcParams.update
+
+ITER_X_LIMIT = 59
+TIME_X_LIMIT = 14
+
+def new_figure(figsize=FIGURE_SIZE):
+    """创建挂在 Agg 画布上的 Figure（不注册到 pyplot，用完不需要 close）"""
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+def _algorithm_groups(runs):
+    """{算法: [同一 (模型, 算法, u) 的实验列表, ...]}"""
+    alg_to_groups = {}
+    for (model, alg_name, u), group in group_runs(runs).items():
+        alg_to_groups.setdefault(alg_name, []).append(group)
+    return alg_to_groups
+
+def _annotate_at(ax, x_axis, rmse, x_limit, text, color, offset):
+    """曲线超出 x_limit 时，在 x_limit 附近最近的点上方标注"""
+    idx = np.searchsorted(x_axis, x_limit)
+    if idx >= len(rmse):
+        # 超出 rmse 长度时取最后一个点（就是最接近 x_limit 之前的那个）
+        idx = len(rmse) - 1
+    elif idx > 0 and abs(x_axis[idx] - x_limit) > abs(x_axis[idx - 1] - x_limit):
+        # 前一个点更接近 x_limit 时用前一个点
+        idx -= 1
+    ax.text(x_limit * 0.995, rmse[idx] * offset, text, fontsize=18, color=color,
+            verticalalignment='bottom', horizontalalignment='right')
+
+def plot_iter_curves(ax, store, runs, x_limit=ITER_X_LIMIT):
+    """RMSE 随迭代次数变化，按 ALGORITHM_ORDER 的顺序绘制"""
+    alg_to_groups = _algorithm_groups(runs)
+    batch = CurveBatch()
+    for alg in ALGORITHM_ORDER:
+        if alg not in alg_to_groups:
+            print(f"⚠️ 未找到算法 {alg} 对应的文件")
+            continue
+        color = ALGORITHM_COLORS.get(alg, "black")
+        for group in alg_to_groups[alg]:
+            for run in group:
+                if run["iterations"] == 0:
+                    print(f"⚠️ 文件 {os.path.basename(run['path'])} 中未提取到 RMSE")
+            group = [run for run in group if run["iterations"] > 0]
+            if not group:
+                continue
+            if len(group) == 1:
+                run = group[0]
+                rmse, time_total = store.series(run["id"], "gt_mse"), run["time_total"]
+                iterations = np.arange(1, len(rmse) + 1)
+                batch.plot(iterations, rmse, color, label=f"{alg} ({time_total:.2f}s)")
+                num_iters = len(iterations)
+            else:
+                # 多个种子：中位数曲线 + 四分位带 + 中位数的 95% 置信区间
+                summary = aggregate_group(store, group, axis="iter")
+                rmse, iterations = summary["median"], summary["x"]
+                time_total = np.median([run["time_total"] for run in group if run["time_total"] is not None])
+                plot_band(ax, summary, color, label=f"{alg} (n={len(group)}, {time_total:.2f}s)", batch=batch)
+                num_iters = int(np.median([run["iterations"] for run in group]))
+
+            if len(iterations) > x_limit:
+                _annotate_at(ax, iterations, rmse, x_limit, f"{alg} ({num_iters})", color, 1.3)
+
+    ax.set_yscale('log')
+    batch.draw(ax)
+    ax.set_xlabel("Iterations")
+    ax.set_ylabel("RMSE")
+    ax.set_xlim(-0.5, x_limit)
+    ax.legend(handles=batch.handles, loc="lower right", frameon=True)
+    ax.grid(False)
+
+def plot_time_curves(ax, store, runs, x_limit=TIME_X_LIMIT):
+    """RMSE 随时间变化；没有逐次迭代计时的日志按总耗时均分时间轴"""
+    alg_to_groups = _algorithm_groups(runs)
+    batch = CurveBatch()
+    for alg in ALGORITHM_ORDER:
+        if alg not in alg_to_groups:
+            print(f"⚠️ 未找到算法 {alg} 对应的文件")
+            continue
+        color = ALGORITHM_COLORS.get(alg, "black")
+        for group in alg_to_groups[alg]:
+            for run in group:
+                if run["iterations"] == 0 or run["time_total"] is None:
+                    print(f"⚠️ 文件 {os.path.basename(run['path'])} 中 RMSE 或时间无效")
+            group = [run for run in group if run["iterations"] > 0 and run["time_total"] is not None]
+            if not group:
+                continue
+            if len(group) > 1:
+                # 多个种子：在公共时间网格上取中位数曲线 + 四分位带 + 中位数的 95% 置信区间
+                summary = aggregate_group(store, group, axis="time")
+                time_axis, rmse = summary["x"], summary["median"]
+                time_total = float(np.median([run["time_total"] for run in group]))
+                plot_band(ax, summary, color, label=f"{alg} (n={len(group)})", batch=batch)
+            else:
+                run = group[0]
+                filename = os.path.basename(run["path"])
+                rmse, time_total = store.series(run["id"], "gt_mse"), run["time_total"]
+
+                # 驱动脚本记录了每个迭代行的到达时间时使用真实时间，否则按总耗时均分
+                time_axis = store.series(run["id"], "wall_time").astype(np.float64)
+                if len(time_axis) != len(rmse):
+                    print(f"⚠️ 文件 {filename} 没有逐次迭代的计时，时间轴按总耗时均分")
+                    time_axis = np.linspace(0, time_total, len(rmse))
+                else:
+                    # 耗时最多的几次迭代
+                    costs = np.diff(time_axis, prepend=0.0)
+                    slowest = np.argsort(costs)[::-1][:3]
+                    iter_nums = store.series(run["id"], "iter")
+                    print(f"{alg}: 耗时最多的迭代 " + ", ".join(f"#{int(iter_nums[i])} {costs[i]:.3f}s" for i in slowest))
+                batch.plot(time_axis, rmse, color, label=alg)
+
+            # 运行时间超过 x_limit 时在 x_limit 附近标注总耗时
+            if time_total > x_limit:
+                _annotate_at(ax, time_axis, rmse, x_limit, f"{alg} ({time_total:.1f}s)", color, 1.5)
+
+    ax.set_yscale('log')
+    batch.draw(ax)
+    ax.set_xlabel("Time(sec)")
+    ax.set_ylabel("RMSE")
+    ax.set_xlim(-0.5, x_limit)
+    ax.legend(handles=batch.handles, loc="lower right", frameon=True)
+    ax.grid(False)
+
+# 出图种类：{名称: (绘图函数, 文件名后缀)}
+FIGURE_KINDS = {
+    "iter": (plot_iter_curves, "_iter"),
+    "time": (plot_time_curves, "_time"),
+}
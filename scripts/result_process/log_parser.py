@@ -0,0 +1,310 @@
+"""
+Description : PCL_Deploy.exe 配准日志的统一解析
+日志格式见 pointcloud_process/solver_log.py，文件名为 model_algorithm_log_value.txt。
+一次读入、逐行解析出全部内容：
+1. 开头的输入信息（source / target 路径、method、点数、scale、u value）
+2. 每次迭代的 Iter / u / v / PosRatio / gt_mse / Dir（缺少的字段记为 nan）
+3. 总耗时、res_trans 结果矩阵和输出点云路径
+大批量日志（参数扫描）用 parse_logs 分块分发到进程池并行解析，结果按输入顺序合并
+迭代行占日志的绝大部分，parse_log_data 直接在字节上用 find 定位连续的迭代行，
+按列整体转换为 float；格式不规整的行才退回逐行正则解析，两条路径的结果完全一致
+"""
+
+import io
+import os
+import re
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+LOG_NAME_PATTERN = re.compile(r"^([^\\/_]+)_(.+)_log_(\d*\.?\d+)\.txt$")
+NUMBER = r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?|[-+]?nan|[-+]?inf"
+
+# 迭代行中的字段名 -> 序列名
+ITER_FIELDS = {"Iter": "iter", "u": "u", "v": "v", "PosRatio": "pos_ratio", "gt_mse": "gt_mse", "Dir": "direction"}
+SERIES_NAMES = tuple(ITER_FIELDS.values())
+
+_ITER_FIELD = re.compile(rf"(Iter|PosRatio|gt_mse|Dir|u|v)\s*[:=]\s*({NUMBER})")
+_HEADER_PATH = re.compile(r"^(source|target|method)[：:](.*)$")
+_HEADER_SIZE = re.compile(r"^(source|target):\s*3x(\d+)\s*$")
+_SCALE = re.compile(rf"^scale\s*=\s*({NUMBER})")
+_U_VALUE = re.compile(rf"^u value:\s*({NUMBER})")
+_TIME_TOTAL = re.compile(rf"time total:\s*({NUMBER})")
+
+# 快速路径中数值只允许出现的字符（其余写法如 Inf、1_000 交给正则路径，保证与正则结果一致）
+_NUMBER_CHARS = b"0123456789.eE+-naif "
+# 快速路径中各列前缀的占位字节（非 ASCII，不会出现在通过 isascii 检查的日志里），以及核对行结构用的字节表
+_SENTINELS = bytes(range(0x80, 0x88))
+_SKELETON_DELETE = bytes(c for c in range(256) if c not in _SENTINELS + b"|\n")
+_TO_SPACE = bytes.maketrans(_SENTINELS + b"|", b" " * (len(_SENTINELS) + 1))
+_TO_BAR = bytes.maketrans(_SENTINELS, b"|" * len(_SENTINELS))
+
+def is_valid_log_filename(filename):
+    """判断文件名是否符合格式：model_algorithm_log_value.txt"""
+    return LOG_NAME_PATTERN.match(filename) is not None
+
+def parse_log_filename(filename):
+    """从文件名中提取 (model, algorithm, u)，不符合命名规则时返回 (None, None, None)"""
+    match = LOG_NAME_PATTERN.match(os.path.basename(filename))
+    if not match:
+        return None, None, None
+    return match.group(1), match.group(2), float(match.group(3))
+
+def _empty_result():
+    return {
+        "source_path": None, "target_path": None, "method": None,
+        "n_source": None, "n_target": None, "scale": None, "u_value": None,
+        "time_total": None, "res_trans": None, "reg_path": None,
+    }
+
+def _series_table(blocks):
+    table = np.concatenate([np.asarray(b, dtype=np.float64).reshape(-1, len(SERIES_NAMES)) for b in blocks])
+    return {name: table[:, k] for k, name in enumerate(SERIES_NAMES)}
+
+def parse_log_text(text):
+    """解析日志全文（正则逐行解析），返回字典（series 中每个序列为 float64 数组，长度相同）"""
+    result = _empty_result()
+    rows = _parse_lines(text.splitlines(), result)
+    result["series"] = _series_table([rows])
+    return result
+
+def _parse_lines(lines, result):
+    """逐行解析，输入信息等写入 result，返回迭代行的数值列表"""
+    rows = []
+    i = 0
+    while i < len(lines):
+        line = lines[i].strip()
+        i += 1
+        if line.startswith("Iter"):
+            fields = {ITER_FIELDS[k]: float(v) for k, v in _ITER_FIELD.findall(line)}
+            if "iter" in fields:
+                rows.append([fields.get(name, np.nan) for name in SERIES_NAMES])
+            continue
+        if "time total" in line:
+            match = _TIME_TOTAL.search(line)
+            if match:
+                result["time_total"] = float(match.group(1))
+            continue
+        if line == "res_trans":
+            values = []
+            while i < len(lines) and len(values) < 16:
+                try:
+                    values.extend(float(v) for v in lines[i].split())
+                except ValueError:
+                    break  # 矩阵不完整（日志被截断或损坏）
+                i += 1
+            if len(values) == 16:
+                result["res_trans"] = np.array(values).reshape(4, 4)
+            # 矩阵后面紧跟输出点云路径
+            if i < len(lines) and lines[i].strip() and not lines[i].startswith("["):
+                result["reg_path"] = lines[i].strip()
+                i += 1
+            continue
+        # 以下正则都锚定在行首，先按开头的字面前缀分流，省去大多数行上的无用匹配
+        if line.startswith(("source", "target", "method")):
+            match = _HEADER_SIZE.match(line)
+            if match:
+                result[f"n_{match.group(1)}"] = int(match.group(2))
+                continue
+            match = _HEADER_PATH.match(line)
+            if match:
+                key = "method" if match.group(1) == "method" else f"{match.group(1)}_path"
+                if result[key] is None:
+                    result[key] = match.group(2).strip()
+            continue
+        if line.startswith("scale"):
+            match = _SCALE.match(line)
+            if match:
+                result["scale"] = float(match.group(1))
+            continue
+        if line.startswith("u value:"):
+            match = _U_VALUE.match(line)
+            if match:
+                result["u_value"] = float(match.group(1))
+    return rows
+
+def _iter_block_columns(block):
+    """
+    连续迭代行（每行都以 Iter 开头）整体解析，返回 n×len(SERIES_NAMES) 数组；
+    字段数、字段名、分隔写法或数值不规整时返回 None，由调用方退回正则路径
+    以第一行的写法（如 " u: "、"Iter = "、数值后的 " mm "）为准，把每个字段的前缀替换成等长的"占位字节 + 空格"，
+    用一次 translate 核对每行的字段顺序，再由 np.loadtxt 的 C 解析器一次转换全部数值，不为每个数值创建 bytes 对象
+    """
+    # 非 ASCII 字节交给正则路径；控制字符等写法不会通过后面的骨架和字符集检查
+    if not block.isascii():
+        return None
+    if b"\r" in block:
+        block = block.replace(b"\r\n", b"\n")
+    n = block.count(b"\n") + 1
+    parts = block[:block.find(b"\n")].split(b"|") if n > 1 else block.split(b"|")
+    k = len(parts)
+    if k > len(_SENTINELS):
+        return None
+    # 每行写成 |字段|字段|...|，字段前缀（连同前一字段数值后的单位和 |）替换为该列的占位字节
+    text = b"|" + block.replace(b"\n", b"|\n|") + b"|\n"
+    columns, unit = [], b""
+    for j, part in enumerate(parts):
+        sep = min((i for i in (part.find(b":"), part.find(b"=")) if i >= 0), default=-1)
+        if sep < 0:
+            return None
+        name = ITER_FIELDS.get(part[:sep].strip().decode("ascii"))
+        if name is None or name in columns:
+            return None
+        columns.append(name)
+        value_start = len(part) - len(part[sep + 1:].lstrip(b" \t"))
+        prefix = unit + b"|" + part[:value_start]
+        text = text.replace(prefix, _SENTINELS[j:j + 1] + b" " * (len(prefix) - 1))
+        value = part[value_start:].split(maxsplit=1)
+        if not value:
+            return None
+        # 只去掉紧跟在数值后面的单位
+        unit = part[value_start + len(value[0]):]
+        unit = unit if unit.strip() == b"mm" else b""
+    if unit:
+        text = text.replace(unit + b"|\n", b" " * len(unit) + b"|\n")
+    # 每行剩下的骨架必须是 "各列占位字节依次出现一次 + |"
+    packed = text.translate(None, b" ")
+    if packed.translate(None, _SKELETON_DELETE) != (_SENTINELS[:k] + b"|\n") * n:
+        return None
+    # 不允许空字段，否则同一行里的空字段和 "0 95" 这类数值会相互抵消
+    if b"||" in packed.translate(_TO_BAR):
+        return None
+    values = text.translate(_TO_SPACE)
+    if values.translate(None, _NUMBER_CHARS + b"\n"):
+        return None
+    # 无法解析的数值、某行数值个数不是 k 时 loadtxt 抛出 ValueError
+    try:
+        flat = np.loadtxt(io.BytesIO(values), dtype=np.float64, comments=None, ndmin=2)
+    except ValueError:
+        return None
+    if flat.shape != (n, k):
+        return None
+    table = np.full((n, len(SERIES_NAMES)), np.nan)
+    table[:, [SERIES_NAMES.index(name) for name in columns]] = flat
+    if np.isnan(table[:, SERIES_NAMES.index("iter")]).any():
+        return None
+    return table
+
+def parse_log_data(data, encoding="gbk"):
+    """
+    字节级快速解析，结果与 parse_log_text(data.decode(encoding)) 完全一致：
+    1. 用 find / rfind 定位第一行和最后一行 Iter，两者之间若全是迭代行则按列整体转换
+    2. 前后的输入信息、总耗时和 res_trans 只有十几行，解码后逐行解析
+    """
+    start = 0 if data.startswith(b"Iter") else data.find(b"\nIter") + 1
+    if start == 0 and not data.startswith(b"Iter"):
+        return parse_log_text(data.decode(encoding, errors="ignore"))
+    last = max(start, data.rfind(b"\nIter") + 1)
+    end = data.find(b"\n", last)
+    end = len(data) if end < 0 else end
+    block = data[start:end]
+
+    result = _empty_result()
+    head = _parse_lines(data[:start].decode(encoding, errors="ignore").splitlines(), result)
+    table = _iter_block_columns(block)
+    if table is None:
+        table = _parse_lines(block.decode(encoding, errors="ignore").splitlines(), result)
+    tail = _parse_lines(data[end:].decode(encoding, errors="ignore").splitlines(), result)
+    result["series"] = _series_table([head, table, tail])
+    return result
+
+def parse_log_bytes(data, log_path, encoding="gbk"):
+    """解析已读入内存的日志内容，附带文件名中的 model / algorithm / u"""
+    result = parse_log_data(data, encoding)
+    result["path"] = os.path.abspath(log_path)
+    result["model"], result["algorithm"], result["u"] = parse_log_filename(log_path)
+    return result
+
+def parse_log(log_path, encoding="gbk"):
+    """读取并解析一个日志文件"""
+    with open(log_path, "rb") as f:
+        return parse_log_bytes(f.read(), log_path, encoding)
+
+def parse_logs(log_paths, workers=None, chunksize=None, parser=parse_log):
+    """
+    并行解析多个日志，返回与 log_paths 顺序一致的结果列表
+    workers: 进程数，None 为 CPU 核数，1 为在当前进程串行解析
+    chunksize: 每次分给一个进程的日志数，None 时每个进程约分到 4 块
+    parser: 单个日志的解析函数，必须是模块顶层函数（子进程中按名字导入）
+    """
+    log_paths = list(log_paths)
+    workers = min(workers or os.cpu_count() or 1, max(1, len(log_paths)))
+    if workers == 1:
+        return [parser(path) for path in log_paths]
+    if chunksize is None:
+        chunksize = max(1, -(-len(log_paths) // (workers * 4)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(parser, log_paths, chunksize=chunksize))
+
+def benchmark_parse(log_paths, worker_counts=(1, 2, 4, None), repeat=3):
+    """不同进程数下的解析速度（日志数/秒、MB/秒），取 repeat 次中最快的一次"""
+    log_paths = list(log_paths)
+    total_mb = sum(os.path.getsize(p) for p in log_paths) / 2 ** 20
+    results = []
+    for workers in worker_counts:
+        best = min(_timed_parse(log_paths, workers) for _ in range(repeat))
+        n = workers or os.cpu_count() or 1
+        results.append({"workers": n, "seconds": best,
+                        "logs_per_s": len(log_paths) / best, "mb_per_s": total_mb / best})
+        print(f"workers={n:>3}: {best:.3f}s  {len(log_paths) / best:10.1f} logs/s  {total_mb / best:8.2f} MB/s")
+    return results
+
+_BASELINE_RMSE = re.compile(r"gt_mse\s*[:=]\s*([0-9eE\.\-]+)")
+_BASELINE_TIME = re.compile(r"time total:([0-9eE\.\-]+)")
+
+def _baseline_extract(text):
+    """原 result_data_process_rmse.extract_rmse_and_time 的逐行正则（只取 gt_mse 和总耗时），作为速度基线"""
+    rmse_list = []
+    time_total = None
+    for line in text.splitlines():
+        rmse_match = _BASELINE_RMSE.search(line)
+        if rmse_match:
+            rmse_list.append(float(rmse_match.group(1)))
+        if "time total" in line:
+            time_match = _BASELINE_TIME.search(line)
+            if time_match:
+                time_total = float(time_match.group(1))
+    return np.array(rmse_list), time_total
+
+def compare_parsers(log_paths, encoding="gbk"):
+    """
+    字节级快速路径与逐行正则路径的结果核对，以及与原绘图脚本逐行提取 gt_mse 的速度对比（只计解析和解码，不计读文件）
+    原脚本只提取 gt_mse 一列，这里解析全部六列和输入信息
+    """
+    contents = []
+    for path in log_paths:
+        with open(path, "rb") as f:
+            contents.append(f.read())
+    start = time.perf_counter()
+    for data in contents:
+        _baseline_extract(data.decode(encoding, errors="ignore"))
+    base_time = time.perf_counter() - start
+    start = time.perf_counter()
+    slow = [parse_log_text(data.decode(encoding, errors="ignore")) for data in contents]
+    slow_time = time.perf_counter() - start
+    start = time.perf_counter()
+    fast = [parse_log_data(data, encoding) for data in contents]
+    fast_time = time.perf_counter() - start
+    for path, a, b in zip(log_paths, slow, fast):
+        for name in SERIES_NAMES:
+            if not np.array_equal(a["series"][name], b["series"][name], equal_nan=True):
+                print(f"⚠️ {path} 的 {name} 序列不一致")
+    print(f"原脚本提取 gt_mse {base_time:.3f}s，正则解析 {slow_time:.3f}s，字节级解析 {fast_time:.3f}s"
+          f"（相对正则 {slow_time / fast_time:.1f} 倍，相对原脚本 {base_time / fast_time:.2f} 倍）")
+    return base_time, slow_time, fast_time
+
+def _timed_parse(log_paths, workers):
+    start = time.perf_counter()
+    parse_logs(log_paths, workers)
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    log_folder = "testcase"
+    copies = 50  # 日志较少时重复多次，模拟参数扫描产生的大量日志
+
+    log_paths = sorted(os.path.join(root, f) for root, dirs, files in os.walk(log_folder)
+                       for f in files if is_valid_log_filename(f))
+    log_paths = log_paths * copies
+    print(f"{len(log_paths)} 个日志，共 {sum(os.path.getsize(p) for p in log_paths) / 2 ** 20:.2f} MB")
+    compare_parsers(log_paths)
+    benchmark_parse(log_paths)
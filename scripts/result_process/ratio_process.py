@@ -2,46 +2,37 @@
 Description : 对舱段模型在不同u值条件下配准后的数据进行处理与可视化
 """
 
-import os
-import re
 import numpy as np
 import matplotlib.pyplot as plt
-from glob import glob
 
 import matplotlib
 matplotlib.rcParams['font.family'] = 'SimHei'  # 支持中文显示
 matplotlib.rcParams['axes.unicode_minus'] = False
 
-def extract_posratio(filepath):
-    """从日志文件中提取每次迭代的 PosRatio 值"""
-    posratios = []
-    pattern = re.compile(r"Iter:\s*\d+\s*\|.*?PosRatio:\s*([\d\.]+)")
-    with open(filepath, 'r', encoding='gbk', errors='replace') as f:
-        for line in f:
-            match = pattern.search(line)
-            if match:
-                posratios.append(float(match.group(1)))
-    return np.array(posratios)
-
-def extract_param_from_filename(filename):
-    """从文件名中提取 log_ 后面的参数值"""
-    match = re.search(r"log_(\d*\.?\d+)", filename)
-    return match.group(1) if match else "unknown"
+from experiment_store import ExperimentStore, DEFAULT_DB_PATH
+
+def extract_posratio(store, run):
+    """从结果库中取出每次迭代的 PosRatio 值（去掉没有 PosRatio 的迭代）"""
+    posratios = store.series(run["id"], "pos_ratio")
+    return posratios[~np.isnan(posratios)]
 
 # 设置日志文件夹路径
 log_folder = 'testcase/PosRatioProcessing'
-file_pattern = os.path.join(log_folder, 'Cylinder_EXPICP_log_*.txt')
-log_files = sorted(glob(file_pattern))  # 可确保顺序一致
+store = ExperimentStore(DEFAULT_DB_PATH)
+store.update(log_folder, recursive=False, workers=1)  # 脚本没有 __main__ 保护，不能启动进程池
+runs = store.runs(model="Cylinder", algorithm="EXPICP", folder=log_folder)  # 按 u 排序，可确保顺序一致
 
 # 绘图
 plt.figure(figsize=(10, 6))
-colors = plt.cm.viridis(np.linspace(0, 1, len(log_files)))  # 自动生成颜色
+colors = plt.cm.viridis(np.linspace(0, 1, len(runs)))  # 自动生成颜色
 
-for idx, file_path in enumerate(log_files):
-    param = extract_param_from_filename(os.path.basename(file_path))
-    posratio = extract_posratio(file_path)
+for idx, run in enumerate(runs):
+    param = f"{run['u']:g}"
+    posratio = extract_posratio(store, run)
     plt.plot(range(1, len(posratio)+1), posratio, label=f"v = {param}", color=colors[idx])
 
+store.close()
+
 plt.title("PosRatio 迭代趋势对比")
 plt.xlabel("Iteration")
 plt.ylabel("PosRatio")
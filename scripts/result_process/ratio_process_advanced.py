@@ -3,65 +3,40 @@ Description : 对舱段模型在不同u值条件下配准后的数据进行处
 """
 
 import os
-import re
 import numpy as np
 import matplotlib.pyplot as plt
-from glob import glob
 
 import matplotlib
 matplotlib.rcParams['font.family'] = 'Microsoft YaHei'  # 支持中文显示
 matplotlib.rcParams['axes.unicode_minus'] = False
 
-def extract_posratio(filepath):
-    """从日志文件中提取每次迭代的 PosRatio 值"""
-    posratios = []
-    pattern = re.compile(r"Iter:\s*\d+\s*\|.*?PosRatio:\s*([\d\.]+)")
-    with open(filepath, 'r', encoding='gbk', errors='replace') as f:
-        for line in f:
-            match = pattern.search(line)
-            if match:
-                posratios.append(float(match.group(1)))
-    return np.array(posratios)
-
-def extract_posratio_and_u_changes(filepath):
+from experiment_store import ExperimentStore, DEFAULT_DB_PATH
+from curve_rendering import CurveBatch
+
+def extract_posratio_and_u_changes(store, run):
     """
-    提取 PosRatio 数值，以及 u 值发生变化的迭代编号
+    从结果库中取出 PosRatio 序列，以及 u 值发生变化的迭代编号
     返回：
-        posratios: List[float]
-        u_change_iters: List[int]
+        posratios: np.ndarray
+        u_change_iters: np.ndarray
     """
-    posratios = []
-    u_change_iters = []
-    last_u = None
-
-    pattern = re.compile(r"Iter:\s*(\d+)\s*\| v: .*? \| u: ([\deE\.\-]+) mm \| PosRatio:\s*([\d\.]+)")
-
-    with open(filepath, 'r', encoding='gbk', errors='ignore') as f:
-        for line in f:
-            match = pattern.search(line)
-            if match:
-                iter_num = int(match.group(1))
-                u_value = float(match.group(2))
-                pos = float(match.group(3))
-
-                posratios.append(pos)
-
-                if last_u is None or not np.isclose(u_value, last_u, rtol=1e-6, atol=1e-9):
-                    u_change_iters.append(iter_num)
-                    last_u = u_value
+    posratios = store.series(run["id"], "pos_ratio")
+    u_values = store.series(run["id"], "u")
+    iter_nums = store.series(run["id"], "iter").astype(int)
 
-    print(f"✅ {os.path.basename(filepath)} - 提取 {len(posratios)} 个 PosRatio，u变化 {len(u_change_iters)} 次")
-    return np.array(posratios), np.array(u_change_iters)
+    # 第一次迭代以及 u 与上一次不同的迭代
+    changed = np.ones(len(u_values), dtype=bool)
+    changed[1:] = ~np.isclose(u_values[1:], u_values[:-1], rtol=1e-6, atol=1e-9)
+    u_change_iters = iter_nums[changed]
 
-def extract_param_from_filename(filename):
-    """从文件名中提取 log_ 后面的参数值"""
-    match = re.search(r"log_(\d*\.?\d+)", filename)
-    return match.group(1) if match else "unknown"
+    print(f"✅ {os.path.basename(run['path'])} - 提取 {len(posratios)} 个 PosRatio，u变化 {len(u_change_iters)} 次")
+    return posratios, u_change_iters
 
 # 设置日志文件夹路径
 log_folder = 'testcase/test0703/PosRatioProcessing'
-file_pattern = os.path.join(log_folder, 'Cylinder_EXPICP_log_*.txt')
-log_files = sorted(glob(file_pattern))  # 可确保顺序一致
+store = ExperimentStore(DEFAULT_DB_PATH)
+store.update(log_folder, recursive=False, workers=1)  # 脚本没有 __main__ 保护，不能启动进程池
+runs = store.runs(model="Cylinder", algorithm="EXPICP", folder=log_folder)  # 按 u 排序，可确保顺序一致
 
 # 初始化全局最大值追踪
 global_max_ratio = -np.inf
@@ -70,52 +45,35 @@ global_max_info = {"file": None, "param": None, "iter": None, "u_value": None, "
 # 绘图
 plt.figure(figsize=(10, 6))
 colors = plt.get_cmap("tab20").colors  # 自动生成颜色
+batch = CurveBatch()  # 全部曲线合成一个 LineCollection，u 变化标记只调用一次 scatter
 
-for idx, file_path in enumerate(log_files):
-    """    
-    param = extract_param_from_filename(os.path.basename(file_path))
-    posratio = extract_posratio(file_path)
-    plt.plot(range(1, len(posratio)+1), posratio, label=f"v = {param}", color=colors[idx])
-    """
-    
-    param = extract_param_from_filename(os.path.basename(file_path))
-    posratios, u_change_iters = extract_posratio_and_u_changes(file_path)
+for idx, run in enumerate(runs):
+    param = f"{run['u']:g}"
+    posratios, u_change_iters = extract_posratio_and_u_changes(store, run)
     iters = np.arange(1, len(posratios)+1)
 
     # 画 PosRatio 曲线
-    plt.plot(iters, posratios, label=f"log_{param}", color=colors[idx])
+    batch.plot(iters, posratios, colors[idx], label=f"log_{param}", linewidth=1.5)
 
     # 画 × 标记
-    for i in u_change_iters:
-        if i <= len(posratios):  # 防止越界
-            plt.scatter(i, posratios[i - 1], marker='x', color=colors[idx], s=60)
-    
-        # ✅ 查找当前文件中最大值及其索引
+    marks = u_change_iters[(u_change_iters >= 1) & (u_change_iters <= len(posratios))]  # 防止越界
+    batch.scatter(marks, posratios[marks - 1], colors[idx], marker='x', s=60)
+
+    # ✅ 查找当前文件中最大值及其对应的迭代编号与 u 值
     local_max_idx = np.argmax(posratios)
     local_max_val = posratios[local_max_idx]
-
-    # ✅ 从文件中提取该迭代对应的 u 值
-    pattern = re.compile(r"Iter:\s*(\d+)\s*\| v: .*? \| u: ([\deE\.\-]+) mm \| PosRatio:\s*([\d\.]+)")
-    with open(file_path, 'r', encoding='gbk', errors='ignore') as f:
-        for line in f:
-            match = pattern.search(line)
-            if match:
-                iter_num = int(match.group(1))
-                u_val = float(match.group(2))
-                pos = float(match.group(3))
-                if np.isclose(pos, local_max_val, rtol=1e-6):
-                    # ✅ 找到匹配的行
-                    if local_max_val > global_max_ratio:
-                        global_max_ratio = local_max_val
-                        global_max_info = {
-                            "file": os.path.basename(file_path),
-                            "param": param,
-                            "iter": iter_num,
-                            "u_value": u_val,
-                            "value": local_max_val
-                        }
-                    break
-
+    if local_max_val > global_max_ratio:
+        global_max_ratio = local_max_val
+        global_max_info = {
+            "file": os.path.basename(run["path"]),
+            "param": param,
+            "iter": int(store.series(run["id"], "iter")[local_max_idx]),
+            "u_value": float(store.series(run["id"], "u")[local_max_idx]),
+            "value": local_max_val
+        }
+
+store.close()
+batch.draw(plt.gca())
 
 print("\n📈 全部日志文件中 PosRatio 最大值统计：")
 print(f"最大值: {global_max_info['value']:.5f}")
@@ -127,7 +85,7 @@ print(f"对应 u 值: {global_max_info['u_value']} mm")
 plt.title("PosRatio 迭代趋势对比")
 plt.xlabel("Iteration")
 plt.ylabel("PosRatio")
-plt.legend(title="参数值", loc="lower right")
+plt.legend(handles=batch.handles, title="参数值", loc="lower right")
 plt.grid(True)
 plt.tight_layout()
 plt.show()
@@ -0,0 +1,107 @@
+"""
+Description : 无界面批量生成结果报告的图表
+一次扫描完成后重新生成全部论文图表：
+    python report_figures.py testcase/test0704 testcase/test0705 -o output/figures
+1. 命令行传入结果文件夹（包含子文件夹），不弹出 Tk 窗口，也不调用 plt.show()
+2. 先增量更新结果库（见 experiment_store.py），之后只查询结果库
+3. 每个文件夹中的每个模型各生成一张 RMSE-迭代次数图和一张 RMSE-时间图，
+   写到 {输出目录}/{文件夹名}/{模型}_iter.png、{模型}_time.png
+4. 各图表分发到进程池并行绘制；matplotlib 使用 Agg 后端，绘图不经过 pyplot（见 figure_plotting.new_figure）
+"""
+
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use("Agg")  # 在任何可能导入 pyplot 的模块之前
+
+from experiment_store import ExperimentStore, DEFAULT_DB_PATH
+from figure_plotting import FIGURE_KINDS, FIGURE_RC, new_figure
+
+DEFAULT_OUTPUT_DIR = "output/figures"
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="无界面批量生成 RMSE-迭代次数 / RMSE-时间 图表")
+    parser.add_argument("folders", nargs="+", help="包含日志的结果文件夹（包含子文件夹）")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT_DIR, help="图表输出目录")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="结果库路径")
+    parser.add_argument("--kinds", nargs="+", choices=sorted(FIGURE_KINDS), default=list(FIGURE_KINDS),
+                        help="要生成的图表种类")
+    parser.add_argument("--models", nargs="+", default=None, help="只生成这些模型的图表（默认全部）")
+    parser.add_argument("--format", default="png", help="图片格式（png / pdf / svg ...）")
+    parser.add_argument("--dpi", type=float, default=None)
+    parser.add_argument("-j", "--workers", type=int, default=None, help="进程数（默认 CPU 核数，1 为不使用进程池）")
+    return parser.parse_args(argv)
+
+def _folder_name(folder, used):
+    """输出子目录名：文件夹名，重名时附加序号"""
+    name = os.path.basename(os.path.normpath(os.path.abspath(folder))) or "root"
+    candidate, k = name, 1
+    while candidate in used:
+        k += 1
+        candidate = f"{name}_{k}"
+    used.add(candidate)
+    return candidate
+
+def collect_jobs(store, folders, output_dir, kinds, models=None, fmt="png", dpi=None, db_path=DEFAULT_DB_PATH):
+    """每个 (文件夹, 模型, 图表种类) 一个任务"""
+    jobs, used = [], set()
+    for folder in folders:
+        out_folder = os.path.join(output_dir, _folder_name(folder, used))
+        folder_models = sorted({run["model"] for run in store.runs(folder=folder, recursive=True)})
+        if not folder_models:
+            print(f"⚠️ {folder} 中没有找到符合命名规则的日志文件")
+        for model in folder_models:
+            if models and model not in models:
+                continue
+            for kind in kinds:
+                out_path = os.path.join(out_folder, f"{model}{FIGURE_KINDS[kind][1]}.{fmt}")
+                jobs.append({"db_path": db_path, "folder": folder, "model": model, "kind": kind,
+                             "out_path": out_path, "dpi": dpi})
+    return jobs
+
+def render_figure(job):
+    """绘制并保存一张图表（进程池中执行），返回 (输出路径, 耗时)"""
+    start = time.perf_counter()
+    matplotlib.rcParams.update(FIGURE_RC)
+    plot, _ = FIGURE_KINDS[job["kind"]]
+    with ExperimentStore(job["db_path"]) as store:
+        runs = store.runs(model=job["model"], folder=job["folder"], recursive=True)
+        fig = new_figure()
+        plot(fig.gca(), store, runs)
+    fig.tight_layout()
+    os.makedirs(os.path.dirname(job["out_path"]) or ".", exist_ok=True)
+    # bbox_inches='tight'表示指定将图表多余的空白区域裁减掉
+    fig.savefig(job["out_path"], bbox_inches='tight', dpi=job["dpi"] or "figure")
+    return job["out_path"], time.perf_counter() - start
+
+def render_figures(jobs, workers=None):
+    """并行绘制全部图表，逐个返回 (输出路径, 耗时)"""
+    if workers == 1 or len(jobs) <= 1:
+        yield from map(render_figure, jobs)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(render_figure, jobs)
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    start = time.perf_counter()
+    with ExperimentStore(args.db) as store:
+        for folder in args.folders:
+            if not os.path.isdir(folder):
+                print(f"❌ 文件夹不存在：{folder}")
+                return 1
+            counts = store.update(folder, recursive=True, workers=args.workers)
+            print(f"增量更新 {folder}：{counts}")
+        jobs = collect_jobs(store, args.folders, args.output, args.kinds, args.models,
+                            args.format, args.dpi, args.db)
+    for out_path, elapsed in render_figures(jobs, args.workers):
+        print(f"✅ {out_path}（{elapsed:.2f}s）")
+    print(f"共生成 {len(jobs)} 张图表，总耗时 {time.perf_counter() - start:.2f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
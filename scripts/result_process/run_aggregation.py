@@ -0,0 +1,212 @@
+"""
+Description : 重复随机实验的统计汇总
+split_point_cloud 和 generate_random_rigid_transform 都是随机的，单个日志只是一次抽样。
+同一 (model, algorithm, u) 的多个种子（通常放在不同子文件夹）对齐后整体统计：
+1. 按迭代对齐：补齐到最长的迭代数，已结束的实验保持最后的值（收敛后误差不再变化）
+2. 按时间对齐：在公共时间网格上取各实验当时最新一次迭代的值，第一次迭代之前为 nan
+3. 对齐后的 (实验数 × 网格) 数组上逐列计算中位数、四分位带，以及中位数的 bootstrap 置信区间
+   bootstrap 的每次重抽样只用各实验被抽中的次数（多项分布）表示，各列排序一次后按秩定位重抽样中位数，
+   不生成 (次数 × 实验数 × 列数) 的重抽样数组（见 bootstrap_median_ci）
+gt_mse 跨越多个数量级，统计在 log10 空间中进行，结果再换回原值
+"""
+
+import time
+import warnings
+import numpy as np
+
+def pad_series(series_list, length=None):
+    """按迭代对齐：返回 (实验数 × length) 数组，较短的序列用最后一个值补齐，空序列整行为 nan"""
+    length = max((len(s) for s in series_list), default=0) if length is None else length
+    lengths = np.array([min(len(s), length) for s in series_list], dtype=np.int64)
+    padded = np.full((len(series_list), length), np.nan)
+    if not len(series_list) or not length:
+        return padded
+    rows = np.repeat(np.arange(len(series_list)), lengths)
+    cols = np.concatenate([np.arange(n) for n in lengths])
+    padded[rows, cols] = np.concatenate([np.asarray(s[:n], dtype=np.float64) for s, n in zip(series_list, lengths)])
+    # 每行最后一个有效值向右延续
+    last = np.where(lengths > 0, lengths - 1, 0)
+    tail = np.arange(length)[None, :] >= lengths[:, None]
+    fill = padded[np.arange(len(series_list)), last]
+    padded[tail] = np.broadcast_to(fill[:, None], padded.shape)[tail]
+    padded[lengths == 0] = np.nan
+    return padded
+
+def resample_on_time(times_list, series_list, grid):
+    """
+    按时间对齐：返回 (实验数 × len(grid)) 数组，每个网格时刻取该实验已完成的最近一次迭代的值
+    times_list 中每个序列须非递减；所有实验拼成一条带偏移的有序序列，只做一次 searchsorted
+    """
+    grid = np.asarray(grid, dtype=np.float64)
+    times = pad_series(times_list)
+    values = pad_series(series_list, times.shape[1])
+    n_runs, length = times.shape
+    result = np.full((n_runs, len(grid)), np.nan)
+    if not n_runs or not length or not len(grid):
+        return result
+    valid = np.isfinite(times).all(axis=1)
+    times = np.where(valid[:, None], times, 0.0)
+    low = min(times.min(), grid.min())
+    span = max(times.max(), grid.max()) - low + 1.0
+    # 第 i 行整体平移 i × span，各行互不重叠，展平后仍然有序
+    offsets = np.arange(n_runs)[:, None] * span
+    flat = (times - low + offsets).ravel()
+    queries = (grid[None, :] - low + offsets).ravel()
+    idx = np.searchsorted(flat, queries, side="right") - 1
+    row = np.repeat(np.arange(n_runs), len(grid))
+    # 落在本行第一次迭代之前（即落到前一行）的查询为 nan
+    inside = (idx >= row * length) & valid[row]
+    result.ravel()[inside] = values.ravel()[idx[inside]]
+    return result
+
+def bootstrap_median_ci(matrix, n_boot=1000, ci=0.95, rng=None):
+    """
+    逐列中位数的 bootstrap 置信区间，返回 (low, high)；nan 视为缺失（与 nanmedian 一致）
+    一次重抽样只由各实验被抽中的次数（多项分布计数）决定，而单列中位数的分布与计数落在哪个实验上无关：
+    每列排序一次（nan 排在最后），同一组计数的累积和上按秩 searchsorted 即可定位每次重抽样的中位数，
+    不需要真正生成 (次数 × 实验数 × 列数) 的重抽样数组
+    """
+    rng = np.random.default_rng(rng)
+    n_runs, n_cols = matrix.shape
+    if n_runs == 0 or n_cols == 0:
+        return np.full(n_cols, np.nan), np.full(n_cols, np.nan)
+    medians = np.full((n_boot, n_cols), np.nan)
+    ordered = np.sort(matrix, axis=0)
+    valid_counts = np.isfinite(matrix).sum(axis=0)
+    counts = rng.multinomial(n_runs, np.full(n_runs, 1.0 / n_runs), size=n_boot)
+    cum = np.cumsum(counts, axis=1)
+    # 各行平移 row × (n_runs + 1) 后展平仍然有序，一次 searchsorted 处理所有重抽样
+    rows = np.arange(n_boot)
+    flat = (cum + (rows * (n_runs + 1))[:, None]).ravel()
+
+    def position_of_rank(rank):
+        return np.searchsorted(flat, rank + rows * (n_runs + 1), side="left") - rows * n_runs
+
+    for m in np.unique(valid_counts):
+        if m == 0:
+            continue
+        cols = np.flatnonzero(valid_counts == m)
+        # 前 m 个（排序后的有效值）位置上被抽中的总次数
+        total = cum[:, m - 1]
+        picked = total > 0
+        # 重抽样中位数的秩：奇数个取第 (t+1)/2 个，偶数个取第 t/2 和 t/2+1 个的平均
+        lower = position_of_rank(np.maximum((total + 1) // 2, 1))
+        upper = position_of_rank(np.maximum(total // 2 + 1, 1))
+        block = ordered[:, cols]
+        values = 0.5 * (block[lower] + block[upper])
+        values[~picked] = np.nan
+        medians[:, cols] = values
+    alpha = (1.0 - ci) / 2
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        low, high = np.nanquantile(medians, [alpha, 1.0 - alpha], axis=0)
+    return low, high
+
+def summarize(matrix, log=True, n_boot=1000, ci=0.95, rng=None):
+    """
+    对齐后的数组逐列统计，返回字典：
+    n（每列有效实验数）、median、q25、q75、ci_low、ci_high
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    with np.errstate(invalid="ignore"):
+        values = np.log10(np.where(matrix > 0, matrix, np.nan)) if log else matrix
+    q25, median, q75 = np.full((3, values.shape[1]), np.nan)
+    if len(values):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            q25, median, q75 = np.nanquantile(values, [0.25, 0.5, 0.75], axis=0)
+    ci_low, ci_high = bootstrap_median_ci(values, n_boot=n_boot, ci=ci, rng=rng)
+    result = {"n": np.isfinite(values).sum(axis=0), "median": median, "q25": q25, "q75": q75,
+              "ci_low": ci_low, "ci_high": ci_high}
+    if log:
+        for key in ("median", "q25", "q75", "ci_low", "ci_high"):
+            result[key] = 10.0 ** result[key]
+    return result
+
+def run_times(store, run):
+    """实验逐次迭代的时间：优先使用驱动记录的 wall_time，否则按总耗时均分"""
+    n = run["iterations"]
+    wall_time = store.series(run["id"], "wall_time")
+    if len(wall_time) == n:
+        return wall_time.astype(np.float64)
+    if run["time_total"] is None:
+        return np.full(n, np.nan)
+    return np.linspace(0, run["time_total"], n)
+
+def group_runs(runs):
+    """按 (model, algorithm, u) 分组，保持查询顺序"""
+    groups = {}
+    for run in runs:
+        groups.setdefault((run["model"], run["algorithm"], run["u"]), []).append(run)
+    return groups
+
+def aggregate_group(store, runs, axis="iter", metric="gt_mse", grid=None, num_points=200, log=True,
+                    n_boot=1000, ci=0.95, rng=None):
+    """
+    同一组实验对齐并统计
+    axis="iter" 时横坐标为迭代次数（从 1 开始），axis="time" 时为秒（默认取 0 到最长耗时的均匀网格）
+    返回 summarize 的结果，附带 x（横坐标）和 runs（实验数）
+    """
+    series = [store.series(run["id"], metric) for run in runs]
+    if axis == "iter":
+        matrix = pad_series(series)
+        x = np.arange(1, matrix.shape[1] + 1)
+    elif axis == "time":
+        times = [run_times(store, run) for run in runs]
+        if grid is None:
+            end = max((np.nanmax(t) for t in times if len(t) and np.isfinite(t).any()), default=0.0)
+            grid = np.linspace(0.0, end, num_points)
+        matrix = resample_on_time(times, series, grid)
+        x = np.asarray(grid, dtype=np.float64)
+    else:
+        raise ValueError(f"未知的对齐方式: {axis}")
+    result = summarize(matrix, log=log, n_boot=n_boot, ci=ci, rng=rng)
+    result.update(x=x, runs=len(runs))
+    return result
+
+def aggregate_runs(store, axis="iter", metric="gt_mse", model=None, algorithm=None, u=None, folder=None,
+                   recursive=True, **kwargs):
+    """查询结果库并按 (model, algorithm, u) 分组统计，返回 {(model, algorithm, u): 统计结果}"""
+    runs = store.runs(model=model, algorithm=algorithm, u=u, folder=folder, recursive=recursive)
+    return {key: aggregate_group(store, group, axis=axis, metric=metric, **kwargs)
+            for key, group in group_runs(runs).items()}
+
+def plot_band(ax, summary, color, label=None, linewidth=2.5, show_ci=True, batch=None):
+    """
+    中位数曲线 + 四分位带（+ 中位数置信区间）；只有一个实验时就是原来的单条曲线
+    传入 batch（curve_rendering.CurveBatch）时中位数曲线加入批量绘制，由调用方统一 draw
+    """
+    x = summary["x"]
+    if batch is not None:
+        batch.plot(x, summary["median"], color, label=label, linewidth=linewidth)
+    else:
+        ax.plot(x, summary["median"], color=color, label=label, linewidth=linewidth)
+    if summary["runs"] > 1:
+        ax.fill_between(x, summary["q25"], summary["q75"], color=color, alpha=0.25, linewidth=0)
+        if show_ci:
+            ax.fill_between(x, summary["ci_low"], summary["ci_high"], color=color, alpha=0.15, linewidth=0)
+
+if __name__ == "__main__":
+    from experiment_store import ExperimentStore, DEFAULT_DB_PATH
+
+    log_folder = "testcase"
+    num_runs = 2000       # 压测：随机生成的实验数
+    num_iters = 120
+    rng = np.random.default_rng(0)
+
+    with ExperimentStore(DEFAULT_DB_PATH) as store:
+        store.update(log_folder)
+        start = time.perf_counter()
+        for (model, algorithm, u), summary in aggregate_runs(store, axis="time", folder=log_folder).items():
+            print(f"{model:>10} {algorithm:>10} u={u:g}: {summary['runs']} 个实验，"
+                  f"最终中位数 {summary['median'][-1]:.3g}")
+        print(f"结果库中的实验汇总耗时 {time.perf_counter() - start:.3f}s")
+
+    # 随机曲线压测：长度不一的 num_runs 条曲线
+    lengths = rng.integers(num_iters // 2, num_iters, num_runs)
+    curves = [1e-2 * rng.uniform(0.5, 0.8) ** np.arange(n) for n in lengths]
+    times = [np.cumsum(rng.uniform(0.05, 0.2, n)) for n in lengths]
+    start = time.perf_counter()
+    by_iter = summarize(pad_series(curves))
+    by_time = summarize(resample_on_time(times, curves, np.linspace(0, 20, 200)))
+    print(f"{num_runs} 条曲线按迭代与按时间对齐并统计（含 bootstrap）耗时 {time.perf_counter() - start:.2f}s")
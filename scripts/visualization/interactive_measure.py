@@ -1,10 +1,17 @@
 """
 Description : 通过交互点击测量筒段两个点的距离
+点击位置由 vtkCellPicker 求得，再在网格顶点的共享 KD-tree 索引上吸附到最近顶点
 """
 
+import os
+import sys
 import vtk
 from stl import mesh
 import numpy as np
+from vtk.util.numpy_support import vtk_to_numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pointcloud_process"))
+from spatial_index import cached_index
 
 # 读取STL文件
 def read_stl(file_path):
@@ -15,17 +22,21 @@ def read_stl(file_path):
 
 # 自定义交互器实现测量两个点距离
 class PointPickerInteractorStyle(vtk.vtkInteractorStyleTrackballCamera):
-    def __init__(self, renderer):
+    def __init__(self, renderer, polydata):
         self.AddObserver("LeftButtonPressEvent", self.on_left_button_press_event)
         self.renderer = renderer
         self.points = []
-        self.point_picker = vtk.vtkPointPicker()
+        self.point_picker = vtk.vtkCellPicker()
+        self.point_picker.SetTolerance(0.0005)
+        # 顶点索引只建一次（同一模型再次打开时直接命中缓存）
+        self.vertices = vtk_to_numpy(polydata.GetPoints().GetData()).astype(np.float64)
+        self.index = cached_index(self.vertices)
 
     def on_left_button_press_event(self, obj, event):
         click_pos = self.GetInteractor().GetEventPosition()
-        self.point_picker.Pick(click_pos[0], click_pos[1], 0, self.renderer)
-        picked_position = self.point_picker.GetPickPosition()
-        if picked_position != (0.0, 0.0, 0.0):
+        if self.point_picker.Pick(click_pos[0], click_pos[1], 0, self.renderer):
+            _, nearest = self.index.knn(np.array([self.point_picker.GetPickPosition()]), k=1)
+            picked_position = tuple(float(x) for x in self.vertices[nearest[0]])
             self.points.append(picked_position)
             print(f"点 {len(self.points)}: {picked_position}")
             if len(self.points) == 2:
@@ -67,7 +78,7 @@ def visualize_stl(stl_data):
     interactor.SetRenderWindow(render_window)
 
     # 设置自定义交互样式
-    style = PointPickerInteractorStyle(renderer)
+    style = PointPickerInteractorStyle(renderer, clipper.GetOutput())
     interactor.SetInteractorStyle(style)
 
     # 开始渲染
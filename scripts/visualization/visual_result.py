@@ -3,7 +3,7 @@ Description : 25/07/04 逻辑仍然是选择文件夹，读取文件及输出的
 """
 
 import os
-import re
+import sys
 from tkinter import Tk, filedialog
 from sys import exit
 
@@ -15,6 +15,9 @@ from vtkmodules.vtkRenderingCore import vtkRenderer, vtkPolyDataMapper, vtkActor
 from vtkmodules.vtkRenderingCore import vtkRenderWindow, vtkRenderWindowInteractor
 from vtkmodules.tk.vtkTkRenderWindowInteractor import vtkTkRenderWindowInteractor
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "result_process"))
+from experiment_store import ExperimentStore, DEFAULT_DB_PATH
+
 def read_matrix_from_txt(txt_path):
     """读取4x4矩阵（16个float）"""
     with open(txt_path, 'r', encoding='utf-8') as f:
@@ -23,28 +26,13 @@ def read_matrix_from_txt(txt_path):
         raise ValueError("Matrix txt 不包含 16 个数字")
     return np.array(values).reshape((4, 4))
 
-def extract_log_matrix_and_meta(log_path):
-    """从log中提取矩阵和method/u_value"""
-    with open(log_path, 'r', encoding='gbk') as f:
-        content = f.read()
-
-    # 提取变换矩阵
-    pattern = r"res_trans\s*((?:\s*-?\d+\.?\d*e?-?\d*\s*){16})"
-    match = re.search(pattern, content)
-    if not match:
-        raise ValueError(f"{log_path} 中未找到 res_trans")
-
-    matrix_values = list(map(float, match.group(1).split()))
-    matrix = np.array(matrix_values).reshape((4, 4))
-
-    # 提取method（basename后直到_log_前）
-    filename = os.path.basename(log_path)
-    method_match = re.match(rf"{base_name}_(.+)_log_([\d\.eE\-]+)\.txt", filename)
-    if not method_match:
-        raise ValueError(f"无法解析方法名和u值：{filename}")
-    method = method_match.group(1)
-    u_value = method_match.group(2)
-    return matrix, method, u_value
+def extract_log_matrix_and_meta(store, run):
+    """从结果库中取出矩阵和method/u_value（u_value 保持文件名中的写法）"""
+    matrix = store.transform(run["id"])
+    if matrix is None:
+        raise ValueError(f"{run['path']} 中未找到 res_trans")
+    u_value = os.path.splitext(os.path.basename(run["path"]))[0].rsplit("_log_", 1)[1]
+    return matrix, run["algorithm"], u_value
 
 def vtk_read_ply(filename):
     reader = vtk.vtkPLYReader()
@@ -179,23 +167,20 @@ if __name__ == "__main__":
 
     # 3. 遍历所有log
     method_order = ["ICP", "AA_ICP", "FICP", "RICP", "PPL", "RPPL", "SparseICP", "SICPPPL", "EXPICP"]
-    log_map = {}  # method: path
+    log_map = {}  # method: run
 
-    for f in os.listdir(folder):
-        if f.startswith(base_name) and f.endswith(".txt") and "_log_" in f:
-            match = re.match(rf"{base_name}_(.+)_log_([\d\.eE\-]+)\.txt", f)
-            if match:
-                method = match.group(1)
-                if method in method_order:
-                    log_map[method] = os.path.join(folder, f)
+    store = ExperimentStore(DEFAULT_DB_PATH)
+    store.update(folder, recursive=False)
+    for run in store.runs(model=base_name, folder=folder):
+        if run["algorithm"] in method_order:
+            log_map[run["algorithm"]] = run
 
     for method in method_order:
         if method not in log_map:
             print(f"跳过方法 {method}：未找到对应文件")
             continue
-        log_path = log_map[method]
         try:
-            matrix, _, u_value = extract_log_matrix_and_meta(log_path)
+            matrix, _, u_value = extract_log_matrix_and_meta(store, log_map[method])
             transformed = apply_transformation(source, matrix)
             visualize(transformed, target, title=f"{base_name} {method} {u_value}", 
                         screenshot_path=os.path.join(folder, f"{base_name}_{method}_{u_value}.png"))
@@ -203,14 +188,12 @@ if __name__ == "__main__":
             print(f"跳过方法 {method}，原因：{e}")
 
     """
-    log_files = sorted([f for f in os.listdir(folder)
-                        if f.startswith(base_name) and f.endswith(".txt") and "_log_" in f])
-    for log_file in log_files:
-        log_path = os.path.join(folder, log_file)
+    for run in store.runs(model=base_name, folder=folder):
         try:
-            matrix, method, u_value = extract_log_matrix_and_meta(log_path)
+            matrix, method, u_value = extract_log_matrix_and_meta(store, run)
             transformed = apply_transformation(source, matrix)
             visualize(transformed, target, title=f"{base_name} {method} {u_value}")
         except Exception as e:
-            print(f"跳过文件 {log_file}，原因：{e}")
-    """
\ No newline at end of file
+            print(f"跳过文件 {os.path.basename(run['path'])}，原因：{e}")
+    """
+    store.close()
\ No newline at end of file